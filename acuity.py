@@ -0,0 +1,195 @@
+import heapq
+import threading
+
+# NEWS2 bands per parameter: (upper bound inclusive, points), checked in order
+NEWS2_BANDS = {
+    "respiratory_rate": ((8, 3), (11, 1), (20, 0), (24, 2), (float("inf"), 3)),
+    "spo2": ((91, 3), (93, 2), (95, 1), (float("inf"), 0)),
+    "temperature": ((35.0, 3), (36.0, 1), (38.0, 0), (39.0, 1), (float("inf"), 2)),
+    "bp_systolic": ((90, 3), (100, 2), (110, 1), (219, 0), (float("inf"), 3)),
+    "heart_rate": ((40, 3), (50, 1), (90, 0), (110, 1), (130, 2), (float("inf"), 3)),
+}
+
+# Dashboard colours: RED = needs help right now, ORANGE = next in line, GREEN = stable
+BAND_RED, BAND_ORANGE, BAND_GREEN = "RED", "ORANGE", "GREEN"
+
+
+def score_vitals(vitals):
+    """
+    NEWS2-style aggregate from a {vital_name: value} dict (missing vitals
+    score 0), plus qSOFA. Returns (score, qsofa, band, components).
+    """
+    components = {}
+    for key, bands in NEWS2_BANDS.items():
+        value = vitals.get(key)
+        if value is None:
+            continue
+        for upper, points in bands:
+            if value <= upper:
+                components[key] = points
+                break
+    gcs = vitals.get("gcs")
+    if gcs is not None:
+        # NEWS2 scores any new confusion / reduced consciousness as 3
+        components["gcs"] = 3 if gcs < 15 else 0
+
+    score = sum(components.values())
+    qsofa = sum((
+        vitals.get("respiratory_rate", 0) >= 22,
+        vitals.get("bp_systolic", float("inf")) <= 100,
+        vitals.get("gcs", 15) < 15,
+    ))
+    if score >= 7 or qsofa >= 2:
+        band = BAND_RED
+    elif score >= 5 or 3 in components.values():
+        band = BAND_ORANGE
+    else:
+        band = BAND_GREEN
+    return score, qsofa, band, components
+
+
+class IndexedHeap:
+    """
+    Binary min-heap of keys with a position index, so a key's priority can
+    be changed or removed in O(log n). top(k) walks the heap with a small
+    frontier heap in O(k log k) without disturbing it.
+    """
+
+    def __init__(self):
+        self._heap = []      # keys
+        self._pos = {}       # key -> index in _heap
+        self._priority = {}  # key -> comparable priority (smallest first)
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, key):
+        return key in self._pos
+
+    def keys(self):
+        return list(self._pos)
+
+    def set(self, key, priority):
+        if key in self._pos:
+            old = self._priority[key]
+            self._priority[key] = priority
+            if priority < old:
+                self._sift_up(self._pos[key])
+            else:
+                self._sift_down(self._pos[key])
+        else:
+            self._priority[key] = priority
+            self._heap.append(key)
+            self._pos[key] = len(self._heap) - 1
+            self._sift_up(len(self._heap) - 1)
+
+    def remove(self, key):
+        index = self._pos.pop(key, None)
+        if index is None:
+            return
+        del self._priority[key]
+        last = self._heap.pop()
+        if index < len(self._heap):
+            self._heap[index] = last
+            self._pos[last] = index
+            self._sift_up(index)
+            self._sift_down(self._pos[last])
+
+    def top(self, k, upto=None):
+        """The k smallest keys in order, as (key, priority); with `upto`, only priorities <= upto."""
+        result = []
+        if not self._heap or k <= 0:
+            return result
+        heap, priority = self._heap, self._priority
+        frontier = [(priority[heap[0]], 0)]
+        while frontier and len(result) < k:
+            prio, index = heapq.heappop(frontier)
+            if upto is not None and prio > upto:
+                break
+            result.append((heap[index], prio))
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (priority[heap[child]], child))
+        return result
+
+    def _swap(self, i, j):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._pos[heap[i]] = i
+        self._pos[heap[j]] = j
+
+    def _sift_up(self, index):
+        priority, heap = self._priority, self._heap
+        while index > 0:
+            parent = (index - 1) // 2
+            if priority[heap[index]] < priority[heap[parent]]:
+                self._swap(index, parent)
+                index = parent
+            else:
+                break
+
+    def _sift_down(self, index):
+        priority, heap = self._priority, self._heap
+        size = len(heap)
+        while True:
+            smallest = index
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < size and priority[heap[child]] < priority[heap[smallest]]:
+                    smallest = child
+            if smallest == index:
+                break
+            self._swap(index, smallest)
+            index = smallest
+
+
+class AcuityEngine:
+    """
+    Incremental triage: re-scores only the patients whose latest vitals
+    changed and keeps everyone in an IndexedHeap ordered by (score, qSOFA)
+    descending, so the sickest k patients come out in O(k log n).
+    """
+
+    def __init__(self, loinc_codes):
+        # LOINC code -> vital name, the inverse of app.LOINC_CODES
+        self._vital_names = {code: name for name, (code, _) in loinc_codes.items()}
+        self._lock = threading.Lock()
+        self._heap = IndexedHeap()
+        self._scores = {}  # patient_id -> (score, qsofa, band, components)
+
+    def rescore(self, patient_vitals):
+        """
+        Takes {patient_id: {loinc_code: value}} for patients whose vitals
+        changed; returns [(patient_id, old_band, new_band)] for band changes.
+        """
+        band_changes = []
+        with self._lock:
+            for patient_id, vitals_by_code in patient_vitals.items():
+                vitals = {self._vital_names[code]: value for code, value in vitals_by_code.items()
+                          if code in self._vital_names and value is not None}
+                result = score_vitals(vitals)
+                previous = self._scores.get(patient_id)
+                self._scores[patient_id] = result
+                self._heap.set(patient_id, (-result[0], -result[1], patient_id))
+                if previous is None or previous[2] != result[2]:
+                    band_changes.append((patient_id, previous[2] if previous else None, result[2]))
+        return band_changes
+
+    def remove(self, patient_id):
+        with self._lock:
+            self._scores.pop(patient_id, None)
+            self._heap.remove(patient_id)
+
+    def get(self, patient_id):
+        with self._lock:
+            return self._scores.get(patient_id)
+
+    def top(self, k):
+        with self._lock:
+            return [
+                {"patient_id": patient_id, "score": score, "qsofa": qsofa, "band": band, "components": components}
+                for patient_id, _ in self._heap.top(k)
+                for score, qsofa, band, components in (self._scores[patient_id],)
+            ]
+
+    def __len__(self):
+        return len(self._heap)
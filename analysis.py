@@ -1,4 +1,5 @@
 import json
+import sys
 
 # This is a very simple "expert rule" for our snakebite scenario
 def analyze_snakebite_group(patients):
@@ -14,8 +15,8 @@ def analyze_snakebite_group(patients):
     }
 
 if __name__ == "__main__":
-    # In a real system, this would read from a mounted file or stdin
-    # For this simulation, we'll use a simple hardcoded example
+    # The gateway's docker sandbox passes {"group_type", "patients"} on stdin;
+    # run by hand (no or empty stdin, e.g. docker run without -i), we fall back to a simple hardcoded example
     mock_input_data = {
         "group_type": "snakebite",
         "patients": [
@@ -25,7 +26,9 @@ if __name__ == "__main__":
         ]
     }
     
-    result = analyze_snakebite_group(mock_input_data["patients"])
+    raw_input = "" if sys.stdin.isatty() else sys.stdin.read()
+    input_data = json.loads(raw_input) if raw_input.strip() else mock_input_data
+    result = analyze_snakebite_group(input_data["patients"])
     
     # The script's output is a JSON string
     print(json.dumps(result))
\ No newline at end of file
@@ -0,0 +1,219 @@
+import importlib
+import json
+import multiprocessing
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+
+JOB_SECONDS = metrics.Histogram("care_analysis_job_seconds", "Analyzer job time from submission to result.", ("group_type",))
+JOB_OUTCOMES = metrics.Counter("care_analysis_jobs", "Analyzer jobs by outcome (ok, error, timeout, crashed, unsupported).", ("group_type", "outcome"))
+
+# group type -> "module:function". Each analyzer takes the list of member
+# patient dicts and returns an insight dict (or None for "nothing to report").
+DEFAULT_ANALYZERS = {
+    "snakebite": "analysis:analyze_snakebite_group",
+}
+
+# Resolved analyzer functions, per worker process
+_loaded = {}
+
+
+def _resolve(spec):
+    func = _loaded.get(spec)
+    if func is None:
+        module_name, func_name = spec.split(":", 1)
+        func = getattr(importlib.import_module(module_name), func_name)
+        _loaded[spec] = func
+    return func
+
+
+def _warm_worker(specs):
+    """Pool initializer: import every analyzer plugin once so jobs start hot."""
+    for spec in specs:
+        _resolve(spec)
+
+
+def _run_analyzer(spec, patients):
+    return _resolve(spec)(patients)
+
+
+def _observe_job(future, group_type, submitted_at):
+    # Jobs killed with a recycled pool are run again and observed then
+    if not future.cancelled() and not isinstance(future.exception(), BrokenProcessPool):
+        JOB_SECONDS.labels(group_type).observe(time.monotonic() - submitted_at)
+
+
+def analyzers_from_env():
+    """DEFAULT_ANALYZERS plus overrides from CARE_ANALYZERS="type=module:function,..."."""
+    analyzers = dict(DEFAULT_ANALYZERS)
+    for item in filter(None, os.environ.get("CARE_ANALYZERS", "").split(",")):
+        group_type, spec = item.split("=", 1)
+        analyzers[group_type.strip()] = spec.strip()
+    return analyzers
+
+
+class AnalyzerPool:
+    """
+    Runs group analyzers as plugins inside a warm process pool instead of
+    starting a container per group. Many groups run in parallel, each with
+    its own timeout. sandbox="docker" keeps the old isolated execution path
+    (one `docker run -i` per job, input on stdin) for untrusted analyzers.
+    """
+
+    def __init__(self, analyzers=None, max_workers=None, timeout=10.0, sandbox=None, docker_image="care-analyzer"):
+        self.analyzers = analyzers or analyzers_from_env()
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.timeout = timeout
+        self.sandbox = sandbox
+        self.docker_image = docker_image
+        self._executor = None
+
+    def supports(self, group_type):
+        return group_type in self.analyzers
+
+    def start(self):
+        """
+        Starts and warms the workers; run_many() calls it on the first job,
+        so a gateway whose groups are all handled by rule sets never starts
+        any. Called before other threads exist, the workers are forked,
+        which is fastest. Otherwise (lazily, or a pool recycled after a
+        timeout) they come from a forkserver instead, because forking a
+        process with live threads can copy a lock that some other thread
+        holds, and the child would deadlock on it.
+        """
+        if self._executor is not None or self.sandbox == "docker":
+            return
+        start_methods = multiprocessing.get_all_start_methods()
+        if "fork" in start_methods and threading.active_count() == 1:
+            context = multiprocessing.get_context("fork")
+        elif "forkserver" in start_methods:
+            context = multiprocessing.get_context("forkserver")
+        else:
+            context = multiprocessing.get_context("spawn")
+        specs = tuple(self.analyzers.values())
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context,
+                                             initializer=_warm_worker, initargs=(specs,))
+        # Force every worker to spawn and import the plugins now, not on the first trigger
+        for future in [self._executor.submit(_warm_worker, specs) for _ in range(self.max_workers)]:
+            future.result()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _recycle(self, reason="a job timed out"):
+        """
+        Kills every worker (a timed-out job cannot be cancelled once it is
+        running, and would hold its worker forever) and starts a fresh pool.
+        Also replaces a pool that broke because a worker died.
+        """
+        executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        # ProcessPoolExecutor has no public way to stop a running job before Python 3.14
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+        print(f"[ANALYZER] Worker pool restarted after {reason}.")
+        self.start()
+
+    def run_many(self, jobs):
+        """
+        Runs jobs [(job_id, group_type, patients)] in parallel and returns
+        [(job_id, result, error)] in the same order. `error` is a string when
+        the analyzer raised, timed out or the group type has no analyzer.
+        """
+        if self.sandbox == "docker":
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                return list(executor.map(lambda job: self._run_in_docker(*job), jobs))
+
+        results = [None] * len(jobs)
+        pending = list(enumerate(jobs))
+        crashed = set()  # positions already run again once after a worker died
+        while pending:
+            pending = self._run_round(pending, results, crashed)
+        return results
+
+    def _submit(self, spec, patients):
+        try:
+            return self._executor.submit(_run_analyzer, spec, patients)
+        except BrokenProcessPool:
+            # A worker died since the last round (e.g. killed for memory)
+            self._recycle("a worker died")
+            return self._executor.submit(_run_analyzer, spec, patients)
+
+    def _run_round(self, pending, results, crashed):
+        """
+        Submits [(position, job)] to the pool and fills `results`. On the
+        first timeout, or when a worker dies (a plugin that exits or
+        crashes breaks the whole pool), the pool is recycled; jobs still
+        unfinished at that point are returned to be run again on the fresh
+        workers. A job lost to a dead worker is run again only once, so a
+        plugin that always crashes cannot keep the pool restarting.
+        """
+        self.start()
+        submitted_at = time.monotonic()
+        futures = []
+        for position, (job_id, group_type, patients) in pending:
+            spec = self.analyzers.get(group_type)
+            future = self._submit(spec, patients) if spec else None
+            if future is not None:
+                future.add_done_callback(lambda f, t=group_type: _observe_job(f, t, submitted_at))
+            futures.append((position, job_id, group_type, future))
+
+        timed_out, broken, retry = False, False, []
+        for order, (position, job_id, group_type, future) in enumerate(futures):
+            if future is None:
+                JOB_OUTCOMES.labels(group_type, "unsupported").inc()
+                results[position] = (job_id, None, f"no analyzer for group type '{group_type}'")
+                continue
+            if timed_out and not future.done():
+                retry.append((position, pending[order][1]))
+                continue
+            # Each job gets `timeout` seconds of its own, counted from when a worker could pick it up
+            deadline = submitted_at + self.timeout * (1 + order // self.max_workers)
+            try:
+                results[position] = (job_id, future.result(timeout=max(0.0, deadline - time.monotonic())), None)
+                JOB_OUTCOMES.labels(group_type, "ok").inc()
+            except FutureTimeoutError:
+                timed_out = True
+                JOB_OUTCOMES.labels(group_type, "timeout").inc()
+                results[position] = (job_id, None, f"timed out after {self.timeout}s")
+            except BrokenProcessPool:
+                broken = True
+                if position in crashed:
+                    JOB_OUTCOMES.labels(group_type, "crashed").inc()
+                    results[position] = (job_id, None, "analyzer worker died")
+                else:
+                    crashed.add(position)
+                    retry.append((position, pending[order][1]))
+            except Exception as e:
+                JOB_OUTCOMES.labels(group_type, "error").inc()
+                results[position] = (job_id, None, f"{type(e).__name__}: {e}")
+        if timed_out or broken:
+            self._recycle("a job timed out" if timed_out else "a worker died")
+        return retry
+
+    def _run_in_docker(self, job_id, group_type, patients):
+        payload = json.dumps({"group_type": group_type, "patients": patients})
+        started = time.monotonic()
+        try:
+            output = subprocess.check_output(["docker", "run", "--rm", "-i", self.docker_image],
+                                             input=payload.encode("utf-8"), timeout=self.timeout)
+            result = json.loads(output.decode("utf-8"))
+            JOB_OUTCOMES.labels(group_type, "ok").inc()
+            return job_id, result, None
+        except subprocess.TimeoutExpired:
+            JOB_OUTCOMES.labels(group_type, "timeout").inc()
+            return job_id, None, f"timed out after {self.timeout}s"
+        except (subprocess.CalledProcessError, OSError, ValueError) as e:
+            JOB_OUTCOMES.labels(group_type, "error").inc()
+            return job_id, None, f"{type(e).__name__}: {e}"
+        finally:
+            JOB_SECONDS.labels(group_type).observe(time.monotonic() - started)
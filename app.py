@@ -1,40 +1,63 @@
+import concurrent.futures
 import csv
-import random
+import io
+import itertools
+import math
+import os
 import time
 import uuid
+import hashlib
+import queue
 import threading
 from datetime import datetime, timedelta
 from functools import wraps
-from cherrypy import url
-from flask import Flask, json, jsonify, request
+from urllib.parse import urlencode
+from flask import Flask, json, jsonify, request, stream_with_context
 from flask_cors import CORS
-import jwt
-import bcrypt
 import requests
-from pydantic import ValidationError
-
-# FHIR imports
-from fhir.resources.patient import Patient
-from fhir.resources.observation import Observation
-from fhir.resources.bundle import Bundle
-from fhir.resources.reference import Reference
-from fhir.resources.humanname import HumanName
-from fhir.resources.contactpoint import ContactPoint
-from fhir.resources.address import Address
-from fhir.resources.codeableconcept import CodeableConcept
-from fhir.resources.coding import Coding
-from fhir.resources.quantity import Quantity
-from fhir.resources.group import Group, GroupMember
-from fhir.resources.flag import Flag
-import subprocess
+import fhir_models
+import metrics
+from latest_vitals import LatestVitals
+from broadcaster import Broadcaster
+from fhir_client import client_from_env
+from group_store import GroupStore, VersionConflict, member_id
+from analyzer_pool import AnalyzerPool
+from acuity import AcuityEngine, BAND_GREEN, BAND_ORANGE, BAND_RED
+from patient_index import PatientDirectory
+from vitals_scheduler import CadenceScheduler
+from outbox import Outbox, OutboxFull
+from fhir_search import SearchTruncated, iter_entries, iter_pages, next_link, project, project_entry, projection
+from federated_broker import DuplicateQuery, FederatedBroker, peers_from_env
+from shared_state import SharedState
+from bulk_import import BulkImporter, iter_rows
+from auth import TokenCache, UserStore, JsonFileUserStore, LoginThrottle, PasswordChecker, PasswordCheckBusy
+from fhir_serialization import FHIR_ID, ObservationSerializer, flag_id, now_timestamp, observation_id
 
+# FHIR models (fhir_models.Patient, ...) are imported on first use, see fhir_models.py
 # ==============================================================================
 # SETUP
 # ==============================================================================
 app = Flask(__name__)
-CORS(app)
+# ETag must be exposed, or the cross-origin dashboard cannot read it for If-None-Match / If-Match
+CORS(app, expose_headers=["ETag"])
 app.config['SECRET_KEY'] = 'sak8uyxslkdpf9udsa9lkfds9.sdsaghyugehdsafhgdsafdytf'
-FHIR_SERVER_BASE = "http://localhost:8080/fhir"
+FHIR_SERVER_BASE = os.environ.get("CARE_FHIR_BASE", "http://localhost:8080/fhir")
+
+# Shared FHIR client (pooled, with deadlines, retries and a circuit breaker).
+# Every route and background thread goes through it; see fhir_client.py.
+fhir = client_from_env(FHIR_SERVER_BASE)
+
+# FHIR writes go out as Bundles instead of one request per resource. They are
+# always batch Bundles: the outbox needs a result per entry, and a rejected
+# transaction would fail (and keep retrying) every entry in it.
+FHIR_BUNDLE_MAX_ENTRIES = int(os.environ.get("CARE_FHIR_BUNDLE_MAX_ENTRIES", "500"))
+
+# Observation JSON from prevalidated templates; CARE_FHIR_STRICT=1 forces full pydantic validation
+CACHE_DIR = os.environ.get("CARE_CACHE_DIR", ".care_cache")
+observation_serializer = ObservationSerializer(
+    strict=os.environ.get("CARE_FHIR_STRICT") == "1",
+    cache_path=os.path.join(CACHE_DIR, "observation_templates.json")
+)
 
 # Mock user database
 MOCK_USERS = {
@@ -44,20 +67,121 @@ MOCK_USERS = {
     }
 }
 
-# ========== NEW: JSON Database for Groups ==========
-GROUPS_DB_FILE = 'groups_db.json'
-db_lock = threading.Lock()
+# ========== Process role ==========
+# "all" (default): one process serves the API and runs the engines.
+# Split mode (serve.py / wsgi.py): N stateless "api" workers plus one "engine"
+# process (simulation, analysis, outbox flusher), sharing state via CARE_STATE_DB.
+CARE_ROLE = os.environ.get("CARE_ROLE", "all")
+if CARE_ROLE not in ("all", "api", "engine"):
+    raise ValueError(f"CARE_ROLE must be 'all', 'api' or 'engine', not {CARE_ROLE!r}")
+SPLIT_MODE = CARE_ROLE != "all"
+shared_state = SharedState(os.environ.get("CARE_STATE_DB", "state.db")) if SPLIT_MODE else None
+
+# ========== Group storage (SQLite WAL + in-memory indexes) ==========
+GROUPS_DB_FILE = 'groups_db.json'  # legacy JSON DB, imported once on first start
+GROUPS_DB_PATH = os.environ.get("CARE_GROUPS_DB", "groups.db")
+group_store = GroupStore(GROUPS_DB_PATH, legacy_json=GROUPS_DB_FILE, shared=SPLIT_MODE)
+
+# ========== Outbound FHIR writes (durable outbox, SQLite WAL) ==========
+# Every FHIR write is acknowledged locally and replayed by a flusher thread, so
+# the hub keeps working while the FHIR server is unreachable. Replays always use
+# batch Bundles, so one rejected entry cannot hold back the others.
+OUTBOX_DB_PATH = os.environ.get("CARE_OUTBOX_DB", "outbox.db")
+outbox = Outbox(
+    OUTBOX_DB_PATH,
+    sender=lambda entries, labels: post_bundle(entries, labels),  # defined further down
+    max_entries=int(os.environ.get("CARE_OUTBOX_MAX_ENTRIES", "200000")),
+    max_attempts=int(os.environ.get("CARE_OUTBOX_MAX_ATTEMPTS", "100")),
+    batch_size=FHIR_BUNDLE_MAX_ENTRIES,
+    shared=SPLIT_MODE
+)
+
+def bundle_entry(method, url, resource_json):
+    """A Bundle entry as a JSON string, for an already-serialized resource."""
+    return '{"resource":%s,"request":{"method":"%s","url":"%s"}}' % (resource_json, method, url)
+
+# Group analyzers (analysis.py & co.) run as plugins in a warm process pool,
+# started on the first job for a group type without a rule set (rules/ covers
+# the built-in types, so edge boxes normally never start it).
+# CARE_ANALYZER_SANDBOX=docker restores per-job container isolation.
+analyzer_pool = AnalyzerPool(
+    max_workers=int(os.environ.get("CARE_ANALYZER_WORKERS", "0")) or None,
+    timeout=float(os.environ.get("CARE_ANALYZER_TIMEOUT", "10")),
+    sandbox=os.environ.get("CARE_ANALYZER_SANDBOX") or None
+)
+
+# ========== Federated queries to peer hospitals (hospital_b_mock.py & co.) ==========
+# CARE_FEDERATED_PEERS="name=url,..."; answers arriving after the deadline are kept per query_id
+# (in split mode in the shared state, so any API worker can return them)
+federated = FederatedBroker(
+    peers_from_env(),
+    timeout=float(os.environ.get("CARE_FEDERATED_TIMEOUT", "2")),
+    cache_ttl=float(os.environ.get("CARE_FEDERATED_CACHE_TTL", "300")),
+    store=shared_state
+)
+
+# ========== Auth ==========
+# Users come from CARE_USERS_FILE (same shape as MOCK_USERS) when set.
+user_store = JsonFileUserStore(os.environ["CARE_USERS_FILE"]) if os.environ.get("CARE_USERS_FILE") else UserStore(MOCK_USERS)
+# Verified tokens, so hot endpoints skip the JWT decode + HMAC check
+token_cache = TokenCache(maxsize=int(os.environ.get("CARE_TOKEN_CACHE_SIZE", "10000")))
+# bcrypt runs on a bounded pool; logins are throttled per username and per client IP
+password_checker = PasswordChecker(
+    workers=int(os.environ.get("CARE_BCRYPT_WORKERS", "2")),
+    max_pending=int(os.environ.get("CARE_BCRYPT_MAX_PENDING", "16"))
+)
+# (in split mode the counters are shared, so the limits hold across all API workers)
+user_login_throttle = LoginThrottle(max_attempts=10, window=60, shared=shared_state, scope="login-user")
+ip_login_throttle = LoginThrottle(max_attempts=30, window=60, shared=shared_state, scope="login-ip")
+
+# ========== Metrics (GET /metrics, Prometheus text format) ==========
+HTTP_SECONDS = metrics.Histogram("care_http_request_seconds", "Flask request latency by endpoint.", ("endpoint",))
+HTTP_RESPONSES = metrics.Counter("care_http_responses", "Flask responses by endpoint and status code.", ("endpoint", "status"))
+metrics.Gauge("care_outbox_depth", "FHIR writes waiting in the outbox.", fn=outbox.depth)
+metrics.Gauge("care_outbox_lag_seconds", "Age of the oldest FHIR write waiting in the outbox.", fn=lambda: outbox.stats()["lag_seconds"])
+
+@app.before_request
+def start_request_timer():
+    request.environ["care.started"] = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = request.environ.get("care.started")
+    if started is not None:
+        endpoint = request.endpoint or "unmatched"
+        HTTP_SECONDS.labels(endpoint).observe(time.perf_counter() - started)
+        HTTP_RESPONSES.labels(endpoint, response.status_code).inc()
+    return response
+
+@app.route('/metrics')
+def get_metrics():
+    """Request, FHIR, simulation, analysis and storage metrics for Prometheus (no patient data)."""
+    return metrics.render(), 200, {"Content-Type": metrics.CONTENT_TYPE}
+
+def token_required(f=None, allow_query=False):
+    """
+    Requires a Bearer token. allow_query=True also accepts ?access_token=,
+    only for the event stream (EventSource cannot send headers); URLs end up
+    in access logs and browser history, so no other endpoint takes it.
+    """
+    if f is None:
+        return lambda f: token_required(f, allow_query=allow_query)
 
-# Your auth logic is fine, no changes needed here.
-def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
         token = None;
         if 'authorization' in request.headers: token = request.headers['authorization'].split(" ")[1]
+        elif allow_query and 'access_token' in request.args: token = request.args['access_token']
         if not token: return jsonify({'message': 'Token is missing!'}), 401
-        try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"]); current_user = data['user']
-        except: return jsonify({'message': 'Token is invalid!'}), 401
+        current_user = token_cache.get(token)
+        if current_user is None:
+            try:
+                import jwt  # loaded on first request, not at boot
+                data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"]); current_user = data['user']
+            except: return jsonify({'message': 'Token is invalid!'}), 401
+            # Tokens without exp never expire by themselves; only tokens that do are cached
+            if isinstance(data.get('exp'), (int, float)):
+                token_cache.put(token, current_user, data['exp'])
         return f(current_user, *args, **kwargs)
     return decorated
 
@@ -66,8 +190,23 @@ def token_required(f):
 def login():
     auth = request.json
     if not auth or not auth.get('username') or not auth.get('password'): return jsonify({'message': 'Could not verify'}), 401
-    username = auth.get('username'); password = auth.get('password').encode('utf-8'); user = MOCK_USERS.get(username)
-    if user and bcrypt.checkpw(password, user['password_hash'].encode('utf-8')):
+    username = auth.get('username'); password = auth.get('password').encode('utf-8'); user = user_store.get(username)
+    if not user_login_throttle.allow(username):
+        return jsonify({'message': 'Too many login attempts, try again shortly.'}), 429, {'Retry-After': '60'}
+    if not ip_login_throttle.allow(request.remote_addr):
+        user_login_throttle.refund(username)
+        return jsonify({'message': 'Too many login attempts, try again shortly.'}), 429, {'Retry-After': '60'}
+    try:
+        valid = bool(user) and password_checker.check(password, user['password_hash'].encode('utf-8'))
+    except (PasswordCheckBusy, concurrent.futures.TimeoutError):
+        valid = None
+    if valid is not False:
+        # Only failed passwords count against the throttles
+        user_login_throttle.refund(username); ip_login_throttle.refund(request.remote_addr)
+    if valid is None:
+        return jsonify({'message': 'Login service busy, try again.'}), 503, {'Retry-After': '2'}
+    import jwt  # loaded on first login, not at boot
+    if valid:
         token = jwt.encode({'user': username, 'exp': datetime.utcnow() + timedelta(hours=8)}, app.config['SECRET_KEY'], algorithm="HS256")
         return jsonify({'token': token})
     return jsonify({'message': 'Invalid credentials!'}), 401
@@ -110,6 +249,142 @@ active_patients = {}
 patient_lock = threading.Lock()
 start_time = time.time()
 
+# Batched NumPy vitals generator, built when the simulation thread starts.
+# CARE_SIM_SEED makes runs reproducible; CARE_SIM_DETERIORATION /
+# CARE_SIM_RECOVERY are per-tick probabilities of stable -> critical and
+# critical -> stable; CARE_SIM_CRISIS_AFTER keeps the scripted "first
+# patient goes critical" event (seconds, <0 disables it).
+def build_simulator():
+    from vitals_sim import VitalsSimulator  # numpy is only needed once the simulation runs
+    return VitalsSimulator(
+        SIMULATION_PARAMS, LOINC_CODES,
+        seed=int(os.environ["CARE_SIM_SEED"]) if os.environ.get("CARE_SIM_SEED") else None,
+        transitions={
+            ("stable", "critical"): float(os.environ.get("CARE_SIM_DETERIORATION", "0")),
+            ("critical", "stable"): float(os.environ.get("CARE_SIM_RECOVERY", "0"))
+        }
+    )
+SIM_CRISIS_AFTER = float(os.environ.get("CARE_SIM_CRISIS_AFTER", "30"))
+crisis_triggered = threading.Event()
+
+# Latest value per active patient per LOINC code, served by /patients/latest
+latest_vitals = LatestVitals()
+
+# Bounded per-patient vitals history for /patient/<id>/vitals trend charts.
+# Up to CARE_SERIES_CAPACITY samples per patient, allocated in chunks as the
+# stay gets longer. How much time that covers depends on the cadence: with the
+# default 4320 and the default CARE_SIM_CADENCE_*, about 2.4 h for RED (2 s),
+# 12 h for ORANGE (10 s) and 36 h for GREEN (30 s) patients.
+# CARE_SERIES_DIR keeps them in memory-mapped files instead of the heap. In
+# split mode the engine writes there and the API workers read the files.
+SERIES_CAPACITY = int(os.environ.get("CARE_SERIES_CAPACITY", "4320"))
+SERIES_DIR = os.environ.get("CARE_SERIES_DIR") or ("series" if SPLIT_MODE else None)
+_vitals_series = []
+_vitals_series_lock = threading.Lock()
+
+def vitals_series():
+    """The time-series store, created on first use (numpy is only needed once vitals arrive)."""
+    if not _vitals_series:
+        with _vitals_series_lock:
+            if not _vitals_series:
+                from vitals_series import VitalsSeries
+                _vitals_series.append(VitalsSeries(
+                    LOINC_CODES, capacity=SERIES_CAPACITY, spill_dir=SERIES_DIR, readonly=CARE_ROLE == "api"
+                ))
+    return _vitals_series[0]
+
+# Pushes vitals changes, status flips and new Flags to open dashboards via /stream
+events = Broadcaster()
+metrics.Gauge("care_stream_subscribers", "Open /stream connections.", fn=events.subscriber_count)
+
+# Name-indexed copy of every Patient, for instant search; loaded from FHIR at startup
+patient_directory = PatientDirectory()
+PATIENT_SEARCH_PAGE_SIZE = 50
+
+# NEWS2/qSOFA-style acuity per active patient, re-scored only when vitals change
+acuity = AcuityEngine(LOINC_CODES)
+
+# ========== State changes that cross processes in split mode ==========
+TRIAGE_VIEW_SIZE = 500  # entries of the triage queue published for the API workers
+_published_views = {"etag": None}
+_triage_view_cache = {"etag": None, "view": None}
+
+def broadcast(event, data):
+    """Pushes an event to every open /stream, whichever process serves it."""
+    if SPLIT_MODE:
+        shared_state.publish("event", {"event": event, "data": data})
+    else:
+        events.publish(event, data)
+
+def index_patients(resources):
+    """Adds new or changed Patient resources to the search directory of every API process."""
+    patient_directory.upsert_many(resources)
+    if CARE_ROLE == "api":
+        shared_state.publish("patients", resources)
+
+def set_patients_status(changes):
+    """Activates/deactivates [(patient_id, active, name)] in the simulation (the engine's, in split mode)."""
+    if CARE_ROLE == "api":
+        shared_state.publish("patients_status", changes)
+    else:
+        apply_patients_status(changes)
+
+def apply_patients_status(changes):
+    for patient_id, active, patient_name in changes:
+        if active:
+            latest_vitals.set_patient(patient_id, patient_name)
+            with patient_lock:
+                if patient_id not in active_patients:
+                    active_patients[patient_id] = { "state": "stable" }
+                    print(f"[INFO] Patient {patient_id} ACTIVATED and added to simulation.")
+        else:
+            latest_vitals.remove_patient(patient_id)
+            acuity.remove(patient_id)
+            vitals_series().remove_patient(patient_id)
+            with patient_lock:
+                if patient_id in active_patients:
+                    del active_patients[patient_id]
+                    print(f"[INFO] Patient {patient_id} DEACTIVATED and removed from simulation.")
+    publish_shared_views()
+
+def publish_shared_views():
+    """Engine process: writes the latest-vitals and triage read models for the API workers."""
+    if CARE_ROLE != "engine":
+        return
+    etag, payload = latest_vitals.snapshot()
+    if etag == _published_views["etag"]:
+        return
+    # Acuity only changes together with the latest-vitals table, so one etag covers both
+    triage = acuity.top(TRIAGE_VIEW_SIZE)
+    for entry in triage:
+        entry["name"] = latest_vitals.name(entry["patient_id"])
+    shared_state.put("triage", etag, json.dumps({"total": len(acuity), "entry": triage}))
+    shared_state.put("latest_vitals", etag, payload)
+    _published_views["etag"] = etag
+
+def latest_vitals_snapshot():
+    """(etag, payload) of the dashboard view: local, or as last published by the engine."""
+    if CARE_ROLE != "api":
+        return latest_vitals.snapshot()
+    etag, payload = shared_state.get("latest_vitals")
+    return (etag, payload) if etag else ("empty", b'{"version": 0, "patients": []}')
+
+def triage_view(k):
+    """{"total", "entry"} for the k most acute patients."""
+    if CARE_ROLE != "api":
+        entries = acuity.top(k)
+        for entry in entries:
+            entry["name"] = latest_vitals.name(entry["patient_id"])
+        return {"total": len(acuity), "entry": entries}
+    etag, value = shared_state.get("triage")
+    if etag is None:
+        return {"total": 0, "entry": []}
+    if etag != _triage_view_cache["etag"]:
+        _triage_view_cache["view"] = json.loads(value)  # parsed once per engine update
+        _triage_view_cache["etag"] = etag
+    view = _triage_view_cache["view"]
+    return {"total": view["total"], "entry": view["entry"][:k]}
+
 # ==============================================================================
 # API Routes (/patient for creation, /patients for retrieval)
 # ==============================================================================
@@ -138,7 +413,7 @@ def create_patient(current_user):
         patient_args = {
             "id": new_patient_id,
             "active": False,  # Patients are created as inactive by default.
-            "name": [HumanName(
+            "name": [fhir_models.HumanName(
                 use="official",
                 family=family_name,
                 given=[given_name],
@@ -149,29 +424,27 @@ def create_patient(current_user):
         }
 
         if telecom_data.get('value'):
-            patient_args['telecom'] = [ContactPoint(system='phone', use='home', value=telecom_data.get('value'))]
+            patient_args['telecom'] = [fhir_models.ContactPoint(system='phone', use='home', value=telecom_data.get('value'))]
         if any(address_data.values()):
-            patient_args['address'] = [Address(use="home", line=[address_data.get('line')], city=address_data.get('city'), state=address_data.get('state'), postalCode=address_data.get('postalCode'), country=address_data.get('country'))]
+            patient_args['address'] = [fhir_models.Address(use="home", line=[address_data.get('line')], city=address_data.get('city'), state=address_data.get('state'), postalCode=address_data.get('postalCode'), country=address_data.get('country'))]
 
-        patient = Patient(**patient_args)
-        
-        response = requests.put(
-            f"{FHIR_SERVER_BASE}/Patient/{new_patient_id}",
-            data=patient.model_dump_json(exclude_none=True),
-            headers={'Content-Type': 'application/json'}
-        )
-        response.raise_for_status()
+        patient = fhir_models.Patient(**patient_args)
+        patient_json = patient.model_dump_json(exclude_none=True)
+
+        # Acknowledged once it is in the outbox; the flusher writes it to FHIR
+        outbox.enqueue(bundle_entry("PUT", f"Patient/{new_patient_id}", patient_json), f"Patient/{new_patient_id}")
+        index_patients([json.loads(patient_json)])
         
         # CHANGE #2: Removed the logic that automatically added the patient
         # to the live simulation. This now happens only upon activation.
-        print(f"[INFO] New INACTIVE patient {new_patient_id} created in FHIR database.")
+        print(f"[INFO] New INACTIVE patient {new_patient_id} queued for the FHIR database.")
             
         return jsonify({"message": "Patient created successfully", "id": new_patient_id}), 201
 
-    except ValidationError as e: 
+    except fhir_models.ValidationError as e: 
         return jsonify({"message": "Invalid data provided for patient.", "details": e.errors()}), 400
-    except requests.exceptions.HTTPError as e: 
-        return jsonify({"message": "FHIR server rejected the patient data.", "details": e.response.text}), 502
+    except OutboxFull as e:
+        return jsonify({"message": "Too many writes are waiting for the FHIR data store.", "details": str(e)}), 503
     except Exception as e:
         print(f"[ERROR] An unexpected error occurred in create_patient: {type(e).__name__} - {e}")
         return jsonify({"message": "An unexpected server error occurred."}), 500
@@ -187,31 +460,32 @@ def update_patient_status(current_user, patient_id):
         return jsonify({"message": "Missing 'active' field"}), 400
 
     try:
-        # 1. Get the current patient resource from the FHIR server
-        get_response = requests.get(f"{FHIR_SERVER_BASE}/Patient/{patient_id}")
-        get_response.raise_for_status()
-        patient_json = get_response.json()
+        # 1. Get the current patient resource: the directory copy (which already
+        #    includes writes still in the outbox), a write another worker has
+        #    queued but not yet announced, or the FHIR server
+        patient_json = patient_directory.get(patient_id)
+        if patient_json is None and SPLIT_MODE:
+            queued = outbox.pending(f"Patient/{patient_id}")
+            patient_json = json.loads(queued).get("resource") if queued else None
+        if patient_json is None:
+            get_response = fhir.get(f"Patient/{patient_id}")
+            get_response.raise_for_status()
+            patient_json = get_response.json()
         
         # 2. Update the status
-        patient_json['active'] = new_status
+        patient_json = {**patient_json, 'active': new_status}
         
-        # 3. PUT the updated resource back
-        put_response = requests.put(
-            f"{FHIR_SERVER_BASE}/Patient/{patient_id}",
-            json=patient_json,
-            headers={'Content-Type': 'application/json'}
-        )
-        put_response.raise_for_status()
-        if new_status: # If patient is being activated 
-            with patient_lock:
-                if patient_id not in active_patients:
-                    active_patients[patient_id] = { "state": "stable" }
-                    print(f"[INFO] Patient {patient_id} ACTIVATED and added to simulation.")
-        else: # If patient is being deactivated
-            with patient_lock:
-                if patient_id in active_patients:
-                    del active_patients[patient_id]
-                    print(f"[INFO] Patient {patient_id} DEACTIVATED and removed from simulation.")
+        # 3. Queue the PUT of the updated resource
+        outbox.enqueue(bundle_entry("PUT", f"Patient/{patient_id}", json.dumps(patient_json)), f"Patient/{patient_id}")
+        index_patients([patient_json])
+
+        # 4. Add to / remove from the simulation (done by the engine process in split mode)
+        patient_name = (patient_json.get('name') or [{}])[0].get('text')
+        set_patients_status([(patient_id, bool(new_status), patient_name)])
+        if new_status:
+            broadcast("status", {"patient_id": patient_id, "active": True, "name": patient_name})
+        else:
+            broadcast("status", {"patient_id": patient_id, "active": False})
         
         return jsonify({"message": "Patient status updated successfully"}), 200
 
@@ -220,127 +494,509 @@ def update_patient_status(current_user, patient_id):
 
     except requests.exceptions.HTTPError as e:
         return jsonify({"message": "FHIR server error.", "details": e.response.text}), 502
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+        return jsonify({"message": "FHIR data store is unavailable.", "details": str(e)}), 503
+    except OutboxFull as e:
+        return jsonify({"message": "Too many writes are waiting for the FHIR data store.", "details": str(e)}), 503
     except Exception as e:
         print(f"[ERROR] An unexpected error occurred in update_patient_status: {e}")
         return jsonify({"message": "An unexpected server error occurred."}), 500
 
+# Bulk admissions (mass-casualty spreadsheets); see bulk_import.py for the column mapping
+@app.route('/patients/import', methods=['POST'])
+@token_required
+def import_patients(current_user):
+    """
+    Streams a CSV (with header) or NDJSON body, or a multipart 'file' upload,
+    into the FHIR outbox in chunks, so imports keep working while FHIR is
+    down like every other write; "imported" rows are queued durably, and a
+    row FHIR rejects later ends up in the outbox dead letters. ?activate=true
+    also adds the patients to the live simulation. Returns counts, rows/s
+    and per-row errors.
+    """
+    upload = request.files.get('file')
+    fmt = request.args.get('format') or ("ndjson" if "ndjson" in (request.mimetype or "") or
+                                         (upload and upload.filename.endswith((".ndjson", ".jsonl"))) else "csv")
+    if fmt not in ("csv", "ndjson"):
+        return jsonify({"message": "format must be 'csv' or 'ndjson'."}), 400
+    activate = request.args.get('activate', '').lower() in ("1", "true", "yes")
+    chunk_size = min(max(1, request.args.get('chunk', default=FHIR_BUNDLE_MAX_ENTRIES, type=int)), FHIR_BUNDLE_MAX_ENTRIES)
+    concurrency = min(max(1, request.args.get('concurrency', default=4, type=int)), 8)
+
+    def on_written(patients):
+        index_patients(patients)
+        if activate:
+            activate_patients(patients)
+
+    def queue_chunk(items):
+        try:
+            # Full-resource PUTs: a re-import replaces writes for the same patients that are still waiting
+            outbox.enqueue_many(items, supersede=True)
+        except OutboxFull as e:
+            return f"not queued: {e}"
+        return None
+
+    importer = BulkImporter(queue_chunk, chunk_size=chunk_size, concurrency=concurrency, on_written=on_written)
+    stream = io.TextIOWrapper(upload.stream if upload else request.stream, encoding="utf-8-sig", newline="")
+    report = importer.run(iter_rows(stream, fmt), activate=activate)
+    print(f"[INFO] Bulk import: {report['imported']}/{report['rows']} patients in {report['elapsed_s']}s ({report['rows_per_s']} rows/s), {report['failed']} failed.")
+    return jsonify(report), 200 if report["imported"] or not report["rows"] else 422
+
+def activate_patients(patients):
+    """Adds already-active Patient resources to the live simulation in one step."""
+    changes = [(patient["id"], True, (patient.get('name') or [{}])[0].get('text')) for patient in patients]
+    set_patients_status(changes)
+    for patient_id, _, patient_name in changes:
+        broadcast("status", {"patient_id": patient_id, "active": True, "name": patient_name})
+
 # /patients GET route 
 
+# Multi-page FHIR searches: page size, and how many later pages are fetched in parallel
+FHIR_SEARCH_PAGE_SIZE = int(os.environ.get("CARE_FHIR_PAGE_SIZE", "50"))
+FHIR_SEARCH_PAGE_WORKERS = int(os.environ.get("CARE_FHIR_PAGE_WORKERS", "4"))
+
+def wants_ndjson():
+    if request.args.get("_format") in ("ndjson", "application/x-ndjson", "application/fhir+ndjson"):
+        return True
+    return request.accept_mimetypes.best in ("application/x-ndjson", "application/fhir+ndjson")
+
+def forwarded_projection_params():
+    """_elements / _summary, passed on so the FHIR server trims too."""
+    return {key: request.args[key] for key in ("_elements", "_summary") if request.args.get(key)}
+
+def ndjson_response(entries, elements):
+    """
+    Streams one resource per line. The first entry is read up front, so a
+    FHIR failure before anything is sent still becomes an error status; a
+    later one ends the stream with an OperationOutcome line.
+    """
+    entries = iter(entries)
+    first = next(entries, None)
+    def generate():
+        try:
+            for entry in itertools.chain([first] if first is not None else [], entries):
+                yield json.dumps(project_entry(entry, elements)["resource"]) + "\n"
+        except requests.exceptions.RequestException as e:
+            print(f"[WARN] NDJSON search stream cut short: {e}")
+            yield json.dumps({"resourceType": "OperationOutcome", "issue": [
+                {"severity": "error", "code": "incomplete", "diagnostics": "FHIR search failed part-way; results are incomplete."}
+            ]}) + "\n"
+        except SearchTruncated as e:
+            print(f"[WARN] NDJSON search stream truncated: {e}")
+            yield json.dumps(incomplete_outcome(e)) + "\n"
+    return app.response_class(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+def incomplete_outcome(truncated):
+    """OperationOutcome telling the client that a search hit the gateway's page limit."""
+    return {"resourceType": "OperationOutcome", "issue": [
+        {"severity": "warning", "code": "incomplete",
+         "diagnostics": f"Only the first {truncated.pages} result pages were read; results are incomplete."}
+    ]}
+
 @app.route('/patients')
 @token_required
 def get_patients_fhir(current_user):
+    """
+    Every active patient with their Observations (_revinclude), across all
+    FHIR result pages (fetched in parallel). _elements=a,b or _summary=true
+    return a compact projection (included Observations keep only code,
+    value, time and subject); _format=ndjson (or Accept:
+    application/x-ndjson) streams one resource per line.
+    """
+    params = {"active": "true", "_revinclude": "Observation:subject", "_count": FHIR_SEARCH_PAGE_SIZE,
+              **forwarded_projection_params()}
+    elements = projection(request.args)
+    pages = iter_pages(fhir, "Patient", params, max_workers=FHIR_SEARCH_PAGE_WORKERS)
+    truncated = None
     try:
-        url = f"{FHIR_SERVER_BASE}/Patient?active=true&_revinclude=Observation:subject"
-        response = requests.get(url)
-        response.raise_for_status()
-        return jsonify(response.json())
+        if wants_ndjson():
+            return ndjson_response((entry for page in pages for entry in page.get("entry", [])), elements)
+        first = next(pages)
+        entries = [project_entry(entry, elements) for entry in first.get("entry", [])]
+        for page in pages:
+            entries.extend(project_entry(entry, elements) for entry in page.get("entry", []))
+    except SearchTruncated as e:
+        print(f"[WARN] /patients truncated: {e}")
+        truncated = e
     except requests.exceptions.RequestException as e:
         return jsonify({"error": "Could not connect to the FHIR data store"}), 500
+    matches = sum(1 for entry in entries if entry.get("search", {}).get("mode", "match") == "match")
+    total = first.get("total", matches)
+    if truncated:
+        # FHIR's way to flag a partial searchset: an OperationOutcome entry with search mode "outcome"
+        entries.append({"resource": incomplete_outcome(truncated), "search": {"mode": "outcome"}})
+    return jsonify({"resourceType": "Bundle", "type": "searchset", "total": total, "entry": entries})
+
+
+@app.route('/patients/latest')
+@token_required
+def get_latest_vitals(current_user):
+    """
+    Compact dashboard view: active patients with only their newest value per
+    LOINC code, served from memory. Supports If-None-Match / 304.
+    """
+    etag, payload = latest_vitals_snapshot()
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(payload, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.route('/patient/<patient_id>/vitals')
+@token_required
+def get_patient_vitals_series(current_user, patient_id):
+    """
+    Trend data for one patient from the in-memory time-series store:
+    min/max/mean per `resolution` bucket over the last `window`
+    (seconds, or with an s/m/h/d suffix; defaults 1h and 1m).
+    """
+    from vitals_series import parse_duration
+    try:
+        window = parse_duration(request.args.get('window'), 3600)
+        resolution = parse_duration(request.args.get('resolution'), 60)
+    except ValueError as e:
+        return jsonify({"message": f"Invalid window or resolution: {e}"}), 400
+    result = vitals_series().query(patient_id, window, resolution)
+    if result is None:
+        return jsonify({"message": "No vitals recorded for this patient (not active?)."}), 404
+    units = {key: unit for key, (_, unit) in LOINC_CODES.items()}
+    for key, series in result["series"].items():
+        series["unit"] = units[key]
+    return jsonify({"patient_id": patient_id, "window": window, "resolution": resolution, **result})
+
+
+@app.route('/triage/queue')
+@token_required
+def get_triage_queue(current_user):
+    """The k most acute active patients (default 10), highest NEWS2-style score first."""
+    k = request.args.get('k', default=10, type=int)
+    return jsonify(triage_view(max(0, k)))
+
+
+@app.route('/stats/fhir')
+@token_required
+def get_fhir_client_stats(current_user):
+    """Connection pool, circuit breaker and per-call latency stats of the shared FHIR client."""
+    return jsonify(fhir.stats())
+
+@app.route('/stats/simulation')
+@token_required
+def get_simulation_stats(current_user):
+    """Per-patient sampling cadence: intervals by band, missed deadlines and lateness."""
+    if CARE_ROLE == "api":
+        return jsonify({"message": "The simulation runs in the engine process; see its /metrics."}), 404
+    return jsonify(cadence_scheduler.stats())
+
+@app.route('/stats/outbox')
+@token_required
+def get_outbox_stats(current_user):
+    """Depth, replay lag and delivery counters of the durable FHIR write queue."""
+    return jsonify(outbox.stats())
+
+
+@app.route('/stream')
+@token_required(allow_query=True)
+def stream_events(current_user):
+    """
+    Server-sent events for the dashboard: "vitals" (only changed values),
+    "status" (activation flips), "flag" (new analysis alerts), "acuity"
+    ({"patient_id", "band", "previous"} when a patient's triage band
+    changes; "previous" is null for a first score) and "resync".
+    """
+    response = app.response_class(events.stream(events.subscribe()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
     
 
 @app.route('/patients/search', methods=['GET'])
 @token_required
 def search_patients(current_user):
-    """Searches for patients by name (case-insensitive, partial match)."""
-    search_name = request.args.get('name', '')
-    if not search_name:
-        # Return an empty bundle if no search term is provided
-        return jsonify(Bundle(type="searchset", total=0, entry=[]).model_dump())
+    """
+    Searches for patients by name (case-insensitive, partial match over given,
+    family and full name), ranked and paginated with _offset/_count. An empty
+    name lists every patient. Served from the in-memory patient directory;
+    FHIR is only asked while the directory is loading or on a miss.
+    """
+    search_name = request.args.get('name', '').strip()
+    offset = max(0, request.args.get('_offset', default=0, type=int))
+    count = min(max(1, request.args.get('_count', default=PATIENT_SEARCH_PAGE_SIZE, type=int)), 500)
+    elements = projection(request.args)
+    ndjson = wants_ndjson()  # every match from _offset on, streamed
+
+    if patient_directory.ready:
+        total, resources = patient_directory.search(search_name, offset, count)
+        if ndjson and total > offset + count:
+            total, resources = patient_directory.search(search_name, offset, total - offset)
+        if total or not search_name:
+            if ndjson:
+                return ndjson_response(({"resource": resource} for resource in resources), elements)
+            return jsonify(search_bundle([project(r, elements) if elements else r for r in resources],
+                                         total, search_name, offset, count))
 
+    # Directory miss (or still loading): use the FHIR ':contains' modifier and remember what comes back
+    params = {"_count": FHIR_SEARCH_PAGE_SIZE if ndjson else count, "_getpagesoffset": offset}
+    if search_name:
+        params["name:contains"] = search_name
     try:
-        # Use the FHIR ':contains' modifier for a partial search
-        url = f"{FHIR_SERVER_BASE}/Patient?name:contains={search_name}"
-        response = requests.get(url)
+        if ndjson:
+            def remembered(entries):
+                for entry in entries:
+                    if "resource" in entry:
+                        patient_directory.upsert(entry["resource"])
+                    yield entry
+            return ndjson_response(remembered(iter_entries(fhir, "Patient", params, max_workers=FHIR_SEARCH_PAGE_WORKERS)), elements)
+        response = fhir.get("Patient", params=params)
         response.raise_for_status()
-        return jsonify(response.json())
+        bundle = response.json()
     except requests.exceptions.RequestException as e:
         return jsonify({"error": "Could not connect to the FHIR data store"}), 500
+    resources = [e["resource"] for e in bundle.get("entry", []) if "resource" in e]
+    patient_directory.upsert_many(resources)
+    # Same shape as a directory result; the next link points back here, not at the FHIR server
+    total = bundle.get("total", offset + len(resources) + (count if next_link(bundle) else 0))
+    return jsonify(search_bundle([project(r, elements) if elements else r for r in resources], total, search_name, offset, count))
+
+def search_bundle(resources, total, search_name, offset, count):
+    """A FHIR searchset Bundle (dict) for one page of results, with a next link if there are more."""
+    bundle = {"resourceType": "Bundle", "type": "searchset", "total": total,
+              "entry": [{"resource": resource} for resource in resources]}
+    if offset + count < total:
+        query = urlencode({"name": search_name, "_offset": offset + count, "_count": count, **forwarded_projection_params()})
+        bundle["link"] = [{"relation": "next", "url": f"/patients/search?{query}"}]
+    return bundle
+
+def load_patient_directory():
+    """Pages through every Patient in FHIR into the patient directory, then marks it ready."""
+    try:
+        for page in iter_pages(fhir, "Patient", {"_count": 500}, max_workers=FHIR_SEARCH_PAGE_WORKERS, max_pages=100000):
+            patient_directory.upsert_many(e["resource"] for e in page.get("entry", []) if "resource" in e)
+        patient_directory.ready = True
+        print(f"[INFO] Patient directory loaded ({len(patient_directory)} patients).")
+    except (requests.exceptions.RequestException, ValueError, SearchTruncated) as e:
+        print(f"[WARN] Could not load patient directory from FHIR, searches will use FHIR: {e}")
     
 # ==============================================================================
 # SIMULATION LOGIC (Heavily updated)
 # ==============================================================================
-def create_observation(patient_id, loinc_code, unit, value):
-    """Helper function to create a FHIR Observation resource."""
-    obs = Observation(
-        status="final", 
-        category=[CodeableConcept(coding=[Coding(system="http://terminology.hl7.org/CodeSystem/observation-category", code="vital-signs")])], 
-        code=CodeableConcept(coding=[Coding(system="http://loinc.org", code=loinc_code)]), 
-        subject=Reference(reference=f"Patient/{patient_id}"), 
-        effectiveDateTime=datetime.now().isoformat() + "Z", 
-        valueQuantity=Quantity(value=value, unit=unit)
-    )
-    return obs
+def post_bundle(entries, labels=None):
+    """
+    Sends FHIR Bundle entries (dicts or already-serialized JSON strings) as
+    batch Bundles of at most FHIR_BUNDLE_MAX_ENTRIES, one HTTP call per
+    chunk. Returns a list of (label, status, details) for every entry that
+    did not succeed.
+    """
+    labels = labels or list(range(len(entries)))
+    failures = []
+    for start in range(0, len(entries), FHIR_BUNDLE_MAX_ENTRIES):
+        chunk = entries[start:start + FHIR_BUNDLE_MAX_ENTRIES]
+        chunk_labels = labels[start:start + FHIR_BUNDLE_MAX_ENTRIES]
+        body = '{"resourceType":"Bundle","type":"batch","entry":[%s]}' % (
+            ",".join(e if isinstance(e, str) else json.dumps(e) for e in chunk))
+        try:
+            response = fhir.post("", data=body.encode("utf-8"), headers={'Content-Type': 'application/fhir+json'})
+            response.raise_for_status()
+            response_entries = response.json().get("entry", [])
+        except (requests.exceptions.RequestException, ValueError) as e:
+            # A failed call fails every entry in the chunk; a 5xx for the whole Bundle
+            # still counts as an answer from FHIR, a transport error does not
+            code = getattr(getattr(e, "response", None), "status_code", None)
+            status = str(code) if code and code >= 500 else None
+            failures.extend((label, status, str(e)) for label in chunk_labels)
+            continue
 
-def update_vitals_periodically():
-    while True:
+        for label, response_entry in zip(chunk_labels, response_entries):
+            status = response_entry.get("response", {}).get("status", "")
+            if not status.startswith("2"):
+                outcome = response_entry.get("response", {}).get("outcome")
+                failures.append((label, status, outcome))
+        if len(response_entries) < len(chunk):
+            failures.extend((label, None, "missing from response") for label in chunk_labels[len(response_entries):])
+    return failures
+
+def handle_vitals_changes(changed):
+    """
+    Groups changed (patient_id, loinc, value, unit, effective) records per
+    patient, pushes them to dashboards and re-scores only those patients.
+    """
+    by_patient = {}
+    for patient_id, code, value, _, _ in changed:
+        by_patient.setdefault(patient_id, {})[code] = value
+    for patient_id, vitals in by_patient.items():
+        broadcast("vitals", {"patient_id": patient_id, "vitals": vitals})
+
+    latest = {patient_id: latest_vitals.get(patient_id) for patient_id in by_patient}
+    for patient_id, old_band, new_band in acuity.rescore({p: v for p, v in latest.items() if v is not None}):
+        broadcast("acuity", {"patient_id": patient_id, "band": new_band, "previous": old_band})
+
+def simulation_tick(simulator, patient_ids=None):
+    """
+    One simulation step for every active patient (or only `patient_ids`,
+    the ones the cadence scheduler found due): state transitions, one
+    vitals panel each, queued to FHIR and applied locally. Returns the
+    number of patients simulated.
+    """
+    with patient_lock:
+        # Check for any new patients and initialize their state
+        for pat_id in list(active_patients.keys()):
+            if "state" not in active_patients[pat_id]:
+                active_patients[pat_id]["state"] = "stable"
+        simulator.sync(active_patients)
+
+    if not len(simulator):
+        return 0
+    rows = None if patient_ids is None else [simulator.row(p) for p in patient_ids if p in simulator]
+    if rows == []:
+        return 0
+
+    # Vectorized state transitions for the sampled patients
+    changed_states = simulator.step_states(rows)
+
+    # Crisis event logic: sets the first patient's state to "critical" (once)
+    first_patient_id = simulator.patient_ids[0]
+    if not crisis_triggered.is_set() and SIM_CRISIS_AFTER >= 0 and (time.time() - start_time) > SIM_CRISIS_AFTER and simulator.get_state(first_patient_id) == "stable":
+        print(f"[CRISIS EVENT] Triggering crisis for patient {first_patient_id}...")
+        simulator.set_state(first_patient_id, "critical")
+        changed_states.append(first_patient_id)
+        crisis_triggered.set()
+        # Sampled at the next wake-up and from then on at the RED cadence, not at its old deadline
+        cadence_scheduler.expedite(first_patient_id, time.monotonic())
+
+    if changed_states:
         with patient_lock:
-            # Check for any new patients and initialize their state
-            for pat_id in list(active_patients.keys()):
-                if "state" not in active_patients[pat_id]:
-                    active_patients[pat_id]["state"] = "stable"
+            for pat_id in changed_states:
+                if pat_id in active_patients:
+                    active_patients[pat_id]["state"] = simulator.get_state(pat_id)
 
-            current_patients_to_simulate = list(active_patients.keys())
+    # One array draw for the whole tick; the observations go to FHIR through the outbox
+    entries, records = [], []
+    effective = now_timestamp()
+    sampled_at = time.time()
+    series = vitals_series()
+    for pat_id, panel in simulator.panels(rows):
+        series.append(pat_id, sampled_at, panel)
+        for key, (loinc, unit) in LOINC_CODES.items():
+            # PUT with a deterministic id: replaying a batch FHIR already committed cannot duplicate it
+            obs_id = observation_id(pat_id, loinc, effective)
+            obs_json = observation_serializer.dumps(pat_id, loinc, unit, panel[key], effective, resource_id=obs_id)
+            entries.append((bundle_entry("PUT", f"Observation/{obs_id}", obs_json), None))
+            records.append((pat_id, loinc, panel[key], unit, effective))
 
-        if not current_patients_to_simulate:
-            time.sleep(1); continue
+    try:
+        outbox.enqueue_many(entries)
+        queued = f"{len(entries)} observations queued, outbox depth {outbox.depth()}"
+    except OutboxFull as e:
+        # Backpressure: drop this tick's FHIR writes, but keep local alerts and dashboards live
+        queued = f"observations NOT queued: {e}"
 
-        # Crisis event logic: sets the first patient's state to "critical"
-        first_patient_id = current_patients_to_simulate[0]
-        if "state" in active_patients.get(first_patient_id, {}) and active_patients[first_patient_id]["state"] == "stable" and (time.time() - start_time) > 30:
-            print(f"[CRISIS EVENT] Triggering crisis for patient {first_patient_id}...")
-            with patient_lock:
-                active_patients[first_patient_id]["state"] = "critical"
-        
-        for pat_id in current_patients_to_simulate:
-            with patient_lock:
-                patient_state = active_patients.get(pat_id, {}).get("state")
-            if not patient_state: continue
+    # Local acknowledgement: the dashboards and acuity scores do not wait for FHIR
+    changed = latest_vitals.update_many(records)
+    handle_vitals_changes(changed)
+    publish_shared_views()
 
-            params = SIMULATION_PARAMS[patient_state]
-            
-            # Generate and post an observation for each parameter
-            for key, (loinc, unit) in LOINC_CODES.items():
-                min_val, max_val = params[key]
-                
-                # Use float for most values, int for GCS/Resp Rate
-                is_float = key not in ["gcs", "respiratory_rate"]
-                
-                mean = (min_val + max_val) / 2
-                std_dev = (max_val - min_val) / 4
-                
-                if is_float:
-                    val = round(random.gauss(mean, std_dev), 1)
-                else:
-                    val = int(random.gauss(mean, std_dev))
-
-                # Create and post the observation
-                obs = create_observation(pat_id, loinc, unit, val)
-                try:
-                    requests.post(f"{FHIR_SERVER_BASE}/Observation", data=obs.model_dump_json(exclude_none=True), headers={'Content-Type': 'application/json'}).raise_for_status()
-                except requests.exceptions.RequestException as e:
-                    print(f"Failed to post {key} for patient {pat_id}: {e}")
+    if patient_ids is None:
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] New full vital panels for {len(simulator)} active patient(s) ({queued}).")
+    else:
+        sim_log["panels"] += len(rows)
+        sim_log["queued"] = queued
+    return len(simulator) if rows is None else len(rows)
 
-        print(f"[{datetime.now().strftime('%H:%M:%S')}] Posted new full vital panels for {len(current_patients_to_simulate)} active patient(s).")
-        time.sleep(10) # Update every 10 seconds to avoid spamming the server
+# Per-patient sampling cadence by acuity band (seconds, +/- CARE_SIM_JITTER of it).
+# Each wake-up samples every patient due within SIM_BATCH_SLACK, at most
+# SIM_MAX_BATCH of them, so a large due set cannot hold up the next deadlines.
+SIM_CADENCE = {
+    BAND_RED: float(os.environ.get("CARE_SIM_CADENCE_RED", "2")),
+    BAND_ORANGE: float(os.environ.get("CARE_SIM_CADENCE_ORANGE", "10")),
+    BAND_GREEN: float(os.environ.get("CARE_SIM_CADENCE_GREEN", "30")),
+}
+SIM_JITTER = float(os.environ.get("CARE_SIM_JITTER", "0.1"))
+SIM_ADMIT_SPREAD = float(os.environ.get("CARE_SIM_ADMIT_SPREAD", "1.0"))  # first sample of a new admission within this many seconds
+SIM_BATCH_SLACK = 0.05
+SIM_MAX_BATCH = int(os.environ.get("CARE_SIM_MAX_BATCH", "500"))
+SIM_IDLE_WAIT = 1.0  # longest sleep, so newly activated patients are picked up quickly
+SIM_TICK_SECONDS = metrics.Histogram("care_sim_tick_seconds", "Duration of one simulation batch (all patients due at one wake-up).")
+SIM_TICK_PATIENTS = metrics.Gauge("care_sim_tick_patients", "Patients sampled in the last simulation batch.")
+SIM_TICK_DRIFT = metrics.Gauge("care_sim_tick_drift_seconds", "How late the most overdue patient of the last batch was sampled.")
+SIM_SAMPLE_LATENESS = metrics.Histogram("care_sim_sample_lateness_seconds", "How late each patient was sampled against its deadline.")
+SIM_MISSED_DEADLINES = metrics.Counter("care_sim_missed_deadlines", "Samples that were a whole interval or more late.")
+cadence_scheduler = CadenceScheduler(SIM_CADENCE, default_band=BAND_GREEN, jitter=SIM_JITTER, admit_spread=SIM_ADMIT_SPREAD)
+sim_log = {"panels": 0, "queued": None}
+
+def cadence_band(simulator, patient_id):
+    """The acuity band that sets a patient's cadence; a simulated crisis counts as RED before it is scored."""
+    if simulator.get_state(patient_id) == "critical":
+        return BAND_RED
+    score = acuity.get(patient_id)
+    return score[2] if score else BAND_GREEN
+
+def update_vitals_periodically():
+    simulator = build_simulator()
+    last_log = time.monotonic()
+    while True:
+        now = time.monotonic()
+        with patient_lock:
+            patient_ids = list(active_patients)
+        cadence_scheduler.sync(patient_ids, now)
+
+        due = cadence_scheduler.due(now, until=now + SIM_BATCH_SLACK, limit=SIM_MAX_BATCH)
+        if due:
+            SIM_TICK_DRIFT.set(max(0.0, now - due[0][1]))
+            for _, deadline in due:
+                SIM_SAMPLE_LATENESS.observe(max(0.0, now - deadline))
+            with SIM_TICK_SECONDS.time():
+                sampled = simulation_tick(simulator, [patient_id for patient_id, _ in due])
+            SIM_TICK_PATIENTS.set(sampled)
+            done = time.monotonic()
+            SIM_MISSED_DEADLINES.inc(cadence_scheduler.reschedule(
+                [(patient_id, deadline, cadence_band(simulator, patient_id)) for patient_id, deadline in due if patient_id in simulator],
+                done
+            ))
 
+        if time.monotonic() - last_log >= 60:
+            stats = cadence_scheduler.stats()
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Sampled {sim_log['panels']} vital panel(s) in the last minute for "
+                  f"{stats['patients']} active patient(s); {stats['missed_deadlines']} missed deadline(s) so far ({sim_log['queued']}).")
+            sim_log["panels"] = 0
+            last_log = time.monotonic()
 
+        next_deadline = cadence_scheduler.next_deadline()
+        wait = SIM_IDLE_WAIT if next_deadline is None else min(SIM_IDLE_WAIT, next_deadline - time.monotonic())
+        if wait > 0:
+            time.sleep(wait)
+
+
+def seed_latest_vitals():
+    """Loads active patients and their observations from FHIR into the latest-vitals table once at startup."""
+    try:
+        params = {"active": "true", "_revinclude": "Observation:subject", "_count": FHIR_SEARCH_PAGE_SIZE}
+        # Every page: each carries its patients together with their _revinclude'd Observations
+        for bundle in iter_pages(fhir, "Patient", params, max_workers=FHIR_SEARCH_PAGE_WORKERS, max_pages=100000):
+            handle_vitals_changes(latest_vitals.ingest_bundle(bundle))
+            # Patients that are active in FHIR keep being simulated across restarts,
+            # their first samples spread out rather than all due at once
+            with patient_lock:
+                restored = [entry["resource"]["id"] for entry in bundle.get("entry", [])
+                            if entry.get("resource", {}).get("resourceType") == "Patient"
+                            and entry["resource"]["id"] not in active_patients]
+                cadence_scheduler.restore(restored)
+                for patient_id in restored:
+                    active_patients[patient_id] = {"state": "stable"}
+        publish_shared_views()
+        print("[INFO] Latest-vitals table seeded from FHIR.")
+    except (requests.exceptions.RequestException, ValueError, SearchTruncated) as e:
+        print(f"[WARN] Could not seed latest-vitals table from FHIR: {e}")
 
-def read_groups_db():
-    with db_lock:
-        with open(GROUPS_DB_FILE, 'r') as f:
-            return json.load(f)
 
-def write_groups_db(data):
-    with db_lock:
-        with open(GROUPS_DB_FILE, 'w') as f:
-            json.dump(data, f, indent=2)
 # ==============================================================================
 # Group Management API Endpoints
 # ==============================================================================
 @app.route('/group', methods=['POST'])
 @token_required
 def create_group(current_user):
-    """Creates a new group in the groups_db.json file."""
+    """Creates a new group in the group store."""
     data = request.json
     if not data.get("name"):
         return jsonify({"message": "Group name is required."}), 400
@@ -354,108 +1010,301 @@ def create_group(current_user):
         "createdAt": datetime.utcnow().isoformat() + "Z"
     }
     
-    db_data = read_groups_db()
-    db_data['groups'].append(new_group)
-    write_groups_db(db_data)
+    group_store.create(new_group)
     
     return jsonify(new_group), 201
 
 @app.route('/groups', methods=['GET'])
 @token_required
 def get_groups(current_user):
-    """Lists all groups from the groups_db.json file, sorted by creation date."""
-    db_data = read_groups_db()
-    # Sort groups by createdAt timestamp, newest first
-    sorted_groups = sorted(db_data['groups'], key=lambda g: g['createdAt'], reverse=True)
-    return jsonify({"entry": [{"resource": group} for group in sorted_groups]})
+    """Lists all groups, newest first (served from the store's createdAt index)."""
+    return jsonify({"entry": [{"resource": group} for group in group_store.newest_first()]})
 
 @app.route('/group/<group_id>/status', methods=['POST'])
 @token_required
 def update_group_status(current_user, group_id):
-    """Activates or deactivates a group in the groups_db.json file."""
+    """Activates or deactivates a group in the group store."""
     data = request.json
-    new_status = data.get('active')
-    
-    db_data = read_groups_db()
-    group_found = False
-    for group in db_data['groups']:
-        if group['id'] == group_id:
-            group['active'] = new_status
-            group_found = True
-            break
+    new_status = data.get('active') if isinstance(data, dict) else None
+    if not isinstance(new_status, bool):
+        return jsonify({"message": "'active' must be true or false."}), 400
     
-    if group_found:
-        write_groups_db(db_data)
+    if group_store.update(group_id, active=new_status) is not None:
+        if new_status:
+            request_group_analysis(group_id)
         return jsonify({"message": "Group status updated successfully"}), 200
     else:
         return jsonify({"message": "Group not found"}), 404
         
+def group_fhir_entry(group):
+    """The FHIR Group PUT for a stored group, as an outbox Bundle entry (the store is authoritative)."""
+    fhir_group = fhir_models.Group(
+        id=group["id"], type="person", membership="enumerated", name=group["name"], active=group["active"],
+        member=[fhir_models.GroupMember(entity=fhir_models.Reference(reference=f"Patient/{member_id(m)}"))
+                for m in group.get("members", [])] or None
+    )
+    return bundle_entry("PUT", f"Group/{group['id']}", fhir_group.model_dump_json(exclude_none=True)), fhir_group
+
+def group_etag(group):
+    return f'W/"{group.get("version", 0)}"'
+
+def change_group_members(group_id, add=(), remove=(), expected_version=None):
+    """
+    Applies a membership change to the group store (atomic, set-based,
+    conflict-safe) and queues one PUT of the whole FHIR Group, replacing
+    any earlier one that has not been sent yet. Returns (group, added, removed, fhir_group) or
+    None if the group is unknown. The changed group is validated as a FHIR
+    Group before it is stored, so a ValueError leaves both copies untouched.
+    """
+    result = group_store.update_members(group_id, add=add, remove=remove, expected_version=expected_version,
+                                        check=group_fhir_entry)
+    if result is None:
+        return None
+    group, added, removed = result
+    entry, fhir_group = group_fhir_entry(group)
+    if added or removed:
+        try:
+            outbox.enqueue(entry, f"Group/{group_id}", supersede=True)
+        except OutboxFull as e:
+            # The store already has the change; the next one re-sends the whole Group
+            print(f"[WARN] FHIR copy of Group/{group_id} not updated: {e}")
+        request_group_analysis(group_id)
+    return group, added, removed, fhir_group
+
 @app.route('/group/<group_id>/members', methods=['POST'])
 @token_required
 def add_group_member(current_user, group_id):
-    """Adds a patient to an existing FHIR Group in the HAPI FHIR DB."""
+    """Adds one patient to a group; the FHIR Group is updated through the outbox."""
     data = request.json
-    patient_id = data.get("patient_id")
-    if not patient_id:
+    patient_id = data.get("patient_id") if isinstance(data, dict) else None
+    if not isinstance(patient_id, str) or not patient_id:
         return jsonify({"message": "patient_id is required"}), 400
     try:
-        # 1. Fetch the existing Group from the FHIR DB
-        get_response = requests.get(f"{FHIR_SERVER_BASE}/Group/{group_id}")
-        get_response.raise_for_status()
-        group = Group(**get_response.json())
-
-        # 2. Add a new member to the Group object in memory
-        if group.member is None:
-            group.member = []
-        
-        # Avoid adding duplicate members
-        if not any(member.entity.reference == f"Patient/{patient_id}" for member in group.member):
-            new_member = GroupMember(entity=Reference(reference=f"Patient/{patient_id}"))
-            group.member.append(new_member)
-        
-        # 3. Save the entire updated Group object back to the FHIR DB
-        put_response = requests.put(
-            f"{FHIR_SERVER_BASE}/Group/{group_id}", 
-            data=group.model_dump_json(exclude_none=True), 
-            headers={'Content-Type': 'application/json'}
-        )
-        put_response.raise_for_status()
-        return jsonify(put_response.json()), 200
+        result = change_group_members(group_id, add=[patient_id])
+    except ValueError as e:
+        return jsonify({"message": f"Group cannot be written as a FHIR Group: {e}"}), 422
     except Exception as e:
         return jsonify({"message": f"Error adding member: {e}"}), 500
+    if result is None:
+        return jsonify({"message": "Group not found"}), 404
+    group, _, _, fhir_group = result
+    return jsonify(fhir_group.model_dump(mode="json", exclude_none=True)), 200, {"ETag": group_etag(group)}
+
+@app.route('/group/<group_id>/members', methods=['PATCH'])
+@token_required
+def patch_group_members(current_user, group_id):
+    """
+    Bulk membership change: {"add": [patient ids], "remove": [patient ids]}
+    in one atomic update and one FHIR write. Duplicates and ids that are
+    already (or not) members are skipped. With If-Match: W/"<version>",
+    the change is refused with 412 if the group has changed since.
+    """
+    data = request.json
+    if not isinstance(data, dict):
+        return jsonify({"message": "The body must be a JSON object with 'add' and/or 'remove'."}), 400
+    add, remove = data.get("add") or [], data.get("remove") or []
+    if not isinstance(add, list) or not isinstance(remove, list) or not all(isinstance(p, str) and p for p in add + remove):
+        return jsonify({"message": "'add' and 'remove' must be lists of patient ids."}), 400
+    if set(add) & set(remove):
+        return jsonify({"message": "A patient cannot be both added and removed.", "patients": sorted(set(add) & set(remove))}), 400
+
+    expected_version = None
+    if_match = request.headers.get("If-Match")
+    if if_match and if_match != "*":
+        try:
+            expected_version = int(if_match.strip().removeprefix("W/").strip('"'))
+        except ValueError:
+            return jsonify({"message": 'If-Match must be a group ETag such as W/"3".'}), 400
+
+    try:
+        result = change_group_members(group_id, add=add, remove=remove, expected_version=expected_version)
+    except VersionConflict as e:
+        return jsonify({"message": "The group was changed by someone else; reload it and retry.",
+                        "version": e.current_version}), 412
+    except ValueError as e:
+        return jsonify({"message": f"Group cannot be written as a FHIR Group: {e}"}), 422
+    if result is None:
+        return jsonify({"message": "Group not found"}), 404
+    group, added, removed, _ = result
+    return jsonify({"group": group, "added": added, "removed": removed}), 200, {"ETag": group_etag(group)}
+
+# ==============================================================================
+# Federated Query API Endpoints
+# ==============================================================================
+@app.route('/federated/query', methods=['POST'])
+@token_required
+def federated_query(current_user):
+    """Asks every peer hospital a question in parallel; returns what arrived before the deadline."""
+    data = request.json or {}
+    question_code = data.get("question_code")
+    if not isinstance(question_code, str) or not question_code.strip():
+        return jsonify({"message": "question_code must be a non-empty string."}), 400
+    try:
+        timeout = float(data.get("timeout") or federated.timeout)
+    except (TypeError, ValueError):
+        return jsonify({"message": "timeout must be a number of seconds."}), 400
+    if not math.isfinite(timeout):
+        return jsonify({"message": "timeout must be a number of seconds."}), 400
+    # Between 0.1 s (a zero/negative deadline would return before any peer is asked) and 30 s
+    timeout = min(max(timeout, 0.1), 30.0)
+    # Optional; it ends up in GET /federated/query/<query_id>, so it must be a short id
+    query_id = data.get("query_id")
+    if query_id is not None and not (isinstance(query_id, str) and FHIR_ID.fullmatch(query_id)):
+        return jsonify({"message": "query_id must be 1-64 letters, digits, '-' or '.'."}), 400
+    try:
+        result = federated.query(question_code, context=data.get("context"), query_id=query_id, timeout=timeout)
+    except DuplicateQuery:
+        return jsonify({"message": f"query_id '{query_id}' is already in use."}), 409
+    return jsonify(result), 200
+
+@app.route('/federated/query/<query_id>')
+@token_required
+def get_federated_query(current_user, query_id):
+    """An earlier federated query, including answers that arrived after its deadline."""
+    result = federated.get(query_id)
+    if result is None:
+        return jsonify({"message": "Unknown query_id."}), 404
+    return jsonify(result), 200
 
 # ==============================================================================
 # AUTOMATION LOGIC (UPDATED)
 # ==============================================================================
-def run_group_analysis_periodically():
-    analyzed_groups = set()
+def build_analysis_input(group):
+    """Member patient dicts for an analyzer: any attributes stored on the member plus latest vitals."""
+    patients = []
+    for member in group.get("members", []):
+        member = member if isinstance(member, dict) else {"id": member}
+        patients.append({**member, "vitals": latest_vitals.get(member["id"]) or {}})
+    return patients
+
+def post_analysis_flag(group_id, result, content_hash):
+    """
+    Saves an analyzer insight as a FHIR Flag and pushes it to open dashboards.
+    The Flag id is derived from the group, the insight and the group content
+    the analysis saw, so a replayed outbox write cannot add a second Flag.
+    """
+    resource_id = flag_id(group_id, result["patient_id"], result.get("insight_code", ""), content_hash)
+    flag = fhir_models.Flag(
+        id=resource_id,
+        status="active",
+        category=[fhir_models.CodeableConcept(text="Clinical Alert")],
+        code=fhir_models.CodeableConcept(text=result["insight_text"]),
+        subject=fhir_models.Reference(reference=f"Patient/{result['patient_id']}")
+    )
+    outbox.enqueue(bundle_entry("PUT", f"Flag/{resource_id}", flag.model_dump_json(exclude_none=True)), f"Flag/{resource_id}")
+    broadcast("flag", {"group_id": group_id, "patient_id": result['patient_id'], "text": result["insight_text"]})
+    print(f"[AUTOMATION] ANALYSIS COMPLETE: Queued Flag for Patient/{result['patient_id']}")
+
+# Group ids whose membership or status changed; drained by run_group_analysis_worker
+analysis_queue = queue.Queue()
+metrics.Gauge("care_analysis_queue_depth", "Group analysis requests waiting for the worker.", fn=analysis_queue.qsize)
+
+def request_group_analysis(group_id):
+    if CARE_ROLE == "api":
+        shared_state.publish("analyze", group_id)  # the engine's analysis worker picks it up
+    else:
+        analysis_queue.put(group_id)
+
+def group_content_hash(group):
+    """Identifies what an analysis saw: the group type and its (sorted) member ids."""
+    member_ids = sorted(m["id"] if isinstance(m, dict) else m for m in group.get("members", []))
+    return hashlib.sha256(json.dumps([group["type"], member_ids]).encode("utf-8")).hexdigest()
+
+# Declarative rule sets per group type (rules/<type>.json, reloaded when edited), see rule_engine.py.
+# Group types without a rule set still go to the analyzer pool. Rule groups are
+# also re-evaluated every CARE_RULES_INTERVAL seconds, since vitals-based rules
+# can start or stop holding without any membership change.
+RULES_DIR = os.environ.get("CARE_RULES_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules")
+RULES_SWEEP_INTERVAL = float(os.environ.get("CARE_RULES_INTERVAL", "30"))
+RULES_SECONDS = metrics.Histogram("care_rules_evaluation_seconds", "One batch evaluation of the group rule sets.")
+
+def run_rule_analysis(rules, group_ids):
+    """
+    Evaluates the rule sets of the given groups in one batch and raises a
+    Flag for every insight that has started to hold. Insights that still
+    hold are not flagged again (also across restarts); one that stops
+    holding can be raised again later.
+    """
+    batch, cleared, hashes = [], [], {}
+    for group_id in group_ids:
+        group = group_store.get(group_id)
+        if not group or not rules.supports(group["type"]):
+            continue
+        if not group["active"] or not group.get("members"):
+            cleared.append(group_id)
+            continue
+        batch.append((group_id, group["type"], build_analysis_input(group)))
+        hashes[group_id] = group_content_hash(group)
+    with RULES_SECONDS.time():
+        results = rules.evaluate(batch)
+
+    raised_at = datetime.utcnow().isoformat() + "Z"
+    for group_id in cleared:
+        group_store.set_active_insights(group_id, (), raised_at)
+    for group_id, insights in results.items():
+        previous = group_store.active_insights(group_id)
+        for insight in insights:
+            if (insight["patient_id"], insight["insight_code"]) not in previous:
+                print(f"[AUTOMATION] RULE {insight['insight_code']} holds in Group/{group_id}")
+                try:
+                    post_analysis_flag(group_id, insight, hashes[group_id])
+                except Exception as e:
+                    print(f"[AUTOMATION ERROR] Could not save Flag for Group/{group_id}: {e}")
+        group_store.set_active_insights(group_id, [(i["patient_id"], i["insight_code"]) for i in insights], raised_at)
+
+def run_group_analysis_worker():
+    """
+    Event-driven analysis: blocks on analysis_queue, batches whatever is
+    pending, evaluates rule-set groups in one vectorized pass and sends the
+    other qualifying groups to the analyzer pool, once per distinct content.
+    The content hash and the active rule insights are persisted in the
+    group store, so restarts never produce duplicate Flags.
+    """
+    from rule_engine import RuleEngine  # numpy is only needed once the engine runs
+    rules = RuleEngine(RULES_DIR, LOINC_CODES)
+    next_sweep = time.monotonic() + RULES_SWEEP_INTERVAL
     while True:
-        time.sleep(15)
-        print("[AUTOMATION] Checking for groups to analyze from JSON DB...")
+        pending = set()
+        try:
+            pending.add(analysis_queue.get(timeout=max(0.0, next_sweep - time.monotonic())))
+            while True:
+                pending.add(analysis_queue.get_nowait())
+        except queue.Empty:
+            pass
+
         try:
-            db_data = read_groups_db()
-            for group in db_data['groups']:
-                group_id = group["id"]
-                
-                # Trigger: Active "snakebite" group with 2+ members, not yet analyzed
-                if group["active"] and group["type"] == "snakebite" and len(group["members"]) >= 2 and group_id not in analyzed_groups:
-                    print(f"[AUTOMATION] TRIGGERED: Analyzing Group/{group_id}")
-                    
-                    # This part remains the same: it runs the Docker container
-                    # and saves the resulting Flag to the REAL HAPI FHIR server.
-                    result_json = subprocess.check_output(["docker", "run", "--rm", "care-analyzer"]).decode("utf-8")
-                    result = json.loads(result_json)
-                    
-                    flag = Flag(
-                        status="active",
-                        category=[CodeableConcept(text="Clinical Alert")],
-                        code=CodeableConcept(text=result["insight_text"]),
-                        subject=Reference(reference=f"Patient/{result['patient_id']}")
-                    )
-                    
-                    requests.post(f"{FHIR_SERVER_BASE}/Flag", data=flag.model_dump_json(), headers={'Content-Type': 'application/json'})
-                    print(f"[AUTOMATION] ANALYSIS COMPLETE: Created Flag for Patient/{result['patient_id']}")
-                    analyzed_groups.add(group_id)
+            rules.reload_if_changed()
+            rule_groups = {group_id for group_id in pending if rules.supports((group_store.get(group_id) or {}).get("type"))}
+            if time.monotonic() >= next_sweep:
+                rule_groups.update(g["id"] for g in group_store.all() if g["active"] and rules.supports(g["type"]))
+                next_sweep = time.monotonic() + RULES_SWEEP_INTERVAL
+            if rule_groups:
+                run_rule_analysis(rules, rule_groups)
+
+            # Trigger: Active group with an analyzer plugin and 2+ members, content not yet analyzed
+            jobs, hashes = [], {}
+            for group_id in pending - rule_groups:
+                group = group_store.get(group_id)
+                if not group or not group["active"] or not analyzer_pool.supports(group["type"]) or len(group["members"]) < 2:
+                    continue
+                content_hash = group_content_hash(group)
+                if group_store.analysis_hash(group_id) == content_hash:
+                    continue
+                print(f"[AUTOMATION] TRIGGERED: Analyzing Group/{group_id}")
+                jobs.append((group_id, group["type"], build_analysis_input(group)))
+                hashes[group_id] = content_hash
+
+            # All triggered groups run in parallel in the analyzer pool
+            for group_id, result, error in analyzer_pool.run_many(jobs):
+                if error:
+                    print(f"[AUTOMATION ERROR] Group/{group_id}: {error}")
+                    continue
+                try:
+                    if result:
+                        post_analysis_flag(group_id, result, hashes[group_id])
+                    group_store.set_analysis_hash(group_id, hashes[group_id], datetime.utcnow().isoformat() + "Z")
+                except Exception as e:
+                    print(f"[AUTOMATION ERROR] Could not save Flag for Group/{group_id}: {e}")
 
         except Exception as e:
             print(f"[AUTOMATION ERROR] {e}")
@@ -463,18 +1312,89 @@ def run_group_analysis_periodically():
 # ==============================================================================
 # MAIN EXECUTION
 # ==============================================================================
-if __name__ == '__main__':
-    # ... (Your existing startup logic)
-    print("[INFO] C.A.R.E. Gateway started (using JSON DB for Groups).")
-    
+def start_background_services(warm_models=False):
+    """
+    Starts the background work of this process's role: the engines
+    (simulation, analysis, outbox flusher) for "all"/"engine", the patient
+    directory for "all"/"api", and the shared-state bus in split mode.
+    In fast-boot mode the FHIR models are warmed first.
+    """
+    if warm_models:
+        started = time.perf_counter()
+        fhir_models.warm_up()
+        print(f"[INFO] FHIR models loaded in the background in {time.perf_counter() - started:.2f}s.")
+
+    if CARE_ROLE in ("all", "api"):
+        # Searches are served from this process's own directory copy
+        threading.Thread(target=load_patient_directory, daemon=True).start()
+
+    if SPLIT_MODE:
+        if CARE_ROLE == "api":
+            shared_state.subscribe("event", lambda message: events.publish(message["event"], message["data"]))
+            shared_state.subscribe("patients", patient_directory.upsert_many)
+        else:
+            shared_state.subscribe("patients_status", apply_patients_status)
+            shared_state.subscribe("analyze", analysis_queue.put)
+        shared_state.start(prune=CARE_ROLE == "engine")
+        print(f"[INFO] Role '{CARE_ROLE}': shared state in {shared_state.path}.")
+
+    if CARE_ROLE == "api":
+        return
+
+    # Seed the in-memory latest-vitals view without delaying startup
+    threading.Thread(target=seed_latest_vitals, daemon=True).start()
+
+    # Replay queued FHIR writes (including any left over from before a restart)
+    outbox.start()
+    print(f"[INFO] FHIR outbox flusher started ({outbox.depth()} write(s) pending).")
+
     # Start the simulation thread
     simulation_thread = threading.Thread(target=update_vitals_periodically, daemon=True)
     simulation_thread.start()
     print("[INFO] Real-time vital signs simulation thread started.")
     
-    # Start the group analysis thread
-    analysis_thread = threading.Thread(target=run_group_analysis_periodically, daemon=True)
+    # Start the group analysis thread; catch up once on anything that changed while we were down
+    analysis_thread = threading.Thread(target=run_group_analysis_worker, daemon=True)
     analysis_thread.start()
-    print("[INFO] Group analysis automation thread started.")
+    for group in group_store.all():
+        request_group_analysis(group["id"])
+    print("[INFO] Event-driven group analysis thread started.")
 
-    app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
+
+def serve_engine_metrics(port):
+    """Engine process: /metrics only, since it serves no API."""
+    from werkzeug.serving import make_server
+    def metrics_app(environ, start_response):
+        start_response("200 OK", [("Content-Type", metrics.CONTENT_TYPE)])
+        return [metrics.render().encode("utf-8")]
+    make_server('127.0.0.1', port, metrics_app, threaded=True).serve_forever()
+
+
+if __name__ == '__main__':
+    print(f"[INFO] C.A.R.E. Gateway started as '{CARE_ROLE}' (groups in {GROUPS_DB_PATH}, {len(group_store)} loaded).")
+    port = int(os.environ.get("CARE_PORT", "5000"))
+
+    if CARE_ROLE == "engine":
+        # Split mode: simulation, analysis and FHIR writes for all API workers; see serve.py
+        start_background_services()
+        if os.environ.get("CARE_ENGINE_METRICS_PORT"):
+            serve_engine_metrics(int(os.environ["CARE_ENGINE_METRICS_PORT"]))
+        threading.Event().wait()
+    elif CARE_ROLE == "api":
+        # Split mode: one of N stateless workers; serve.py passes the shared listening socket
+        from werkzeug.serving import make_server
+        listen_fd = int(os.environ["CARE_LISTEN_FD"]) if os.environ.get("CARE_LISTEN_FD") else None
+        server = make_server('0.0.0.0', port, app, threaded=True, fd=listen_fd)
+        start_background_services()
+        server.serve_forever()
+    else:
+        if os.environ.get("CARE_FAST_BOOT") == "1":
+            # Fast boot (edge boxes): bind and listen first, load models and start the engines afterwards
+            from werkzeug.serving import make_server
+            server = make_server('0.0.0.0', port, app, threaded=True)
+            print(f"[INFO] Fast boot: listening on port {port}; loading models in the background.")
+            threading.Thread(target=start_background_services, kwargs={"warm_models": True}, daemon=True).start()
+            server.serve_forever()
+        else:
+            start_background_services()
+            app.run(host='0.0.0.0', port=port, threaded=True)  # one thread per open /stream connection
@@ -0,0 +1,152 @@
+import collections
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TokenCache:
+    """
+    LRU cache of already-verified JWTs, keyed by the SHA-256 of the token so
+    raw tokens are never kept in memory. Entries expire with the token's own
+    `exp`, so a cached token is never accepted longer than jwt.decode would.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._entries = collections.OrderedDict()  # digest -> (user, exp)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _digest(token):
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token):
+        digest = self._digest(token)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return entry[0]
+
+    def put(self, token, user, exp):
+        digest = self._digest(token)
+        with self._lock:
+            self._entries[digest] = (user, exp)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+class UserStore:
+    """Username-indexed user records: {"password_hash": ..., "full_name": ...}."""
+
+    def __init__(self, users=None):
+        self._users = dict(users or {})
+
+    def get(self, username):
+        return self._users.get(username)
+
+    def __len__(self):
+        return len(self._users)
+
+
+class JsonFileUserStore(UserStore):
+    """Users loaded from a JSON file of the same shape as MOCK_USERS (CARE_USERS_FILE)."""
+
+    def __init__(self, path):
+        with open(path, 'r') as f:
+            super().__init__(json.load(f))
+        self.path = path
+
+
+class LoginThrottle:
+    """
+    Sliding-window limit on login attempts per key (username and client IP).
+    allow() reserves an attempt before the password is checked; the caller
+    refund()s it when the login succeeds, so only failures are counted.
+    With `shared` (a SharedState), the counters live in the shared state file
+    under `scope`, so several API workers enforce one limit between them.
+    """
+
+    def __init__(self, max_attempts=10, window=60.0, shared=None, scope="login"):
+        self.max_attempts = max_attempts
+        self.window = window
+        self.shared = shared
+        self.scope = scope
+        self._attempts = {}  # key -> deque of timestamps
+        self._lock = threading.Lock()
+
+    def allow(self, *keys):
+        """Records one attempt for every key; False if any of them is over its limit."""
+        if self.shared is not None:
+            return self.shared.allow_attempt(self.scope, [str(key) for key in keys], self.max_attempts, self.window)
+        now = time.monotonic()
+        cutoff = now - self.window
+        with self._lock:
+            allowed = True
+            for key in keys:
+                attempts = self._attempts.setdefault(key, collections.deque())
+                while attempts and attempts[0] < cutoff:
+                    attempts.popleft()
+                if len(attempts) >= self.max_attempts:
+                    allowed = False
+                else:
+                    attempts.append(now)
+            if len(self._attempts) > 10000:
+                # Forget keys that have gone quiet so the table cannot grow without bound
+                for key in [k for k, v in self._attempts.items() if not v or v[-1] < cutoff]:
+                    del self._attempts[key]
+            return allowed
+
+    def refund(self, *keys):
+        """
+        Takes back the attempt allow() just recorded for every key, so only
+        failed logins count against the limit and a burst of good ones at
+        shift change is never throttled.
+        """
+        if self.shared is not None:
+            self.shared.refund_attempt(self.scope, [str(key) for key in keys])
+            return
+        with self._lock:
+            for key in keys:
+                attempts = self._attempts.get(key)
+                if attempts:
+                    attempts.pop()
+
+
+class PasswordCheckBusy(Exception):
+    """Raised when the password-check queue is full."""
+
+
+class PasswordChecker:
+    """
+    Runs bcrypt.checkpw on a small dedicated pool (bcrypt releases the GIL)
+    with a bounded number of queued checks, so a burst of logins at shift
+    change cannot occupy every core or every request thread.
+    """
+
+    def __init__(self, workers=2, max_pending=16):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def check(self, password, password_hash, timeout=10.0):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordCheckBusy()
+        try:
+            future = self._executor.submit(_checkpw, password, password_hash)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result(timeout=timeout)
+
+
+def _checkpw(password, password_hash):
+    import bcrypt  # loaded on first login, not at boot
+    return bcrypt.checkpw(password, password_hash)
@@ -0,0 +1,243 @@
+"""
+Gateway scenario benchmark against the in-process FHIR stand-in
+(benchmarks/mock_fhir.py). Nothing needs a live HAPI server.
+
+The gateway is imported in-process (own temp group DB, outbox and cache)
+and served over real HTTP on an ephemeral port. Scenarios:
+
+- dashboards: N clients polling GET /patients (and /patients/latest)
+- simulation: ticks with M active patients, and the outbox drain to FHIR
+- groups:     concurrent group create / activate / add-member storms
+- login:      a burst of concurrent POST /login (bcrypt pool)
+
+Prints p50/p99 latency (ms) and throughput per scenario as JSON.
+
+    python benchmarks/bench_scenarios.py [--latency 0.005] [--dashboards 20]
+        [--patients 200] [--ticks 10] [--groups 50] [--logins 20] [--out results.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests  # noqa: E402
+from mock_fhir import MockFhirServer  # noqa: E402
+
+LOGIN = {"username": "doctor1", "password": "password123"}
+
+
+def summarize(samples, elapsed, errors=0):
+    """p50/p99 in ms and throughput for a list of per-operation durations (seconds)."""
+    ordered = sorted(samples)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2) if ordered else None
+    return {
+        "ops": len(samples),
+        "errors": errors,
+        "p50_ms": round(statistics.median(ordered) * 1000, 2) if ordered else None,
+        "p99_ms": pick(0.99),
+        "max_ms": round(ordered[-1] * 1000, 2) if ordered else None,
+        "throughput_per_s": round(len(samples) / elapsed, 1) if elapsed else None,
+    }
+
+
+def timed_calls(workers, calls, fn):
+    """Runs fn(i) for i in range(calls) on `workers` threads; returns (durations, errors, elapsed)."""
+    durations, errors, lock = [], [0], threading.Lock()
+    local = threading.local()
+
+    def one(i):
+        session = getattr(local, "session", None) or requests.Session()
+        local.session = session
+        started = time.perf_counter()
+        try:
+            ok = fn(session, i)
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            durations.append(elapsed)
+            if not ok:
+                errors[0] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(one, range(calls)))
+    return durations, errors[0], time.perf_counter() - started
+
+
+class Harness:
+    """A gateway (app.py) wired to a mock FHIR server, both on ephemeral ports."""
+
+    def __init__(self, latency, jitter):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.mock = MockFhirServer(latency=latency, jitter=jitter)
+        os.environ.update({
+            "CARE_FHIR_BASE": self.mock.start(),
+            "CARE_GROUPS_DB": os.path.join(self.tmp.name, "groups.db"),
+            "CARE_OUTBOX_DB": os.path.join(self.tmp.name, "outbox.db"),
+            "CARE_CACHE_DIR": os.path.join(self.tmp.name, "cache"),
+            "CARE_SIM_CRISIS_AFTER": "-1",
+            "CARE_SIM_SEED": "7",
+        })
+        os.chdir(self.tmp.name)  # keep the legacy groups_db.json import out of the numbers
+        import app
+        from auth import LoginThrottle
+        from werkzeug.serving import make_server
+        self.app = app
+        # The scenarios hammer one user from one address; throttling is not what is measured here
+        app.user_login_throttle = LoginThrottle(max_attempts=10 ** 9)
+        app.ip_login_throttle = LoginThrottle(max_attempts=10 ** 9)
+        app.outbox.start()
+        self.server = make_server("127.0.0.1", 0, app.app, threaded=True)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        response = requests.post(f"{self.url}/login", json=LOGIN)
+        response.raise_for_status()
+        self.headers = {"Authorization": f"Bearer {response.json()['token']}"}
+
+    def close(self):
+        self.server.shutdown()
+        self.mock.stop()
+
+    def admit(self, count):
+        """Creates and activates `count` patients through the API; returns their ids."""
+        ids = []
+        for i in range(count):
+            response = requests.post(f"{self.url}/patient", headers=self.headers,
+                                     json={"name": {"given": f"Bench{i}", "family": "Patient"}, "gender": "unknown"})
+            ids.append(response.json()["id"])
+        for patient_id in ids:
+            requests.post(f"{self.url}/patient/{patient_id}/status", headers=self.headers, json={"active": True})
+        self.drain()
+        return ids
+
+    def drain(self, timeout=120.0):
+        """Waits until every queued FHIR write has reached the mock; returns the seconds it took."""
+        started = time.perf_counter()
+        while self.app.outbox.depth() and time.perf_counter() - started < timeout:
+            time.sleep(0.005)
+        return time.perf_counter() - started
+
+    # --- scenarios -------------------------------------------------------------
+    def dashboards(self, clients, polls):
+        results = {}
+        for path in ("/patients", "/patients/latest"):
+            durations, errors, elapsed = timed_calls(
+                clients, clients * polls,
+                lambda s, i: s.get(f"{self.url}{path}", headers=self.headers).status_code == 200)
+            results[path] = summarize(durations, elapsed, errors)
+        return results
+
+    def simulation(self, ticks):
+        simulator = self.app.build_simulator()
+        durations = []
+        observations = 0
+        started = time.perf_counter()
+        for _ in range(ticks):
+            tick_started = time.perf_counter()
+            observations += self.app.simulation_tick(simulator) * len(self.app.LOINC_CODES)
+            durations.append(time.perf_counter() - tick_started)
+        drain = self.drain()
+        elapsed = time.perf_counter() - started
+        result = summarize(durations, elapsed)
+        result.update({
+            "patients": len(simulator),
+            "observations": observations,
+            "outbox_drain_s": round(drain, 3),
+            "observations_to_fhir_per_s": round(observations / elapsed, 1),
+        })
+        return result
+
+    def groups(self, count, members, workers):
+        create, errors_create, elapsed_create = timed_calls(
+            workers, count,
+            lambda s, i: s.post(f"{self.url}/group", headers=self.headers,
+                                json={"name": f"Bench group {i}", "type": "snakebite"}).status_code == 201)
+        group_ids = [g["id"] for g in self.app.group_store.newest_first()][:count]
+        status, errors_status, elapsed_status = timed_calls(
+            workers, len(group_ids),
+            lambda s, i: s.post(f"{self.url}/group/{group_ids[i]}/status", headers=self.headers,
+                                json={"active": True}).status_code == 200)
+        # Each group gets `len(members)` members; groups are spread over the workers
+        jobs = [(g, m) for g in group_ids for m in members]
+        add, errors_add, elapsed_add = timed_calls(
+            workers, len(jobs),
+            lambda s, i: s.post(f"{self.url}/group/{jobs[i][0]}/members", headers=self.headers,
+                                json={"patient_id": jobs[i][1]}).status_code == 200)
+        return {
+            "create": summarize(create, elapsed_create, errors_create),
+            "activate": summarize(status, elapsed_status, errors_status),
+            "add_member": summarize(add, elapsed_add, errors_add),
+        }
+
+    def login(self, burst):
+        durations, errors, elapsed = timed_calls(
+            burst, burst,
+            lambda s, i: s.post(f"{self.url}/login", json=LOGIN).status_code == 200)
+        return summarize(durations, elapsed, errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.005, help="mock FHIR latency per request (s)")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--dashboards", type=int, default=20, help="concurrent dashboard clients")
+    parser.add_argument("--polls", type=int, default=10, help="polls per dashboard client")
+    parser.add_argument("--patients", type=int, default=200, help="active patients in the simulation")
+    parser.add_argument("--ticks", type=int, default=10)
+    parser.add_argument("--groups", type=int, default=50)
+    parser.add_argument("--group-workers", type=int, default=8)
+    parser.add_argument("--logins", type=int, default=20, help="concurrent logins in the burst")
+    parser.add_argument("--scenarios", default="dashboards,simulation,groups,login")
+    parser.add_argument("--out", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    # The gateway's own log lines go to stderr, so stdout is just the JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run(args)
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+
+
+def run(args):
+    harness = Harness(args.latency, args.jitter)
+    try:
+        patient_ids = harness.admit(args.patients)
+        results = {
+            "config": {k: v for k, v in vars(args).items() if k != "out"},
+            "python": sys.version.split()[0],
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "scenarios": {},
+        }
+        scenarios = set(args.scenarios.split(","))
+        if "simulation" in scenarios:
+            # First, so the dashboards below read patients that already have observations
+            results["scenarios"]["simulation"] = harness.simulation(args.ticks)
+        if "dashboards" in scenarios:
+            results["scenarios"]["dashboards"] = harness.dashboards(args.dashboards, args.polls)
+        if "groups" in scenarios:
+            results["scenarios"]["groups"] = harness.groups(args.groups, patient_ids[:3], args.group_workers)
+        if "login" in scenarios:
+            results["scenarios"]["login"] = harness.login(args.logins)
+        results["fhir_requests"] = harness.mock.requests
+    finally:
+        harness.close()
+    return results
+
+
+if __name__ == "__main__":
+    main()
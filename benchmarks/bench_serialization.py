@@ -0,0 +1,71 @@
+"""
+Micro-benchmark: validated pydantic Observation serialization vs. the
+template fast path in fhir_serialization.py. Also checks that both paths
+produce byte-identical JSON for every simulated vital.
+
+    python benchmarks/bench_serialization.py [--n 20000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fhir_serialization import ObservationSerializer, now_timestamp  # noqa: E402
+
+# Same vitals as app.LOINC_CODES (not imported: app.py starts the gateway's globals)
+LOINC_CODES = {
+    "heart_rate": ("8867-4", "bpm"), "spo2": ("59408-5", "%"), "respiratory_rate": ("9279-1", "/min"),
+    "temperature": ("8310-5", "Cel"), "bp_systolic": ("8480-6", "mm[Hg]"), "bp_diastolic": ("8462-4", "mm[Hg]"),
+    "blood_sugar": ("2339-0", "mg/dL"), "sodium": ("2951-2", "mmol/L"), "potassium": ("2823-3", "mmol/L"),
+    "ph": ("11558-4", "{pH}"), "paco2": ("2019-8", "mm[Hg]"), "pao2": ("2703-7", "mm[Hg]"), "gcs": ("9269-2", "{score}")
+}
+
+
+def make_inputs(n, seed=42):
+    rng = random.Random(seed)
+    codes = list(LOINC_CODES.values())
+    inputs = []
+    for i in range(n):
+        loinc, unit = codes[i % len(codes)]
+        value = rng.randint(3, 40) if loinc in ("9269-2", "9279-1") else round(rng.uniform(2, 250), 1)
+        inputs.append((f"patient-{i % 500}", loinc, unit, value, now_timestamp()))
+    return inputs
+
+
+def run(serializer, inputs):
+    started = time.perf_counter()
+    out = [serializer.dumps(*args) for args in inputs]
+    return time.perf_counter() - started, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--n", type=int, default=20000, help="observations per path")
+    args = parser.parse_args()
+
+    inputs = make_inputs(args.n)
+    fast = ObservationSerializer()
+    for loinc, unit in LOINC_CODES.values():
+        fast.dumps("warmup", loinc, unit, 1.0)  # build templates outside the timed loop
+
+    strict_s, strict_out = run(ObservationSerializer(strict=True), inputs)
+    fast_s, fast_out = run(fast, inputs)
+    mismatches = sum(a != b for a, b in zip(strict_out, fast_out))
+
+    print(json.dumps({
+        "observations": args.n,
+        "strict_us_per_obs": round(strict_s / args.n * 1e6, 2),
+        "fast_us_per_obs": round(fast_s / args.n * 1e6, 2),
+        "speedup": round(strict_s / fast_s, 1),
+        "byte_identical": mismatches == 0,
+        "mismatches": mismatches
+    }, indent=2))
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
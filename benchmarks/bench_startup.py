@@ -0,0 +1,78 @@
+"""
+Startup benchmark: time-to-first-request of the gateway, normal vs. fast
+boot (CARE_FAST_BOOT=1), plus the bare `import app` time.
+
+Each run starts `python app.py` in a fresh temp directory (own group DB and
+serializer cache, so "cold" really is cold) and polls POST /login until the
+server answers. Prints medians as JSON.
+
+    python benchmarks/bench_startup.py [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+
+
+def time_import():
+    code = "import time, sys; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "PYTHONPATH": ROOT, "CARE_GROUPS_DB": os.path.join(tmp, "groups.db")}
+        out = subprocess.check_output([sys.executable, "-c", code], cwd=tmp, env=env)
+    return float(out.decode().strip().splitlines()[-1])
+
+
+def time_to_first_request(fast_boot, port, timeout=60.0):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "CARE_PORT": str(port),
+            "CARE_FAST_BOOT": "1" if fast_boot else "0",
+            "CARE_GROUPS_DB": os.path.join(tmp, "groups.db"),
+            "CARE_CACHE_DIR": os.path.join(tmp, "cache"),
+        }
+        started = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, APP], cwd=tmp, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            while time.perf_counter() - started < timeout:
+                request = urllib.request.Request(f"http://127.0.0.1:{port}/login", data=b"{}",
+                                                 headers={"Content-Type": "application/json"}, method="POST")
+                try:
+                    urllib.request.urlopen(request, timeout=1)
+                    return time.perf_counter() - started
+                except urllib.error.HTTPError:
+                    return time.perf_counter() - started  # 401 is an answer
+                except (urllib.error.URLError, ConnectionError, OSError):
+                    time.sleep(0.01)
+            raise RuntimeError(f"gateway did not answer within {timeout}s")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=5099)
+    args = parser.parse_args()
+
+    results = {"runs": args.runs, "python": sys.version.split()[0]}
+    results["import_app_s"] = round(statistics.median(time_import() for _ in range(args.runs)), 3)
+    for label, fast_boot in (("normal", False), ("fast_boot", True)):
+        samples = [time_to_first_request(fast_boot, args.port) for _ in range(args.runs)]
+        results[f"{label}_first_request_s"] = round(statistics.median(samples), 3)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+In-process FHIR stand-in for benchmarks: the subset of the HAPI FHIR REST
+API that app.py uses, kept in memory.
+
+- PUT/GET {type}/{id}, POST {type} (server-assigned id)
+- POST / with batch or transaction Bundles (PUT/POST/GET entries)
+- GET Patient?active=&name:contains=&_count=&_getpagesoffset=, with
+  _revinclude=Observation:subject, paged with "next" links
+
+Every request sleeps `latency` seconds (+ up to `jitter`) to stand in for a
+real server. Run standalone to point a gateway at it:
+
+    python benchmarks/mock_fhir.py --port 8080 --latency 0.005
+    # then: CARE_FHIR_BASE=http://localhost:8080/fhir python app.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+BASE_PATH = "/fhir"
+
+
+class FhirStore:
+    """Resources by type and id, plus Observations by subject (the last max_observations each)."""
+
+    def __init__(self, max_observations=50):
+        self.max_observations = max_observations
+        self.resources = {}      # type -> {id: resource}
+        self.observations = {}   # "Patient/id" -> [Observation]
+        self.lock = threading.Lock()
+
+    def put(self, resource_type, resource_id, resource):
+        with self.lock:
+            by_id = self.resources.setdefault(resource_type, {})
+            old = by_id.get(resource_id)
+            version = int(old["meta"]["versionId"]) + 1 if old else 1
+            resource = {**resource, "resourceType": resource_type, "id": resource_id,
+                        "meta": {"versionId": str(version), "lastUpdated": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}}
+            by_id[resource_id] = resource
+            if resource_type == "Observation":
+                subject = (resource.get("subject") or {}).get("reference")
+                if subject:
+                    history = self.observations.setdefault(subject, [])
+                    if old:
+                        # An update (e.g. a replayed PUT) replaces the stored version instead of adding one
+                        history[:] = [resource if o["id"] == resource_id else o for o in history]
+                    else:
+                        history.append(resource)
+                        del history[:-self.max_observations]
+            return ("200 OK" if old else "201 Created"), resource
+
+    def post(self, resource_type, resource):
+        return self.put(resource_type, str(uuid.uuid4()), resource)
+
+    def get(self, resource_type, resource_id):
+        with self.lock:
+            return self.resources.get(resource_type, {}).get(resource_id)
+
+    def search_patients(self, params):
+        active = params.get("active")
+        name = (params.get("name:contains") or "").lower()
+        with self.lock:
+            patients = list(self.resources.get("Patient", {}).values())
+        if active is not None:
+            patients = [p for p in patients if str(p.get("active", False)).lower() == active]
+        if name:
+            patients = [p for p in patients if name in json.dumps(p.get("name", [])).lower()]
+        return patients
+
+
+class MockFhirServer:
+    """Threaded HTTP FHIR stand-in; start() returns the base URL (.../fhir)."""
+
+    def __init__(self, port=0, latency=0.0, jitter=0.0, host="127.0.0.1"):
+        self.latency = latency
+        self.jitter = jitter
+        self.store = FhirStore()
+        self.requests = 0
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self.base_url = f"http://{host}:{self._httpd.server_address[1]}{BASE_PATH}"
+
+    def start(self):
+        threading.Thread(target=self._httpd.serve_forever, daemon=True, name="mock-fhir").start()
+        return self.base_url
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status, payload=None):
+                body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/fhir+json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _route(self, method):
+                server.requests += 1
+                if server.latency or server.jitter:
+                    time.sleep(server.latency + random.random() * server.jitter)
+                url = urlsplit(self.path)
+                if not url.path.startswith(BASE_PATH):
+                    return self._reply(404, outcome("not-found", "Unknown base"))
+                parts = [p for p in url.path[len(BASE_PATH):].split("/") if p]
+                params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                body = None
+                if method in ("PUT", "POST"):
+                    raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                    try:
+                        body = json.loads(raw or b"{}")
+                    except ValueError:
+                        return self._reply(400, outcome("invalid", "Invalid JSON"))
+                status, payload = server.handle(method, parts, params, body, self.headers.get("Host"))
+                self._reply(status, payload)
+
+            def do_GET(self):
+                self._route("GET")
+
+            def do_PUT(self):
+                self._route("PUT")
+
+            def do_POST(self):
+                self._route("POST")
+
+        return Handler
+
+    # --- FHIR interactions -----------------------------------------------------
+    def handle(self, method, parts, params, body, host):
+        if method == "POST" and not parts:
+            return self._bundle(body)
+        if method == "GET" and parts == ["Patient"]:
+            return 200, self._search(params, host)
+        if method == "PUT" and len(parts) == 2:
+            status, resource = self.store.put(parts[0], parts[1], body)
+            return int(status[:3]), resource
+        if method == "POST" and len(parts) == 1:
+            _, resource = self.store.post(parts[0], body)
+            return 201, resource
+        if method == "GET" and len(parts) == 2:
+            resource = self.store.get(*parts)
+            return (200, resource) if resource else (404, outcome("not-found", f"{parts[0]}/{parts[1]} is not known"))
+        return 400, outcome("not-supported", f"{method} /{'/'.join(parts)} is not supported by the mock")
+
+    def _bundle(self, bundle):
+        if (bundle or {}).get("resourceType") != "Bundle":
+            return 400, outcome("invalid", "Expected a Bundle")
+        entries = []
+        for entry in bundle.get("entry", []):
+            request = entry.get("request", {})
+            parts = [p for p in request.get("url", "").split("?")[0].split("/") if p]
+            status, resource = self.handle(request.get("method", "GET"), parts, {}, entry.get("resource"), None)
+            if bundle.get("type") == "transaction" and status >= 400:
+                return status, resource
+            response = {"status": f"{status} {'OK' if status < 400 else 'Error'}"}
+            if status >= 400:
+                response["outcome"] = resource
+            elif resource:
+                response["location"] = f"{resource['resourceType']}/{resource['id']}/_history/{resource['meta']['versionId']}"
+            entries.append({"response": response})
+        return 200, {"resourceType": "Bundle", "type": f"{bundle.get('type', 'batch')}-response", "entry": entries}
+
+    def _search(self, params, host):
+        patients = self.store.search_patients(params)
+        count = int(params.get("_count", 20))
+        offset = int(params.get("_getpagesoffset", 0))
+        page = patients[offset:offset + count]
+        entries = [{"resource": p, "search": {"mode": "match"}} for p in page]
+        if params.get("_revinclude") == "Observation:subject":
+            with self.store.lock:
+                for patient in page:
+                    entries.extend({"resource": o, "search": {"mode": "include"}}
+                                   for o in self.store.observations.get(f"Patient/{patient['id']}", []))
+        bundle = {"resourceType": "Bundle", "type": "searchset", "total": len(patients), "entry": entries, "link": []}
+        if offset + count < len(patients):
+            query = "&".join(f"{k}={v}" for k, v in {**params, "_getpagesoffset": offset + count}.items())
+            bundle["link"].append({"relation": "next", "url": f"http://{host}{BASE_PATH}/Patient?{query}"})
+        return bundle
+
+
+def outcome(code, text):
+    return {"resourceType": "OperationOutcome", "issue": [{"severity": "error", "code": code, "diagnostics": text}]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="In-memory FHIR stand-in for benchmarks.")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many extra seconds, at random")
+    args = parser.parse_args()
+    mock = MockFhirServer(port=args.port, latency=args.latency, jitter=args.jitter, host="0.0.0.0")
+    print(f"[INFO] Mock FHIR server on port {args.port} (latency {args.latency}s).")
+    mock.serve_forever()
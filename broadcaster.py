@@ -0,0 +1,65 @@
+import queue
+import threading
+
+from flask import json
+
+
+class Broadcaster:
+    """
+    Fans server-sent events out to every connected dashboard. Each event is
+    serialized once and pushed onto a bounded queue per subscriber, so a slow
+    tab can never block the simulation or analysis threads: when its queue is
+    full it is emptied and told to resync from /patients/latest instead.
+    """
+
+    def __init__(self, max_queue=256, heartbeat=15):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self.max_queue = max_queue
+        self.heartbeat = heartbeat
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        if not subscribers:
+            return
+        message = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                self._resync(q)
+
+    def _resync(self, q):
+        try:
+            while True:
+                q.get_nowait()
+        except queue.Empty:
+            pass
+        q.put_nowait("event: resync\ndata: {}\n\n")
+
+    def stream(self, q):
+        """Generator for a text/event-stream response; unsubscribes when the client goes away."""
+        try:
+            yield "retry: 2000\n\n"
+            while True:
+                try:
+                    yield q.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+        finally:
+            self.unsubscribe(q)
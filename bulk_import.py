@@ -0,0 +1,235 @@
+"""
+Streaming bulk patient import (CSV or NDJSON) in chunked FHIR writes.
+
+Used by the gateway's POST /patients/import endpoint and as a CLI:
+
+    python bulk_import.py patients.csv [--activate] [--format ndjson]
+        [--fhir http://localhost:8080/fhir | --gateway http://localhost:5000 --token JWT]
+
+Rows are read one at a time, mapped to Patient resources and validated,
+and written in chunks of --chunk rows, with at most --concurrency chunks in
+flight: the CLI posts each chunk to FHIR as a transaction Bundle, the
+gateway queues it in its outbox. Memory use therefore does not grow with
+the file size.
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import fhir_models
+from fhir_serialization import FHIR_ID
+
+# Stable ids for rows that carry a spreadsheet patient_id, so re-importing a file updates instead of duplicating
+IMPORT_NAMESPACE = uuid.UUID("6f1d8a52-3c1e-4b8e-9a57-0c2f4e1d7b90")
+IMPORT_IDENTIFIER_SYSTEM = "urn:care:import:patient_id"
+GENDERS = {"m": "male", "male": "male", "f": "female", "female": "female",
+           "o": "other", "other": "other", "u": "unknown", "unknown": "unknown"}
+
+
+def iter_rows(stream, fmt="csv"):
+    """Yields (row_number, dict) from a text stream of CSV (with a header) or NDJSON."""
+    if fmt == "ndjson":
+        for number, line in enumerate(stream, start=1):
+            if line.strip():
+                try:
+                    yield number, json.loads(line)
+                except ValueError as e:
+                    yield number, e
+        return
+    for number, row in enumerate(csv.DictReader(stream), start=1):
+        yield number, {k.strip(): (v or "").strip() for k, v in row.items() if k}
+
+
+def row_to_patient(row, active=False):
+    """
+    Maps an import row to a Patient resource dict. Columns: id or patient_id,
+    name (or given), family, gender, birthDate, phone, line, city, state,
+    postalCode, country. Other columns are ignored.
+    """
+    given = row.get("given") or row.get("name") or ""
+    family = row.get("family") or ""
+    if not (given or family):
+        raise ValueError("a name (given/name or family) is required")
+    if row.get("id"):
+        if not FHIR_ID.match(str(row["id"])):
+            raise ValueError(f"invalid id {row['id']!r}")
+        patient_id = str(row["id"])
+    elif row.get("patient_id"):
+        patient_id = str(uuid.uuid5(IMPORT_NAMESPACE, str(row["patient_id"])))
+    else:
+        patient_id = str(uuid.uuid4())
+
+    patient = {
+        "resourceType": "Patient",
+        "id": patient_id,
+        "active": active,
+        "name": [{"use": "official", "family": family or None, "given": [given] if given else None,
+                  "text": f"{given} {family}".strip()}]
+    }
+    if row.get("patient_id"):
+        patient["identifier"] = [{"system": IMPORT_IDENTIFIER_SYSTEM, "value": str(row["patient_id"])}]
+    if row.get("gender"):
+        gender = GENDERS.get(str(row["gender"]).lower())
+        if gender is None:
+            raise ValueError(f"unknown gender {row['gender']!r}")
+        patient["gender"] = gender
+    if row.get("birthDate"):
+        patient["birthDate"] = row["birthDate"]
+    if row.get("phone"):
+        patient["telecom"] = [{"system": "phone", "use": "home", "value": row["phone"]}]
+    address = {key: row[key] for key in ("city", "state", "postalCode", "country") if row.get(key)}
+    if row.get("line"):
+        address["line"] = [row["line"]]
+    if address:
+        patient["address"] = [{"use": "home", **address}]
+    patient["name"][0] = {k: v for k, v in patient["name"][0].items() if v is not None}
+
+    fhir_models.Patient.model_validate(patient)  # raises ValidationError on bad data
+    return patient
+
+
+def post_transaction(client, entries):
+    """Sends Bundle entries (JSON strings) as one transaction; returns None on success, else the error."""
+    body = '{"resourceType":"Bundle","type":"transaction","entry":[%s]}' % ",".join(entries)
+    try:
+        response = client.post("", data=body.encode("utf-8"), headers={'Content-Type': 'application/fhir+json'})
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    if response.status_code >= 400:
+        return f"{response.status_code}: {response.text[:500]}"
+    return None
+
+
+class BulkImporter:
+    """
+    Writes rows in chunks of chunk_size entries, with at most `concurrency`
+    chunks in flight. send(items) gets [(Bundle entry JSON, "Patient/<id>")]
+    and returns None or an error for the whole chunk (the CLI posts it as a
+    transaction, the gateway queues it in its outbox); on_written(patients)
+    is called for every chunk that was stored (e.g. to index or activate
+    them). Every row ends up counted as imported or failed.
+    """
+
+    def __init__(self, send, chunk_size=500, concurrency=4, max_errors=1000, on_written=None):
+        self.send = send
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.max_errors = max_errors
+        self.on_written = on_written
+
+    def run(self, rows, activate=False):
+        """Imports (row_number, row) pairs; returns a report with counts, rows/s and per-row errors."""
+        started = time.perf_counter()
+        report = {"rows": 0, "imported": 0, "failed": 0, "errors": []}
+        lock = threading.Lock()
+        in_flight = threading.BoundedSemaphore(self.concurrency * 2)  # queued + running chunks
+
+        def error(row_number, patient_id, message):
+            with lock:
+                report["failed"] += 1
+                if len(report["errors"]) < self.max_errors:
+                    report["errors"].append({"row": row_number, "id": patient_id, "error": message})
+
+        def write(chunk):
+            try:
+                try:
+                    failure = self.send([('{"resource":%s,"request":{"method":"PUT","url":"Patient/%s"}}'
+                                          % (json.dumps(p), p["id"]), f"Patient/{p['id']}") for _, p in chunk])
+                except Exception as e:
+                    failure = f"{type(e).__name__}: {e}"
+                if failure:
+                    for row_number, patient in chunk:
+                        error(row_number, patient["id"], failure)
+                    return
+                if self.on_written:
+                    try:
+                        self.on_written([patient for _, patient in chunk])
+                    except Exception as e:
+                        for row_number, patient in chunk:
+                            error(row_number, patient["id"], f"stored, but could not be indexed/activated: {type(e).__name__}: {e}")
+                        return
+                with lock:
+                    report["imported"] += len(chunk)
+            finally:
+                in_flight.release()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="bulk-import") as executor:
+            chunk = []
+            rows = iter(rows)
+            while True:
+                try:
+                    row_number, row = next(rows)
+                except StopIteration:
+                    break
+                except (UnicodeDecodeError, csv.Error, OSError) as e:
+                    # The stream itself is broken: report it and import what was read so far
+                    report["rows"] += 1
+                    error(report["rows"], None, f"could not read the input past this row: {type(e).__name__}: {e}")
+                    break
+                report["rows"] += 1
+                try:
+                    if isinstance(row, Exception):
+                        raise row
+                    chunk.append((row_number, row_to_patient(row, active=activate)))
+                except fhir_models.ValidationError as e:
+                    error(row_number, None, "; ".join(f"{'.'.join(map(str, d['loc']))}: {d['msg']}" for d in e.errors()))
+                except (ValueError, TypeError, AttributeError) as e:
+                    error(row_number, None, str(e))
+                if len(chunk) >= self.chunk_size:
+                    in_flight.acquire()  # backpressure: stop reading while enough chunks are pending
+                    executor.submit(write, chunk)
+                    chunk = []
+            if chunk:
+                in_flight.acquire()
+                executor.submit(write, chunk)
+
+        elapsed = time.perf_counter() - started
+        report["elapsed_s"] = round(elapsed, 3)
+        report["rows_per_s"] = round(report["rows"] / elapsed, 1) if elapsed else None
+        report["errors_truncated"] = report["failed"] > len(report["errors"])
+        return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-import patients from CSV or NDJSON.")
+    parser.add_argument("file", help="CSV (with header) or NDJSON file; '-' for stdin")
+    parser.add_argument("--format", choices=("csv", "ndjson"), help="default: from the file extension")
+    parser.add_argument("--activate", action="store_true", help="create the patients as active")
+    parser.add_argument("--fhir", default="http://localhost:8080/fhir", help="FHIR base URL (direct import)")
+    parser.add_argument("--gateway", help="C.A.R.E. gateway URL; uploads the file to /patients/import instead")
+    parser.add_argument("--token", help="JWT for --gateway (from /login)")
+    parser.add_argument("--chunk", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args(argv)
+    fmt = args.format or ("ndjson" if args.file.endswith((".ndjson", ".jsonl")) else "csv")
+
+    if args.gateway:
+        # Through the gateway, so activated patients also join its live simulation
+        import requests
+        with (sys.stdin.buffer if args.file == "-" else open(args.file, "rb")) as f:
+            response = requests.post(f"{args.gateway.rstrip('/')}/patients/import", data=f,
+                                     params={"format": fmt, "activate": str(args.activate).lower(),
+                                             "chunk": args.chunk, "concurrency": args.concurrency},
+                                     headers={"Authorization": f"Bearer {args.token}"})
+        print(json.dumps(response.json(), indent=2))
+        return 0 if response.ok else 1
+
+    from fhir_client import client_from_env
+    client = client_from_env(args.fhir)
+    importer = BulkImporter(lambda items: post_transaction(client, [entry for entry, _ in items]),
+                            chunk_size=args.chunk, concurrency=args.concurrency)
+    with (io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig", newline="") if args.file == "-"
+          else open(args.file, "r", encoding="utf-8-sig", newline="")) as f:
+        report = importer.run(iter_rows(f, fmt), activate=args.activate)
+    print(json.dumps(report, indent=2))
+    return 0 if not report["failed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
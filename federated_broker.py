@@ -0,0 +1,161 @@
+import collections
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_PEERS = [{"name": "City General Mock Hospital", "url": "http://localhost:5100"}]
+
+
+def peers_from_env():
+    """Peer hospitals from CARE_FEDERATED_PEERS ("name=url,name=url" or plain urls)."""
+    spec = os.environ.get("CARE_FEDERATED_PEERS")
+    if not spec:
+        return list(DEFAULT_PEERS)
+    peers = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, url = item.partition("=") if "=" in item.split("://")[0] else ("", "", item)
+        peers.append({"name": name or url, "url": url.rstrip("/")})
+    return peers
+
+
+class DuplicateQuery(Exception):
+    """Raised by query() when the caller's query_id is already in use."""
+
+
+class FederatedBroker:
+    """
+    Fans a cross-hospital question out to every peer in parallel.
+
+    Each query gets a query_id and one deadline; whatever peers answered by
+    then is returned (partial results), and slower peers are listed as
+    pending. Peers keep up to late_timeout seconds to answer; late answers
+    are attached to the stored query, so get(query_id) returns them. Complete answer sets are cached
+    per question_code for cache_ttl seconds.
+
+    With `store` (a SharedState), query results (for result_ttl seconds)
+    and cached answer sets are also written to the shared state file, so
+    any API worker can serve get(query_id) and reuse the cache.
+    """
+
+    def __init__(self, peers, timeout=2.0, late_timeout=10.0, cache_ttl=300.0, max_workers=16, max_queries=1000,
+                 store=None, result_ttl=3600.0):
+        self.peers = peers
+        self.timeout = timeout
+        self.late_timeout = late_timeout
+        self.cache_ttl = cache_ttl
+        self.max_queries = max_queries
+        self.store = store
+        self.result_ttl = result_ttl
+        self._store_lock = threading.Lock()  # keeps a query's snapshots in order in the store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="federated")
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max(1, len(peers)), pool_maxsize=max_workers)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._cache = {}  # question_code -> (expires_at, answers)
+        self._queries = collections.OrderedDict()  # query_id -> result dict
+
+    def _ask(self, peer, query, deadline):
+        started = time.perf_counter()
+        response = self._session.post(f"{peer['url']}/query", json=query,
+                                      timeout=(min(deadline, 1.0), max(deadline, self.late_timeout)))
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        if response.status_code == 404:
+            return None  # peer has no answer to this question
+        response.raise_for_status()
+        return {**response.json(), "peer": peer["name"], "elapsed_ms": elapsed_ms}
+
+    def query(self, question_code, context=None, query_id=None, timeout=None):
+        """
+        Asks every peer; returns {query_id, question_code, answers, pending,
+        errors, cached, complete}. A caller-chosen query_id that is already
+        in use raises DuplicateQuery rather than replacing the stored result.
+        """
+        if query_id is not None and self.get(query_id) is not None:
+            raise DuplicateQuery(query_id)
+        query_id = query_id or str(uuid.uuid4())
+        deadline = timeout or self.timeout
+        now = time.time()
+        with self._lock:
+            cached = self._cache.get(question_code)
+        answers = cached[1] if cached and cached[0] > now else None
+        if answers is None and self.store is not None:
+            answers = self.store.get_record(f"federated-cache:{question_code}")  # cached by another worker
+        if answers is not None:
+            result = {"query_id": query_id, "question_code": question_code, "answers": answers,
+                      "pending": [], "errors": {}, "cached": True, "complete": True}
+            self._remember(result)
+            return result
+
+        query = {"query_id": query_id, "question_code": question_code, "context": context or {}}
+        futures = {self._executor.submit(self._ask, peer, query, deadline): peer for peer in self.peers}
+        result = {"query_id": query_id, "question_code": question_code, "answers": [],
+                  "pending": [peer["name"] for peer in self.peers], "errors": {}, "cached": False, "complete": False}
+        self._remember(result)
+        for future in futures:
+            future.add_done_callback(lambda f, peer=futures[future]: self._collect(result, peer, f))
+
+        wait(futures, timeout=deadline)
+        with self._lock:
+            return self._copy(result)
+
+    @staticmethod
+    def _copy(result):
+        """A snapshot of a result that later answers will not change (caller holds the lock)."""
+        return {**result, "answers": list(result["answers"]), "pending": list(result["pending"]),
+                "errors": dict(result["errors"])}
+
+    def _save(self, result):
+        """Writes the current state of a query (and a freshly cached answer set) to the shared store."""
+        if self.store is None:
+            return
+        with self._store_lock:
+            with self._lock:
+                snapshot = self._copy(result)
+                cache_answers = snapshot["answers"] if snapshot["complete"] and not snapshot["errors"] and not snapshot["cached"] else None
+            try:
+                self.store.set_record(f"federated:{snapshot['query_id']}", snapshot, self.result_ttl)
+                if cache_answers is not None:
+                    self.store.set_record(f"federated-cache:{snapshot['question_code']}", cache_answers, self.cache_ttl)
+            except Exception as e:
+                print(f"[FEDERATED ERROR] Could not share query {snapshot['query_id']}: {e}")
+
+    def _collect(self, result, peer, future):
+        """Attaches one peer's answer (or error) to its query, even after the deadline."""
+        try:
+            answer, error = future.result(), None
+        except Exception as e:
+            answer, error = None, f"{type(e).__name__}: {e}"
+        with self._lock:
+            result["pending"].remove(peer["name"])
+            if answer is not None:
+                result["answers"].append(answer)
+            if error:
+                result["errors"][peer["name"]] = error
+            if not result["pending"]:
+                result["complete"] = True
+                if not result["errors"]:
+                    self._cache[result["question_code"]] = (time.time() + self.cache_ttl, list(result["answers"]))
+        self._save(result)
+
+    def _remember(self, result):
+        with self._lock:
+            self._queries[result["query_id"]] = result
+            while len(self._queries) > self.max_queries:
+                self._queries.popitem(last=False)
+        self._save(result)
+
+    def get(self, query_id):
+        """The stored result of an earlier query (with any late answers), or None."""
+        with self._lock:
+            result = self._queries.get(query_id)
+            if result is not None:
+                return self._copy(result)
+        # Asked through another worker
+        return self.store.get_record(f"federated:{query_id}") if self.store is not None else None
@@ -0,0 +1,224 @@
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+
+# Only these are retried automatically; a retried POST could create duplicates.
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "PUT", "DELETE", "OPTIONS"])
+# Upstream statuses that mean "the FHIR server is struggling", not "your request is bad"
+UNAVAILABLE_STATUSES = (502, 503, 504)
+
+FHIR_SECONDS = metrics.Histogram("care_fhir_request_seconds", "Upstream FHIR call latency.", ("method", "resource_type"))
+FHIR_ERRORS = metrics.Counter("care_fhir_request_errors", "Upstream FHIR calls that failed (transport error, open circuit or HTTP status >= 400).", ("method", "resource_type"))
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without touching the network while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Classic closed -> open -> half-open breaker. After `failure_threshold`
+    consecutive upstream failures every call fails fast for `reset_timeout`
+    seconds; then one trial call is let through to probe the server.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class FhirClient:
+    """
+    The one way the gateway talks to FHIR: a keep-alive connection pool per
+    host, connect/read deadlines on every call, bounded retries with backoff
+    for idempotent methods, a circuit breaker and per-call latency stats.
+    """
+
+    def __init__(self, base_url, connect_timeout=3.05, read_timeout=15.0, retries=3, backoff=0.3,
+                 pool_maxsize=16, breaker=None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_maxsize = pool_maxsize
+        self.breaker = breaker or CircuitBreaker()
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._stats = {}  # (method, resource_type) -> [count, errors, total_s, max_s]
+
+    # --- sessions --------------------------------------------------------------
+    def _session_for(self, url):
+        parts = urlsplit(url)
+        host = f"{parts.scheme}://{parts.netloc}"
+        session = self._sessions.get(host)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(host)
+                if session is None:
+                    retry = Retry(
+                        total=self.retries, connect=self.retries, read=self.retries,
+                        status=self.retries, backoff_factor=self.backoff,
+                        status_forcelist=UNAVAILABLE_STATUSES, allowed_methods=IDEMPOTENT_METHODS,
+                        raise_on_status=False, respect_retry_after_header=True
+                    )
+                    session = requests.Session()
+                    session.mount(host, HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize,
+                                                    max_retries=retry))
+                    self._sessions[host] = session
+        return session
+
+    def url(self, path):
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}" if path else self.base_url
+
+    # --- requests --------------------------------------------------------------
+    def request(self, method, path, **kwargs):
+        url = self.url(path)
+        method = method.upper()
+        resource_type = resource_type_of(url, self.base_url)
+        if not self.breaker.allow():
+            self._record(method, resource_type, 0.0, error=True)
+            raise CircuitOpenError(f"FHIR circuit open; not calling {method} {url}")
+
+        kwargs.setdefault("timeout", self.timeout)
+        started = time.perf_counter()
+        try:
+            response = self._session_for(url).request(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            self.breaker.record_failure()
+            self._record(method, resource_type, time.perf_counter() - started, error=True)
+            raise
+
+        if response.status_code in UNAVAILABLE_STATUSES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        self._record(method, resource_type, time.perf_counter() - started, error=response.status_code >= 400)
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request("PUT", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.request("PATCH", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    # --- stats -----------------------------------------------------------------
+    def _record(self, method, resource_type, elapsed, error):
+        key = (method, resource_type)
+        FHIR_SECONDS.labels(method, resource_type).observe(elapsed)
+        if error:
+            FHIR_ERRORS.labels(method, resource_type).inc()
+        with self._lock:
+            entry = self._stats.get(key)
+            if entry is None:
+                entry = self._stats[key] = [0, 0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += int(error)
+            entry[2] += elapsed
+            entry[3] = max(entry[3], elapsed)
+
+    def stats(self):
+        with self._lock:
+            calls = [
+                {"method": method, "resource_type": resource_type, "count": count, "errors": errors,
+                 "avg_ms": round(total / count * 1000, 2) if count else 0.0, "max_ms": round(peak * 1000, 2)}
+                for (method, resource_type), (count, errors, total, peak) in sorted(self._stats.items())
+            ]
+            sessions = dict(self._sessions)
+
+        pools = []
+        for host, session in sessions.items():
+            adapter = session.get_adapter(host)
+            for key in list(adapter.poolmanager.pools.keys()):
+                pool = adapter.poolmanager.pools.get(key)
+                if pool is None:
+                    continue
+                pools.append({
+                    "host": f"{pool.scheme}://{pool.host}:{pool.port}",
+                    "maxsize": self.pool_maxsize,
+                    "idle": pool.pool.qsize() if pool.pool else 0,
+                    "connections_opened": pool.num_connections,
+                    "requests": pool.num_requests
+                })
+        return {"breaker": self.breaker.state, "pools": pools, "calls": calls}
+
+
+def resource_type_of(url, base_url):
+    """'http://x/fhir/Patient/1?..' -> 'Patient'; the base URL itself (Bundles) -> 'Bundle'."""
+    path = urlsplit(url).path
+    base_path = urlsplit(base_url).path.rstrip("/")
+    if path.startswith(base_path):
+        path = path[len(base_path):]
+    segment = path.strip("/").split("/", 1)[0]
+    return segment or "Bundle"
+
+
+def client_from_env(base_url):
+    """Builds the shared client with deadlines/retries overridable from the environment."""
+    return FhirClient(
+        base_url,
+        connect_timeout=float(os.environ.get("CARE_FHIR_CONNECT_TIMEOUT", "3.05")),
+        read_timeout=float(os.environ.get("CARE_FHIR_READ_TIMEOUT", "15")),
+        retries=int(os.environ.get("CARE_FHIR_RETRIES", "3")),
+        pool_maxsize=int(os.environ.get("CARE_FHIR_POOL_SIZE", "16")),
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.environ.get("CARE_FHIR_BREAKER_FAILURES", "5")),
+            reset_timeout=float(os.environ.get("CARE_FHIR_BREAKER_RESET", "10"))
+        )
+    )
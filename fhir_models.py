@@ -0,0 +1,48 @@
+"""
+Lazily loaded fhir.resources models.
+
+Importing the pydantic FHIR models is the slowest part of starting the
+gateway, so app code refers to them as `fhir_models.Patient`,
+`fhir_models.Flag`, ... and each module is imported on first use.
+warm_up() imports all of them, e.g. from a background thread once the HTTP
+socket is already accepting requests.
+"""
+import importlib
+import threading
+
+_MODELS = {
+    "Patient": "fhir.resources.patient",
+    "Observation": "fhir.resources.observation",
+    "Bundle": "fhir.resources.bundle",
+    "Reference": "fhir.resources.reference",
+    "HumanName": "fhir.resources.humanname",
+    "ContactPoint": "fhir.resources.contactpoint",
+    "Address": "fhir.resources.address",
+    "CodeableConcept": "fhir.resources.codeableconcept",
+    "Coding": "fhir.resources.coding",
+    "Quantity": "fhir.resources.quantity",
+    "Group": "fhir.resources.group",
+    "GroupMember": "fhir.resources.group",
+    "Flag": "fhir.resources.flag",
+    "ValidationError": "pydantic",
+}
+
+_lock = threading.Lock()
+
+
+def __getattr__(name):
+    module_name = _MODELS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _lock:
+        value = globals().get(name)
+        if value is None:
+            value = getattr(importlib.import_module(module_name), name)
+            globals()[name] = value  # later lookups skip __getattr__ entirely
+    return value
+
+
+def warm_up():
+    """Imports every model now (and builds their pydantic validators)."""
+    for name in _MODELS:
+        __getattr__(name)
@@ -0,0 +1,168 @@
+"""
+Search layer over the shared FHIR client: reads every page of a search
+(not just the first Bundle) and trims resources to a compact projection.
+
+HAPI pages a search with `_getpagesoffset` in its "next" links, so once the
+first page is in, later pages can be requested in parallel by rewriting
+that offset. Pages come back in order; if a link has no offset, the
+follower falls back to walking the links one by one.
+"""
+import concurrent.futures
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Elements _summary=true keeps (FHIR "summary" elements) for the resources the gateway serves
+SUMMARY_ELEMENTS = {
+    "Patient": ("identifier", "active", "name", "telecom", "gender", "birthDate", "deceasedBoolean",
+                "deceasedDateTime", "address", "managingOrganization", "link"),
+    "Observation": ("status", "category", "code", "subject", "effectiveDateTime", "valueQuantity"),
+}
+# Elements kept on included Observations in the compact ward view
+OBSERVATION_COMPACT_ELEMENTS = ("code", "subject", "effectiveDateTime", "valueQuantity")
+SUBSETTED_TAG = {"system": "http://terminology.hl7.org/CodeSystem/v3-ObservationValue", "code": "SUBSETTED"}
+
+
+class SearchTruncated(Exception):
+    """Raised by iter_pages after its last allowed page when the search has more pages."""
+
+    def __init__(self, pages):
+        super().__init__(f"search stopped after {pages} pages (max_pages); later pages were not read")
+        self.pages = pages
+
+
+def next_link(bundle):
+    return next((link["url"] for link in bundle.get("link", []) if link.get("relation") == "next"), None)
+
+
+def _with_offset(url, offset):
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != "_getpagesoffset"]
+    query.append(("_getpagesoffset", str(offset)))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def _page_layout(url, first_page):
+    """(next offset, page size) from a HAPI next link, or None if it cannot be predicted."""
+    params = dict(parse_qsl(urlsplit(url).query))
+    try:
+        offset = int(params["_getpagesoffset"])
+        count = int(params.get("_count") or sum(1 for e in first_page.get("entry", []) if e.get("search", {}).get("mode", "match") == "match"))
+    except (KeyError, ValueError):
+        return None
+    return (offset, count) if count > 0 else None
+
+
+def iter_pages(client, path, params=None, max_workers=4, max_pages=200):
+    """
+    Yields every page (Bundle dict) of a search, in order. After the first
+    page, up to `max_workers` later pages are in flight at once; with a
+    `total` on the first page only the pages that exist are requested,
+    otherwise the follower reads ahead until a page has no next link.
+    Raises requests exceptions like client.get().raise_for_status(), and
+    SearchTruncated once `max_pages` pages were yielded and more exist.
+    """
+    response = client.get(path, params=params)
+    response.raise_for_status()
+    page = response.json()
+    yield page
+
+    url = next_link(page)
+    layout = _page_layout(url, page) if url else None
+    pages = 1
+    if layout is None:
+        # No predictable offsets: follow the links one after another
+        while url and pages < max_pages:
+            response = client.get(url)
+            response.raise_for_status()
+            page = response.json()
+            yield page
+            pages += 1
+            url = next_link(page)
+        if url:
+            raise SearchTruncated(pages)
+        return
+
+    offset, count = layout
+    total = page.get("total")
+    last_offset = total - 1 if isinstance(total, int) else None
+    max_workers = max(1, max_workers)
+
+    def fetch(page_offset):
+        page_response = client.get(_with_offset(url, page_offset))
+        page_response.raise_for_status()
+        return page_response.json()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fhir-pages") as executor:
+        in_flight = []  # futures in page order
+        next_offset = offset
+        finished = False
+        while not finished:
+            while (len(in_flight) < max_workers and pages + len(in_flight) < max_pages
+                   and (last_offset is None or next_offset <= last_offset)):
+                in_flight.append(executor.submit(fetch, next_offset))
+                next_offset += count
+            if not in_flight:
+                break
+            page = in_flight.pop(0).result()
+            pages += 1
+            yield page
+            # Without a total, the first page without a next link (or without matches) is the last one
+            if last_offset is None and (not next_link(page) or not page.get("entry")):
+                finished = True
+        for future in in_flight:
+            future.cancel()
+    if not finished and pages >= max_pages and (last_offset is None or next_offset <= last_offset):
+        raise SearchTruncated(pages)
+
+
+def iter_entries(client, path, params=None, max_workers=4, max_pages=200):
+    """Every entry of every page of a search, in order (see iter_pages)."""
+    for page in iter_pages(client, path, params, max_workers=max_workers, max_pages=max_pages):
+        yield from page.get("entry", [])
+
+
+# --- projections ---------------------------------------------------------------
+def projection(args):
+    """
+    Element names to keep from the _elements / _summary request parameters:
+    None (full resources), a tuple for every resource type, or a dict per
+    resource type for _summary=true.
+    """
+    elements = args.get("_elements")
+    if elements:
+        return tuple(e.strip() for e in elements.split(",") if e.strip())
+    if (args.get("_summary") or "").lower() == "true":
+        return SUMMARY_ELEMENTS
+    return None
+
+
+def project(resource, elements):
+    """
+    A copy of the resource with only resourceType, id, meta and `elements`,
+    tagged SUBSETTED as FHIR requires. Idempotent, so it is safe to apply
+    to results the FHIR server has already trimmed.
+    """
+    if isinstance(elements, dict):
+        elements = elements.get(resource.get("resourceType"))
+        if elements is None:
+            return resource
+    trimmed = {"resourceType": resource.get("resourceType"), "id": resource.get("id")}
+    trimmed.update((key, resource[key]) for key in elements if key in resource)
+    meta = dict(resource.get("meta") or {})
+    tags = list(meta.get("tag") or [])
+    if not any(tag.get("code") == SUBSETTED_TAG["code"] for tag in tags):
+        tags.append(SUBSETTED_TAG)
+    meta["tag"] = tags
+    trimmed["meta"] = meta
+    return trimmed
+
+
+def project_entry(entry, elements):
+    """Trims the entry's resource: matches to `elements`, _revinclude'd Observations to the compact set."""
+    resource = entry.get("resource")
+    if resource is None or elements is None:
+        return entry
+    if entry.get("search", {}).get("mode") == "include":
+        keep = OBSERVATION_COMPACT_ELEMENTS if resource.get("resourceType") == "Observation" else SUMMARY_ELEMENTS
+    else:
+        keep = elements
+    return {**entry, "resource": project(resource, keep)}
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import uuid
+from datetime import datetime
+from importlib.metadata import version, PackageNotFoundError
+
+import fhir_models
+
+# FHIR id syntax; anything else takes the validated path
+FHIR_ID = re.compile(r"^[A-Za-z0-9\-.]{1,64}$")
+TIMESTAMP = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{6}Z$")
+
+# Bumped whenever the template layout changes, so cached templates of the old layout are rebuilt
+TEMPLATE_FORMAT = 2
+# Namespace for deterministic Observation ids (uuid5 of patient, LOINC code and timestamp)
+OBSERVATION_ID_NAMESPACE = uuid.UUID("6f1c2a3e-8d4b-5e7f-9a0b-1c2d3e4f5a6b")
+_NAMESPACE_BYTES = OBSERVATION_ID_NAMESPACE.bytes
+# Namespace for deterministic analysis Flag ids (uuid5 of group, patient, insight code and group content)
+FLAG_ID_NAMESPACE = uuid.UUID("0b7e4c2d-9f31-5a86-b4d2-7e5c1a9f3d60")
+
+# Placeholders rendered through the validated path to cut the templates
+_ID_SENTINEL = "CAREidSENTINEL"
+_SUBJECT_SENTINEL = "CAREsubjectSENTINEL"
+_EFFECTIVE_SENTINEL = "1999-12-31T23:59:59.999999Z"
+_VALUE_SENTINEL = 12345.5
+
+
+def now_timestamp():
+    # Always with microseconds, so every timestamp has the same shape
+    return datetime.now().strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def observation_id(patient_id, loinc_code, effective):
+    """
+    The same id for the same measurement every time, so the Observation can
+    be written with PUT and a replayed write updates it instead of adding a
+    duplicate.
+    """
+    # uuid.uuid5() computed straight from hashlib; the UUID object costs more than the hash
+    digest = bytearray(hashlib.sha1(_NAMESPACE_BYTES + f"{patient_id}|{loinc_code}|{effective}".encode("utf-8")).digest()[:16])
+    digest[6] = (digest[6] & 0x0F) | 0x50  # version 5
+    digest[8] = (digest[8] & 0x3F) | 0x80  # RFC 4122 variant
+    h = digest.hex()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+def flag_id(group_id, patient_id, insight_code, content_hash):
+    """
+    The same id for the same insight on the same group content, so a
+    replayed Flag write updates the Flag instead of adding a duplicate.
+    """
+    return str(uuid.uuid5(FLAG_ID_NAMESPACE, f"{group_id}|{patient_id}|{insight_code}|{content_hash}"))
+
+
+def create_observation(patient_id, loinc_code, unit, value, effective=None, resource_id=None):
+    """Helper function to create a FHIR Observation resource."""
+    m = fhir_models
+    obs = m.Observation(
+        id=resource_id,
+        status="final",
+        category=[m.CodeableConcept(coding=[m.Coding(system="http://terminology.hl7.org/CodeSystem/observation-category", code="vital-signs")])],
+        code=m.CodeableConcept(coding=[m.Coding(system="http://loinc.org", code=loinc_code)]),
+        subject=m.Reference(reference=f"Patient/{patient_id}"),
+        effectiveDateTime=effective or now_timestamp(),
+        valueQuantity=m.Quantity(value=value, unit=unit)
+    )
+    return obs
+
+
+def _fast_timestamp(effective):
+    """
+    True for timestamps the template reproduces exactly: the fixed shape,
+    a real calendar date and time, and a non-zero fraction (pydantic drops
+    ".000000" entirely).
+    """
+    if not TIMESTAMP.match(effective) or effective.endswith(".000000Z"):
+        return False
+    try:
+        datetime.fromisoformat(effective[:-1])
+    except ValueError:
+        return False
+    return True
+
+
+def _format_number(value):
+    """JSON number text as pydantic writes it, or None where the two could differ."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float) and (value == 0.0 or 1e-4 <= abs(value) < 1e16):
+        return repr(value)
+    return None
+
+
+class ObservationSerializer:
+    """
+    Fast path for the vitals Observation JSON. The full pydantic model is
+    built once per (LOINC code, unit) with sentinel values and cut into a
+    template; afterwards only id, subject, timestamp and value are spliced in.
+    Each template is checked byte-for-byte against the validated path when
+    it is built, and inputs the template cannot reproduce exactly (unusual
+    ids, timestamps or numbers) fall back to the validated path.
+
+    With cache_path set, verified templates are saved to disk (keyed by the
+    installed fhir.resources/pydantic versions), so after a restart the hot
+    path needs no FHIR model import at all.
+
+    strict=True (CARE_FHIR_STRICT=1) always uses the validated path.
+    """
+
+    def __init__(self, strict=False, cache_path=None):
+        self.strict = strict
+        self.cache_path = cache_path
+        self._templates = {}
+        self._lock = threading.Lock()
+        self._load_cache()
+
+    # --- template cache across restarts ----------------------------------------
+    @staticmethod
+    def _cache_key():
+        try:
+            return f"format={TEMPLATE_FORMAT};fhir.resources={version('fhir.resources')};pydantic={version('pydantic')}"
+        except PackageNotFoundError:
+            return None
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return
+        if cached.get("key") != self._cache_key():
+            return  # built by other library versions; rebuild lazily
+        for entry in cached.get("templates", []):
+            self._templates[(entry["code"], entry["unit"])] = tuple(entry["parts"])
+
+    def _save_cache(self):
+        key = self._cache_key()
+        if not self.cache_path or key is None:
+            return
+        templates = [{"code": code, "unit": unit, "parts": list(parts)}
+                     for (code, unit), parts in self._templates.items() if parts]
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({"key": key, "templates": templates}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"[WARN] Could not write serializer cache {self.cache_path}: {e}")
+
+    def _template(self, loinc_code, unit):
+        key = (loinc_code, unit)
+        template = self._templates.get(key)
+        if template is None:
+            with self._lock:
+                if key not in self._templates:
+                    self._templates[key] = self._build_template(loinc_code, unit)
+                    self._save_cache()
+                template = self._templates[key]
+        return template
+
+    def _build_template(self, loinc_code, unit):
+        rendered = create_observation(_SUBJECT_SENTINEL, loinc_code, unit, _VALUE_SENTINEL, effective=_EFFECTIVE_SENTINEL,
+                                      resource_id=_ID_SENTINEL).model_dump_json(exclude_none=True)
+        parts = []
+        rest = rendered
+        for sentinel in (_ID_SENTINEL, _SUBJECT_SENTINEL, _EFFECTIVE_SENTINEL, repr(_VALUE_SENTINEL)):
+            head, found, rest = rest.partition(sentinel)
+            if not found:
+                return False  # layout changed (e.g. new fhir.resources); stay on the validated path
+            parts.append(head)
+        parts.append(rest)
+
+        # Self-check against the validated path before trusting the template
+        sample = ("calibration-id", "calibration-1", "2000-01-02T03:04:05.060708Z", 98.6)
+        expected = create_observation(sample[1], loinc_code, unit, sample[3], effective=sample[2],
+                                      resource_id=sample[0]).model_dump_json(exclude_none=True)
+        template = tuple(parts)
+        if self._render(template, *sample) != expected:
+            return False
+        return template
+
+    @staticmethod
+    def _render(template, resource_id, patient_id, effective, value):
+        return (f"{template[0]}{resource_id}{template[1]}{patient_id}{template[2]}{effective}"
+                f"{template[3]}{_format_number(value)}{template[4]}")
+
+    def dumps(self, patient_id, loinc_code, unit, value, effective=None, resource_id=None):
+        """
+        Observation JSON, byte-identical to create_observation(...).model_dump_json(exclude_none=True).
+        The id defaults to observation_id(patient_id, loinc_code, effective).
+        """
+        effective = effective or now_timestamp()
+        resource_id = resource_id or observation_id(patient_id, loinc_code, effective)
+        if (not self.strict and FHIR_ID.match(patient_id) and FHIR_ID.match(resource_id)
+                and _fast_timestamp(effective) and _format_number(value) is not None):
+            template = self._template(loinc_code, unit)
+            if template:
+                return self._render(template, resource_id, patient_id, effective, value)
+        return create_observation(patient_id, loinc_code, unit, value, effective=effective,
+                                  resource_id=resource_id).model_dump_json(exclude_none=True)
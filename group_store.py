@@ -0,0 +1,263 @@
+import bisect
+import json
+import os
+import sqlite3
+import threading
+from time import perf_counter
+
+import metrics
+
+STORE_SECONDS = metrics.Histogram("care_group_store_seconds", "Group store operation latency.", ("operation",))
+_CREATE, _UPDATE, _MEMBERS, _SET_HASH, _LIST = (
+    STORE_SECONDS.labels(op) for op in ("create", "update", "update_members", "set_analysis_hash", "newest_first")
+)
+CAS_RETRIES = 5
+
+
+class VersionConflict(Exception):
+    """The group changed since the version the caller expected (If-Match) or kept changing under us."""
+
+    def __init__(self, current_version):
+        super().__init__(f"group is at version {current_version}")
+        self.current_version = current_version
+
+
+class GroupStore:
+    """
+    Group storage engine. Groups live in a SQLite database in WAL mode (one
+    row per group, updated in place, crash-safe) and are mirrored in memory
+    with an id index and a createdAt-ordered index, so reads never touch disk.
+
+    On first start an existing groups_db.json is imported once.
+
+    With shared=True (several gateway processes on one file), every read
+    first checks PRAGMA data_version and reloads the indexes when another
+    process has committed a change.
+
+    Every group carries a "version" that each write bumps. Writes are
+    compare-and-swap on it (UPDATE ... WHERE version = ?), retried from a
+    fresh copy when another process got there first, so concurrent edits
+    are never lost; callers can also pass the version they read (If-Match).
+    """
+
+    def __init__(self, path, legacy_json=None, shared=False):
+        self.path = path
+        self.shared = shared
+        self._write_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS groups (id TEXT PRIMARY KEY, created_at TEXT NOT NULL, doc TEXT NOT NULL)")
+        if "version" not in [row[1] for row in self._conn.execute("PRAGMA table_info(groups)")]:
+            self._conn.execute("ALTER TABLE groups ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS groups_created_at ON groups (created_at)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS analysis_state (group_id TEXT PRIMARY KEY, content_hash TEXT NOT NULL, analyzed_at TEXT NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS active_insights (group_id TEXT NOT NULL, patient_id TEXT NOT NULL, code TEXT NOT NULL, "
+                           "raised_at TEXT NOT NULL, PRIMARY KEY (group_id, patient_id, code))")
+
+        self._load()
+        if not self._by_id and legacy_json and os.path.exists(legacy_json):
+            self._import_legacy(legacy_json)
+
+    def _load(self):
+        by_id, by_created = {}, []  # by_created: sorted list of (createdAt, id)
+        for group_id, created_at, doc in self._conn.execute("SELECT id, created_at, doc FROM groups"):
+            by_id[group_id] = json.loads(doc)
+            by_created.append((created_at, group_id))
+        by_created.sort()
+        self._analysis_hashes = dict(self._conn.execute("SELECT group_id, content_hash FROM analysis_state"))
+        insights = {}
+        for group_id, patient_id, code in self._conn.execute("SELECT group_id, patient_id, code FROM active_insights"):
+            insights.setdefault(group_id, set()).add((patient_id, code))
+        self._insights = insights
+        self._by_id, self._by_created = by_id, by_created
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _sync(self):
+        """Reloads from disk if another process changed the database (shared mode only)."""
+        with self._write_lock:
+            self._reload_if_changed()
+
+    def _reload_if_changed(self):
+        if self._conn.execute("PRAGMA data_version").fetchone()[0] != self._data_version:
+            self._load()
+
+    def _import_legacy(self, legacy_json):
+        with open(legacy_json, 'r') as f:
+            groups = json.load(f).get('groups', [])
+        with self._write_lock:
+            self._conn.execute("BEGIN")
+            try:
+                for group in groups:
+                    self._upsert(group)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        for group in groups:
+            self._index(group)
+        print(f"[INFO] Imported {len(groups)} group(s) from {legacy_json} into {self.path}.")
+
+    def _upsert(self, group):
+        self._conn.execute(
+            "INSERT INTO groups (id, created_at, doc, version) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET doc = excluded.doc, version = excluded.version",
+            (group['id'], group['createdAt'], json.dumps(group), group.get('version', 0))
+        )
+
+    def _compare_and_swap(self, group_id, change, expected_version=None):
+        """
+        Applies change(current) -> new document (or None for "no change") and
+        writes it only if nobody else has since; returns (old, new) or None if
+        the group is unknown. Caller holds the write lock.
+        """
+        for _ in range(CAS_RETRIES):
+            if self.shared:
+                self._reload_if_changed()  # never update from a stale copy
+            current = self._by_id.get(group_id)
+            if current is None:
+                return None
+            version = current.get('version', 0)
+            if expected_version is not None and version != expected_version:
+                raise VersionConflict(version)
+            updated = change(current)
+            if updated is None:
+                return current, current
+            # Copy-on-write: readers holding the old dict keep a consistent view
+            updated = {**updated, 'version': version + 1}
+            cursor = self._conn.execute(
+                "UPDATE groups SET doc = ?, version = ? WHERE id = ? AND version = ?",
+                (json.dumps(updated), version + 1, group_id, version)
+            )
+            if cursor.rowcount == 1:
+                self._by_id[group_id] = updated
+                return current, updated
+            self._load()  # another process committed first: retry from its version
+        raise VersionConflict(self._by_id[group_id].get('version', 0))
+
+    def _index(self, group):
+        is_new = group['id'] not in self._by_id
+        self._by_id[group['id']] = group
+        if is_new:
+            bisect.insort(self._by_created, (group['createdAt'], group['id']))
+
+    # --- writes ----------------------------------------------------------------
+    def create(self, group):
+        started = perf_counter()
+        with self._write_lock:
+            self._upsert(group)
+            self._index(group)
+        _CREATE.observe(perf_counter() - started)
+        return group
+
+    def update(self, group_id, **fields):
+        """Updates fields of one group in place; returns the new document or None if unknown."""
+        started = perf_counter()
+        with self._write_lock:
+            result = self._compare_and_swap(group_id, lambda current: {**current, **fields})
+        _UPDATE.observe(perf_counter() - started)
+        return result[1] if result else None
+
+    def update_members(self, group_id, add=(), remove=(), expected_version=None, check=None):
+        """
+        Set-based membership change in one write: adds the ids in `add` that
+        are not members yet (in order) and drops those in `remove`. Returns
+        (group, added, removed), or None if the group is unknown; raises
+        VersionConflict if expected_version is given and stale. `check` is
+        called with the changed group before it is written; whatever it
+        raises aborts the change.
+        """
+        started = perf_counter()
+        delta = {}
+
+        def change(current):
+            members = current.get('members', [])
+            present = {member_id(m) for m in members}
+            removed = set(remove) & present
+            added = [patient_id for patient_id in dict.fromkeys(add) if patient_id not in present]
+            delta['added'], delta['removed'] = added, [member_id(m) for m in members if member_id(m) in removed]
+            if not added and not removed:
+                return None
+            updated = {**current, 'members': [m for m in members if member_id(m) not in removed] + added}
+            if check is not None:
+                check(updated)
+            return updated
+
+        with self._write_lock:
+            result = self._compare_and_swap(group_id, change, expected_version)
+        _MEMBERS.observe(perf_counter() - started)
+        return (result[1], delta['added'], delta['removed']) if result else None
+
+    def set_analysis_hash(self, group_id, content_hash, analyzed_at):
+        """Remembers (across restarts) which group content was last analyzed."""
+        started = perf_counter()
+        with self._write_lock:
+            self._conn.execute(
+                "INSERT INTO analysis_state (group_id, content_hash, analyzed_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(group_id) DO UPDATE SET content_hash = excluded.content_hash, analyzed_at = excluded.analyzed_at",
+                (group_id, content_hash, analyzed_at)
+            )
+            self._analysis_hashes[group_id] = content_hash
+        _SET_HASH.observe(perf_counter() - started)
+
+    def set_active_insights(self, group_id, insights, raised_at):
+        """Remembers (across restarts) which (patient_id, code) rule insights currently hold for a group."""
+        insights = set(insights)
+        with self._write_lock:
+            previous = self._insights.get(group_id, set())
+            if insights == previous:
+                return
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("DELETE FROM active_insights WHERE group_id = ? AND patient_id = ? AND code = ?",
+                                       [(group_id, patient_id, code) for patient_id, code in previous - insights])
+                self._conn.executemany("INSERT OR IGNORE INTO active_insights (group_id, patient_id, code, raised_at) VALUES (?, ?, ?, ?)",
+                                       [(group_id, patient_id, code, raised_at) for patient_id, code in insights - previous])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._insights[group_id] = insights
+
+    # --- reads (memory only) ---------------------------------------------------
+    def analysis_hash(self, group_id):
+        if self.shared:
+            self._sync()
+        return self._analysis_hashes.get(group_id)
+
+    def active_insights(self, group_id):
+        if self.shared:
+            self._sync()
+        return self._insights.get(group_id, set())
+
+    def get(self, group_id):
+        if self.shared:
+            self._sync()
+        return self._by_id.get(group_id)
+
+    def newest_first(self):
+        started = perf_counter()
+        if self.shared:
+            self._sync()
+        by_id = self._by_id
+        groups = [by_id[group_id] for _, group_id in reversed(self._by_created[:])]
+        _LIST.observe(perf_counter() - started)
+        return groups
+
+    def all(self):
+        if self.shared:
+            self._sync()
+        return list(self._by_id.values())
+
+    def __len__(self):
+        if self.shared:
+            self._sync()
+        return len(self._by_id)
+
+    def close(self):
+        self._conn.close()
+
+
+def member_id(member):
+    """Patient id of a group member (plain id, or {"id": ...} in groups imported from old JSON)."""
+    return member["id"] if isinstance(member, dict) else member
@@ -1,44 +1,64 @@
+import json
 import os
+import sys
 import time
-import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# The folder we use to communicate
-MAILBOX_DIR = "federated_data"
-QUERY_FILE = os.path.join(MAILBOX_DIR, "query.json")
-ANSWER_FILE = os.path.join(MAILBOX_DIR, "answer.json")
+# Peer hospital stand-in for the federated broker (federated_broker.py).
+# Answers POST /query {"query_id", "question_code", "context"} over HTTP, so
+# many queries can be in flight at once and none has to wait for a poll.
+HOSPITAL_NAME = os.environ.get("CARE_PEER_NAME", "City General Mock Hospital")
+PORT = int(os.environ.get("CARE_PEER_PORT", "5100"))
+# Simulated processing time per query, to exercise the broker's deadlines
+LATENCY = float(os.environ.get("CARE_PEER_LATENCY", "0"))
 
 # The "expert knowledge" from the Data Architect
 HOSPITAL_B_KNOWLEDGE = {
     "SINGLE_BITE_VS_MULTI_BITE_RISK": "Our data confirms single bite cases show faster onset of neurotoxicity. Prioritize this patient immediately."
 }
 
-def answer_query():
-    print("[City General Hospital] Query received. Analyzing...")
-    with open(QUERY_FILE, 'r') as f:
-        query_data = json.load(f)
-
-    # Simple logic to answer the known question
+def answer_query(query_data):
+    """The answer to one query, or None if this hospital has no data on the question."""
     question_code = query_data.get("question_code")
-    if question_code in HOSPITAL_B_KNOWLEDGE:
-        response = {
-            "answering_hospital": "City General Mock Hospital",
-            "query_id": query_data.get("query_id"),
-            "response_text": HOSPITAL_B_KNOWLEDGE[question_code]
-        }
-        
-        with open(ANSWER_FILE, 'w') as f:
-            json.dump(response, f)
-            
-        print("[City General Hospital] Response sent.")
-    
-    os.remove(QUERY_FILE)
+    if question_code not in HOSPITAL_B_KNOWLEDGE:
+        return None
+    return {
+        "answering_hospital": HOSPITAL_NAME,
+        "query_id": query_data.get("query_id"),
+        "response_text": HOSPITAL_B_KNOWLEDGE[question_code]
+    }
+
+class QueryHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so the broker reuses its connections
+
+    def do_POST(self):
+        if self.path != "/query":
+            return self._send(404, {"message": "Not found"})
+        try:
+            query_data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError:
+            return self._send(400, {"message": "Invalid JSON"})
+        print(f"[{HOSPITAL_NAME}] Query {query_data.get('query_id')} received: {query_data.get('question_code')}")
+        if LATENCY:
+            time.sleep(LATENCY)
+        response = answer_query(query_data)
+        if response is None:
+            return self._send(404, {"message": "No data for this question", "query_id": query_data.get("query_id")})
+        self._send(200, response)
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # one line per query is printed above
 
 if __name__ == "__main__":
-    print("[City General Hospital] Mock Interface is ONLINE. Watching for queries...")
-    if not os.path.exists(MAILBOX_DIR):
-        os.makedirs(MAILBOX_DIR)
-        
-    while True:
-        if os.path.exists(QUERY_FILE):
-            answer_query()
-        time.sleep(2) # Check every 2 seconds
\ No newline at end of file
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else PORT
+    server = ThreadingHTTPServer(("0.0.0.0", port), QueryHandler)
+    print(f"[{HOSPITAL_NAME}] Mock Interface is ONLINE on port {port}. Waiting for queries...")
+    server.serve_forever()
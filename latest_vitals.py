@@ -0,0 +1,110 @@
+import threading
+import uuid
+
+from flask import json
+
+
+class LatestVitals:
+    """
+    In-process "latest value" table: one entry per active patient per LOINC
+    code. Writers (the simulation, FHIR ingest) call update_many()/ingest_bundle();
+    the dashboard reads a pre-serialized snapshot that only changes when the
+    table does, so its size does not grow with observation history.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._patients = {}   # patient_id -> {"name": str, "vitals": {loinc: {...}}}
+        self._version = 0
+        self._boot_id = uuid.uuid4().hex[:8]
+        self._cached = None   # (version, etag, payload bytes)
+
+    # --- writers ---------------------------------------------------------------
+    def set_patient(self, patient_id, name=None):
+        with self._lock:
+            patient = self._patients.setdefault(patient_id, {"name": name, "vitals": {}})
+            if name is not None and patient["name"] != name:
+                patient["name"] = name
+            self._version += 1
+
+    def remove_patient(self, patient_id):
+        with self._lock:
+            if self._patients.pop(patient_id, None) is not None:
+                self._version += 1
+
+    def update_many(self, records):
+        """
+        Applies (patient_id, loinc_code, value, unit, effective) records and
+        returns the subset that actually changed a value. Records for patients
+        that are not in the table are ignored (they are not active).
+        """
+        changed = []
+        with self._lock:
+            for patient_id, code, value, unit, effective in records:
+                patient = self._patients.get(patient_id)
+                if patient is None:
+                    continue
+                current = patient["vitals"].get(code)
+                if current is not None and current["effective"] > effective:
+                    continue  # out-of-order write, keep the newer value
+                if current is None or current["value"] != value:
+                    changed.append((patient_id, code, value, unit, effective))
+                patient["vitals"][code] = {"value": value, "unit": unit, "effective": effective}
+            if changed:
+                self._version += 1
+        return changed
+
+    def ingest_bundle(self, bundle):
+        """Seeds the table from a FHIR searchset of Patients with _revinclude'd Observations."""
+        records = []
+        for entry in bundle.get("entry", []):
+            resource = entry.get("resource", {})
+            if resource.get("resourceType") == "Patient":
+                names = resource.get("name") or [{}]
+                self.set_patient(resource["id"], names[0].get("text"))
+            elif resource.get("resourceType") == "Observation":
+                record = observation_record(resource)
+                if record:
+                    records.append(record)
+        return self.update_many(records)
+
+    # --- readers ---------------------------------------------------------------
+    def snapshot(self):
+        """Returns (etag, payload bytes) for the compact dashboard view."""
+        with self._lock:
+            if self._cached and self._cached[0] == self._version:
+                return self._cached[1], self._cached[2]
+            patients = [
+                {
+                    "id": patient_id,
+                    "name": patient["name"],
+                    "vitals": {code: v["value"] for code, v in patient["vitals"].items()},
+                    "updated": max((v["effective"] for v in patient["vitals"].values()), default=None)
+                }
+                for patient_id, patient in self._patients.items()
+            ]
+            etag = f"{self._boot_id}-{self._version}"
+            payload = json.dumps({"version": self._version, "patients": patients}).encode("utf-8")
+            self._cached = (self._version, etag, payload)
+            return etag, payload
+
+    def name(self, patient_id):
+        with self._lock:
+            patient = self._patients.get(patient_id)
+            return patient["name"] if patient else None
+
+    def get(self, patient_id):
+        with self._lock:
+            patient = self._patients.get(patient_id)
+            return {code: v["value"] for code, v in patient["vitals"].items()} if patient else None
+
+
+def observation_record(resource):
+    """Extracts (patient_id, loinc_code, value, unit, effective) from an Observation dict."""
+    try:
+        patient_id = resource["subject"]["reference"].split("/", 1)[1]
+        code = resource["code"]["coding"][0]["code"]
+        quantity = resource["valueQuantity"]
+    except (KeyError, IndexError, TypeError):
+        return None
+    return patient_id, code, quantity.get("value"), quantity.get("unit"), resource.get("effectiveDateTime", "")
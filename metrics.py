@@ -0,0 +1,206 @@
+"""
+Minimal Prometheus-style metrics (counters, gauges, histograms) for /metrics.
+
+Hot-path updates take no lock and allocate nothing: each metric child
+keeps a fixed set of preallocated shards (flat lists), a thread counts
+into the shard picked by its native thread id, and shards are only summed
+when /metrics is scraped. Labelled children are created once and cached,
+so steady-state updates only index into an existing list.
+
+    REQUESTS = metrics.Histogram("care_x_seconds", "Help text.", ("endpoint",))
+    REQUESTS.labels("login").observe(0.012)
+    print(metrics.render())
+"""
+import bisect
+import threading
+from time import perf_counter
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, from sub-millisecond lookups to 10 s ticks
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Shards per metric child; more than the usual number of concurrently busy threads
+SHARDS = 32
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+class _Sharded:
+    """
+    SHARDS preallocated lists of `width` numbers. Threads pick a shard by
+    native id (sequential on Linux, so concurrent threads rarely share
+    one), which keeps memory fixed however many short-lived request
+    threads the server starts. Two threads that do share a shard can, very
+    rarely, lose an increment to a thread switch mid-update; that is the
+    price of not locking.
+    """
+
+    def __init__(self, width):
+        self._shards = [[0] * width for _ in range(SHARDS)]
+
+    def shard(self):
+        return self._shards[threading.get_native_id() % SHARDS]
+
+    def totals(self):
+        return [sum(column) for column in zip(*self._shards)]
+
+
+class _CounterChild(_Sharded):
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, amount=1):
+        self.shard()[0] += amount
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+
+class _HistogramChild(_Sharded):
+    def __init__(self, buckets):
+        super().__init__(len(buckets) + 2)  # per-bucket counts, +Inf, sum
+        self._buckets = buckets
+
+    def observe(self, value):
+        values = self.shard()
+        values[bisect.bisect_left(self._buckets, value)] += 1
+        values[-1] += value
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._started = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(perf_counter() - self._started)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+        with _registry_lock:
+            _registry.append(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    def _label_text(self, values, extra=""):
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._samples(values, child))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def _samples(self, values, child):
+        return [f"{self.name}_total{self._label_text(values)} {_number(child.totals()[0])}"]
+
+
+class Gauge(_Metric):
+    """A settable gauge, or (with fn) one whose value is read at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), fn=None):
+        self.fn = fn
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default.set(value)
+
+    def _samples(self, values, child):
+        value = self.fn() if self.fn and not values else child.value
+        return [f"{self.name}{self._label_text(values)} {_number(value)}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def _samples(self, values, child):
+        totals = child.totals()
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), totals[:-1]):
+            cumulative += count
+            le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+            lines.append(f"{self.name}_bucket{self._label_text(values, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{self._label_text(values)} {_number(totals[-1])}")
+        lines.append(f"{self.name}_count{self._label_text(values)} {cumulative}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        try:
+            lines.extend(metric.render())
+        except Exception as e:
+            lines.append(f"# {metric.name} unavailable: {type(e).__name__}")
+    return "\n".join(lines) + "\n"
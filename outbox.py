@@ -0,0 +1,229 @@
+import sqlite3
+import threading
+import time
+
+
+class OutboxFull(Exception):
+    """Raised by enqueue when the outbox has reached its size limit (backpressure)."""
+
+
+class Outbox:
+    """
+    Durable, append-only queue for every FHIR write the gateway makes.
+
+    Writers get an immediate local acknowledgement once the Bundle entry is
+    committed to a SQLite WAL file; a flusher thread replays queued entries
+    to FHIR in batch Bundles through `sender` (app.post_bundle) whenever the
+    upstream is reachable, so the hub keeps working while FHIR is down.
+
+    Ordering per resource: entries with the same resource_key (e.g.
+    "Patient/123") are replayed strictly in enqueue order, at most one per
+    Bundle, and a later entry never overtakes a failed earlier one. Entries
+    rejected with a 4xx, and entries that FHIR still fails after
+    `max_attempts` answered sends (5xx), are moved to a dead-letter table instead
+    of blocking the queue. Only sends FHIR answered count as attempts:
+    transport errors and an open circuit breaker (no response at all) are
+    retried for as long as the outage lasts, so a long outage never
+    dead-letters queued writes. Replays can resend an entry FHIR had already
+    committed (e.g. a timeout after the commit), so queued writes should be
+    idempotent (PUT with a client-assigned id).
+
+    While FHIR is failing the flusher backs off exponentially up to
+    `max_backoff`; new entries do not cut a backoff short.
+    """
+
+    def __init__(self, path, sender, max_entries=200000, batch_size=500, flush_interval=1.0, max_backoff=30.0, shared=False,
+                 max_attempts=100):
+        self.path = path
+        self.shared = shared  # other processes write to (and flush) the same file
+        self.sender = sender
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")  # acknowledged writes must survive a power cut
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox (seq INTEGER PRIMARY KEY AUTOINCREMENT, resource_key TEXT, "
+            "entry TEXT NOT NULL, enqueued_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox_dead (seq INTEGER PRIMARY KEY, resource_key TEXT, entry TEXT NOT NULL, "
+            "enqueued_at REAL NOT NULL, failed_at REAL NOT NULL, status TEXT, details TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_resource_key ON outbox (resource_key, seq)")
+        self._depth = self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+        self._depth_counted_at = time.monotonic()
+        self._stats = {"enqueued": 0, "sent": 0, "retried": 0, "dead": 0, "superseded": 0, "rejected_full": 0,
+                       "last_flush_at": None, "last_error": None}
+
+    # --- writers ---------------------------------------------------------------
+    def enqueue(self, entry, resource_key=None, supersede=False):
+        """
+        Queues one Bundle entry (JSON string); returns its sequence number.
+        supersede=True (for full-resource PUTs) drops entries for the same
+        resource_key that are still waiting, since this one replaces them.
+        """
+        return self.enqueue_many([(entry, resource_key)], supersede=supersede)[0]
+
+    def enqueue_many(self, items, supersede=False):
+        """Queues [(entry JSON, resource_key)] atomically; raises OutboxFull if they do not fit."""
+        now = time.time()
+        with self._lock:
+            if self.shared and time.monotonic() - self._depth_counted_at > 1.0:
+                # The local count misses other processes' writes and flushes; recount at most once a second
+                self._depth = self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+                self._depth_counted_at = time.monotonic()
+            if self._depth + len(items) > self.max_entries:
+                self._stats["rejected_full"] += len(items)
+                raise OutboxFull(f"outbox holds {self._depth} entries (limit {self.max_entries})")
+            self._conn.execute("BEGIN")
+            try:
+                superseded = 0
+                if supersede:
+                    # An entry already being sent is harmless: its delete after the send becomes a no-op
+                    superseded = self._conn.executemany(
+                        "DELETE FROM outbox WHERE resource_key = ?", [(key,) for _, key in items if key is not None]
+                    ).rowcount
+                self._conn.executemany(
+                    "INSERT INTO outbox (resource_key, entry, enqueued_at) VALUES (?, ?, ?)",
+                    [(key, entry, now) for entry, key in items]
+                )
+                last_seq = self._conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._depth += len(items) - superseded
+            self._stats["enqueued"] += len(items)
+            self._stats["superseded"] += superseded
+        self._wakeup.set()
+        return list(range(last_seq - len(items) + 1, last_seq + 1))
+
+    def pending(self, resource_key):
+        """The newest queued entry (JSON) for resource_key, or None; sees other processes' writes."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT entry FROM outbox WHERE resource_key = ? ORDER BY seq DESC LIMIT 1", (resource_key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    # --- replay ----------------------------------------------------------------
+    def _next_batch(self):
+        """Oldest entries, at most one per resource_key, stopping a key's run at its first entry."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, resource_key, entry, attempts FROM outbox ORDER BY seq LIMIT ?", (self.batch_size * 4,)
+            ).fetchall()
+        batch, seen_keys = [], set()
+        for seq, key, entry, attempts in rows:
+            if key is not None:
+                if key in seen_keys:
+                    continue
+                seen_keys.add(key)
+            batch.append((seq, key, entry, attempts))
+            if len(batch) >= self.batch_size:
+                break
+        return batch
+
+    def flush_once(self):
+        """Sends one batch; returns (sent, retryable_failures)."""
+        batch = self._next_batch()
+        if not batch:
+            return 0, 0
+        failures = self.sender([entry for _, _, entry, _ in batch], [seq for seq, _, _, _ in batch])
+        failed = {seq: (status, details) for seq, status, details in failures}
+        now = time.time()
+
+        delivered, dead, retry = [], [], []
+        for seq, key, entry, attempts in batch:
+            if seq not in failed:
+                delivered.append(seq)
+                continue
+            status, details = failed[seq]
+            # A 4xx (other than timeout/throttling) will never succeed; do not let it block the queue
+            if status and status.startswith("4") and not status.startswith(("408", "429")):
+                dead.append((seq, key, entry, status, str(details)))
+            elif status and attempts + 1 >= self.max_attempts:
+                dead.append((seq, key, entry, status, f"gave up after {attempts + 1} attempts: {details}"))
+            else:
+                # No response (FHIR unreachable, breaker open) is not an attempt; it is retried until FHIR is back
+                retry.append((1 if status else 0, str(details)[:500], seq))
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                if dead:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO outbox_dead (seq, resource_key, entry, enqueued_at, failed_at, status, details) "
+                        "SELECT seq, resource_key, entry, enqueued_at, ?, ?, ? FROM outbox WHERE seq = ?",
+                        [(now, status, details, seq) for seq, _, _, status, details in dead]
+                    )
+                done = delivered + [seq for seq, *_ in dead]
+                # Superseded entries are already gone, so count what this delete actually removed
+                removed = self._conn.executemany("DELETE FROM outbox WHERE seq = ?", [(seq,) for seq in done]).rowcount
+                self._conn.executemany("UPDATE outbox SET attempts = attempts + ?, last_error = ? WHERE seq = ?", retry)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._depth -= removed
+            self._stats["sent"] += len(delivered)
+            self._stats["dead"] += len(dead)
+            self._stats["retried"] += len(retry)
+            self._stats["last_flush_at"] = now
+            if retry:
+                self._stats["last_error"] = retry[0][1]
+        for seq, key, _, status, details in dead:
+            print(f"[OUTBOX] Entry {seq} ({key or 'new resource'}) failed ({status or 'no response'}); moved to dead letters: {details}")
+        return len(delivered), len(retry)
+
+    def run(self):
+        """Flusher loop: drains the queue whenever woken up, backing off while FHIR is failing."""
+        backoff = None  # seconds until the next try while sends are failing
+        while True:
+            if backoff:
+                time.sleep(backoff)  # enqueue() wake-ups must not cut a backoff short
+            else:
+                self._wakeup.wait(timeout=self.flush_interval)
+            self._wakeup.clear()
+            try:
+                while True:
+                    sent, retry = self.flush_once()
+                    if retry:
+                        backoff = min(self.max_backoff, (backoff or self.flush_interval) * 2)
+                        break
+                    backoff = None
+                    if not sent:
+                        break
+            except Exception as e:
+                print(f"[OUTBOX ERROR] {e}")
+                backoff = min(self.max_backoff, (backoff or self.flush_interval) * 2)
+
+    def start(self):
+        thread = threading.Thread(target=self.run, daemon=True, name="outbox-flusher")
+        thread.start()
+        return thread
+
+    # --- metrics ---------------------------------------------------------------
+    def stats(self):
+        with self._lock:
+            oldest = self._conn.execute("SELECT MIN(enqueued_at) FROM outbox").fetchone()[0]
+            dead_total = self._conn.execute("SELECT COUNT(*) FROM outbox_dead").fetchone()[0]
+            if self.shared:
+                self._depth = self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+                self._depth_counted_at = time.monotonic()
+            return {
+                "depth": self._depth,
+                "max_entries": self.max_entries,
+                "lag_seconds": round(time.time() - oldest, 3) if oldest else 0.0,
+                "dead_letters": dead_total,
+                **self._stats
+            }
+
+    def depth(self):
+        return self._depth
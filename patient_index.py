@@ -0,0 +1,135 @@
+import bisect
+import threading
+
+
+def _norm(text):
+    return " ".join((text or "").lower().split())
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def patient_names(resource):
+    """(given, family, full text) for the first name of a Patient resource dict."""
+    name = (resource.get("name") or [{}])[0]
+    given = " ".join(name.get("given") or [])
+    family = name.get("family") or ""
+    text = name.get("text") or f"{given} {family}".strip()
+    return _norm(given), _norm(family), _norm(text)
+
+
+class PatientDirectory:
+    """
+    In-memory patient directory for search-as-you-type. Keeps every Patient
+    resource plus two indexes over given, family and full-text names:
+
+    - a trigram index (trigram -> patient ids) for substring queries of
+      three or more characters, verified against the names;
+    - a sorted word list for one- and two-character prefix queries.
+
+    Results are ranked (exact, prefix, word prefix, substring) and then
+    ordered by name. `ready` turns true once the initial load from FHIR has
+    finished; before that, callers should fall back to FHIR.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resources = {}  # id -> Patient resource dict
+        self._names = {}      # id -> (given, family, text)
+        self._trigrams = {}   # trigram -> set(ids)
+        self._words = []      # sorted [(word, id)]
+        self._by_name = []    # sorted [(full text, id)], for "list all"
+        self.ready = False
+
+    def __len__(self):
+        return len(self._resources)
+
+    # --- writes ----------------------------------------------------------------
+    def upsert(self, resource):
+        patient_id = resource.get("id")
+        if not patient_id:
+            return
+        names = patient_names(resource)
+        with self._lock:
+            self._resources[patient_id] = resource
+            if self._names.get(patient_id) == names:
+                return
+            self._unindex(patient_id)
+            self._names[patient_id] = names
+            for gram in set().union(*(_trigrams(n) for n in names)):
+                self._trigrams.setdefault(gram, set()).add(patient_id)
+            for word in set(" ".join(names).split()):
+                bisect.insort(self._words, (word, patient_id))
+            bisect.insort(self._by_name, (names[2], patient_id))
+
+    def upsert_many(self, resources):
+        for resource in resources:
+            self.upsert(resource)
+
+    def remove(self, patient_id):
+        with self._lock:
+            self._resources.pop(patient_id, None)
+            self._unindex(patient_id)
+
+    def _unindex(self, patient_id):
+        names = self._names.pop(patient_id, None)
+        if names is None:
+            return
+        for gram in set().union(*(_trigrams(n) for n in names)):
+            ids = self._trigrams.get(gram)
+            if ids is not None:
+                ids.discard(patient_id)
+                if not ids:
+                    del self._trigrams[gram]
+        for word in set(" ".join(names).split()):
+            index = bisect.bisect_left(self._words, (word, patient_id))
+            if index < len(self._words) and self._words[index] == (word, patient_id):
+                del self._words[index]
+        index = bisect.bisect_left(self._by_name, (names[2], patient_id))
+        if index < len(self._by_name) and self._by_name[index] == (names[2], patient_id):
+            del self._by_name[index]
+
+    # --- reads -----------------------------------------------------------------
+    def get(self, patient_id):
+        return self._resources.get(patient_id)
+
+    def search(self, query, offset=0, count=50):
+        """Returns (total, [resources]) for a name query; an empty query lists everyone."""
+        query = _norm(query)
+        with self._lock:
+            if not query:
+                # Already in name order; no per-request sort
+                page = [self._resources[pid] for _, pid in self._by_name[offset:offset + count]]
+                return len(self._by_name), page
+            ranked = [(self._rank(query, self._names[pid]), self._names[pid][2], pid)
+                      for pid in self._candidates(query)]
+            ranked = sorted(r for r in ranked if r[0] is not None)
+            page = [self._resources[pid] for _, _, pid in ranked[offset:offset + count]]
+        return len(ranked), page
+
+    def _candidates(self, query):
+        if len(query) >= 3:
+            grams = sorted((self._trigrams.get(g, set()) for g in _trigrams(query)), key=len)
+            return set.intersection(*grams) if grams else set()
+        # Short queries: word-prefix lookup in the sorted word list
+        words = self._words
+        index = bisect.bisect_left(words, (query, ""))
+        candidates = set()
+        while index < len(words) and words[index][0].startswith(query):
+            candidates.add(words[index][1])
+            index += 1
+        return candidates
+
+    @staticmethod
+    def _rank(query, names):
+        given, family, text = names
+        if query in (text, given, family):
+            return 0
+        if text.startswith(query) or given.startswith(query) or family.startswith(query):
+            return 1
+        if any(word.startswith(query) for word in text.split()):
+            return 2
+        if any(query in name for name in names):
+            return 3
+        return None
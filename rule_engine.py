@@ -0,0 +1,267 @@
+"""
+Declarative group-analysis rules, evaluated in batch.
+
+One JSON file per group type in the rules directory (rules/<type>.json):
+
+    {
+      "group_type": "snakebite",
+      "rules": [
+        {"code": "HIGH_RISK_SINGLE_BITE",
+         "text": "Prioritize: Single bite victim may have higher venom concentration.",
+         "select": {"min": "bite_count"}},
+        {"code": "SNAKEBITE_SHOCK", "text": "Possible envenomation shock.",
+         "when": {"all": [{"field": "vitals.bp_systolic", "op": "<", "value": 90},
+                          {"field": "vitals.heart_rate", "op": ">", "value": 120}]}}
+      ]
+    }
+
+`when` is a predicate over member attributes ("bite_count") or latest
+vitals ("vitals.<name>"), combined with all / any / not; ops are < <= > >=
+== != in exists. A rule without `when` matches every member. `select`
+(min/max of a field) keeps one matching patient per group instead of all;
+`min_members` skips groups smaller than that.
+
+Rule files are compiled once into plans and recompiled when a file's mtime
+changes. evaluate() builds one table with a row per (group, member) for
+the whole batch, extracts each referenced field once as a column, and
+evaluates every predicate as a NumPy operation over all rows; identical
+predicates shared by several rules are computed once.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+NUMERIC_OPS = {
+    "<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal,
+}
+OPS = set(NUMERIC_OPS) | {"==", "!=", "in", "exists"}
+
+
+class RuleError(ValueError):
+    """A rule file that cannot be compiled."""
+
+
+# --- compilation -------------------------------------------------------------
+def _compile_predicate(node, where):
+    """A predicate tree as nested tuples: ("all"|"any", [children]), ("not", child) or ("leaf", field, op, value)."""
+    if not isinstance(node, dict):
+        raise RuleError(f"{where}: a predicate must be an object")
+    if "all" in node or "any" in node:
+        kind = "all" if "all" in node else "any"
+        children = node[kind]
+        if not isinstance(children, list) or not children:
+            raise RuleError(f"{where}: '{kind}' needs a non-empty list")
+        return (kind, tuple(_compile_predicate(child, f"{where}.{kind}[{i}]") for i, child in enumerate(children)))
+    if "not" in node:
+        return ("not", _compile_predicate(node["not"], f"{where}.not"))
+    field, op = node.get("field"), node.get("op")
+    if not isinstance(field, str) or not field:
+        raise RuleError(f"{where}: 'field' is required")
+    if op not in OPS:
+        raise RuleError(f"{where}: unknown op {op!r} (expected one of {sorted(OPS)})")
+    value = node.get("value")
+    if op in NUMERIC_OPS and (isinstance(value, bool) or not isinstance(value, (int, float))):
+        raise RuleError(f"{where}: '{op}' needs a numeric value")
+    if op == "in":
+        if not isinstance(value, list):
+            raise RuleError(f"{where}: 'in' needs a list value")
+        value = tuple(value)
+    return ("leaf", field, op, value)
+
+
+def compile_rule_set(document, source):
+    """Validates a rule file's JSON and returns (group_type, [compiled rules])."""
+    group_type = document.get("group_type")
+    if not isinstance(group_type, str) or not group_type:
+        raise RuleError(f"{source}: 'group_type' is required")
+    compiled = []
+    for i, rule in enumerate(document.get("rules", [])):
+        where = f"{source} rules[{i}]"
+        if not rule.get("code") or not rule.get("text"):
+            raise RuleError(f"{where}: 'code' and 'text' are required")
+        select = rule.get("select")
+        if select is not None:
+            if not isinstance(select, dict) or len(select) != 1 or next(iter(select)) not in ("min", "max"):
+                raise RuleError(f"{where}: 'select' must be {{\"min\": field}} or {{\"max\": field}}")
+            select = next(iter(select.items()))
+        min_members = rule.get("min_members", 1)
+        if isinstance(min_members, bool) or not isinstance(min_members, int):
+            raise RuleError(f"{where}: 'min_members' must be an integer")
+        compiled.append({
+            "code": rule["code"],
+            "text": rule["text"],
+            "when": _compile_predicate(rule["when"], f"{where}.when") if "when" in rule else None,
+            "select": select,
+            "min_members": min_members,
+        })
+    return group_type, compiled
+
+
+def _fields(node, found):
+    if node is None:
+        return found
+    if node[0] == "leaf":
+        found.add((node[1], "number" if node[2] in NUMERIC_OPS else "value"))
+    elif node[0] == "not":
+        _fields(node[1], found)
+    else:
+        for child in node[1]:
+            _fields(child, found)
+    return found
+
+
+# --- evaluation --------------------------------------------------------------
+class RuleEngine:
+    """Compiled rule sets per group type, reloaded from `rules_dir` when files change."""
+
+    def __init__(self, rules_dir, vital_codes):
+        self.rules_dir = rules_dir
+        self._vital_codes = {name: code for name, (code, _) in vital_codes.items()}  # name -> LOINC
+        self._lock = threading.Lock()
+        self._mtimes = {}    # path -> mtime of the compiled version
+        self._rule_sets = {}  # group type -> [compiled rules]
+        self._sources = {}   # path -> group type
+        self.reload_if_changed()
+
+    def reload_if_changed(self):
+        """Recompiles added or changed rule files and drops deleted ones; a broken file keeps its last good plan."""
+        try:
+            entries = {entry.path: entry.stat().st_mtime for entry in os.scandir(self.rules_dir)
+                       if entry.is_file() and entry.name.endswith(".json")}
+        except FileNotFoundError:
+            entries = {}
+        with self._lock:
+            if entries == self._mtimes:
+                return False
+            for path in set(self._mtimes) - set(entries):
+                self._rule_sets.pop(self._sources.pop(path, None), None)
+                print(f"[RULES] Removed rule set {path}.")
+            for path, mtime in entries.items():
+                if self._mtimes.get(path) == mtime:
+                    continue
+                try:
+                    with open(path) as f:
+                        group_type, rules = compile_rule_set(json.load(f), os.path.basename(path))
+                except (OSError, ValueError) as e:
+                    print(f"[RULES ERROR] {e}; keeping the previous rules for this file.")
+                    continue
+                previous_type = self._sources.get(path)
+                if previous_type not in (None, group_type):
+                    self._rule_sets.pop(previous_type, None)
+                self._rule_sets[group_type] = rules
+                self._sources[path] = group_type
+                print(f"[RULES] Loaded {len(rules)} rule(s) for '{group_type}' groups from {path}.")
+            self._mtimes = entries
+            return True
+
+    def supports(self, group_type):
+        return group_type in self._rule_sets
+
+    def group_types(self):
+        return list(self._rule_sets)
+
+    def evaluate(self, groups):
+        """
+        Runs every group's rule set over its members in one pass. `groups`
+        is [(group_id, group_type, [patient dicts with "id" and "vitals"])];
+        returns {group_id: [{"patient_id", "insight_code", "insight_text"}]}.
+        """
+        with self._lock:
+            rule_sets = dict(self._rule_sets)
+        groups = [g for g in groups if g[1] in rule_sets]
+        results = {group_id: [] for group_id, _, _ in groups}
+        if not groups:
+            return results
+
+        # One row per (group, member) across the whole batch
+        patients, group_index = [], []
+        for index, (_, _, members) in enumerate(groups):
+            patients.extend(members)
+            group_index.extend([index] * len(members))
+        group_index = np.array(group_index, dtype=np.int64)
+        member_counts = np.array([len(members) for _, _, members in groups], dtype=np.int64)[group_index]
+        patient_ids = [p["id"] for p in patients]
+
+        # Every field any rule refers to, extracted once as a column
+        needed = set()
+        for group_type in {g[1] for g in groups}:
+            for rule in rule_sets[group_type]:
+                _fields(rule["when"], needed)
+                if rule["select"]:
+                    needed.add((rule["select"][1], "number"))
+        columns = {key: self._column(patients, *key) for key in needed}
+        masks = {}  # identical leaf predicates are evaluated once
+
+        for group_type in {g[1] for g in groups}:
+            in_type = np.isin(group_index, [i for i, g in enumerate(groups) if g[1] == group_type])
+            for rule in rule_sets[group_type]:
+                matched = in_type if rule["when"] is None else in_type & self._mask(rule["when"], columns, masks)
+                if rule["min_members"] > 1:
+                    matched = matched & (member_counts >= rule["min_members"])
+                rows = np.flatnonzero(matched)
+                if not len(rows):
+                    continue
+                if rule["select"]:
+                    rows = self._select(rows, group_index, columns[(rule["select"][1], "number")], rule["select"][0])
+                for row in rows.tolist():
+                    results[groups[group_index[row]][0]].append({
+                        "patient_id": patient_ids[row],
+                        "insight_code": rule["code"],
+                        "insight_text": rule["text"],
+                    })
+        return results
+
+    def _column(self, patients, field, kind):
+        if field.startswith("vitals."):
+            code = self._vital_codes.get(field[len("vitals."):], field[len("vitals."):])
+            values = [(p.get("vitals") or {}).get(code) for p in patients]
+        else:
+            values = [p.get(field) for p in patients]
+        if kind == "number":
+            return np.array([v if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan for v in values],
+                            dtype=np.float64)
+        # Filled element by element: np.array() would turn list values into a 2-D array
+        column = np.empty(len(values), dtype=object)
+        for i, value in enumerate(values):
+            column[i] = value
+        return column
+
+    def _mask(self, node, columns, masks):
+        kind = node[0]
+        if kind == "all":
+            return np.logical_and.reduce([self._mask(child, columns, masks) for child in node[1]])
+        if kind == "any":
+            return np.logical_or.reduce([self._mask(child, columns, masks) for child in node[1]])
+        if kind == "not":
+            return ~self._mask(node[1], columns, masks)
+        mask = masks.get(node)
+        if mask is None:
+            _, field, op, value = node
+            if op in NUMERIC_OPS:
+                with np.errstate(invalid="ignore"):
+                    mask = NUMERIC_OPS[op](columns[(field, "number")], value)  # NaN (missing) never matches
+            else:
+                column = columns[(field, "value")]
+                if op == "exists":
+                    mask = np.not_equal(column, None) if value in (None, True) else np.equal(column, None)
+                elif op == "in":
+                    mask = np.isin(column, list(value))
+                elif op == "==":
+                    mask = np.equal(column, value)
+                else:
+                    mask = np.not_equal(column, value)
+                mask = np.asarray(mask, dtype=bool)
+            masks[node] = mask
+        return mask
+
+    @staticmethod
+    def _select(rows, group_index, values, direction):
+        """Per group, the matching row with the smallest (or largest) value; missing values come last, ties keep member order."""
+        keys = values[rows]
+        keys = np.where(np.isnan(keys), np.inf, keys if direction == "min" else -keys)
+        order = np.lexsort((rows, keys, group_index[rows]))
+        ordered = rows[order]
+        _, first = np.unique(group_index[ordered], return_index=True)
+        return ordered[first]
@@ -0,0 +1,106 @@
+"""
+Production launcher: one engine process plus N stateless API workers.
+
+    CARE_WORKERS=4 CARE_PORT=5000 python serve.py
+
+The listening socket is bound here once and inherited by every API worker
+(CARE_ROLE=api, CARE_LISTEN_FD), so the kernel spreads connections across
+them. The engine (CARE_ROLE=engine) runs the simulation, group analysis and
+the FHIR outbox flusher exactly once; workers and engine exchange commands,
+events and read models through the shared state file (CARE_STATE_DB).
+Children that exit are restarted with backoff; SIGTERM/SIGINT stops all.
+"""
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+MAX_BACKOFF = 30.0
+
+
+class Child:
+    def __init__(self, name, env, pass_fds=()):
+        self.name = name
+        self.env = env
+        self.pass_fds = pass_fds
+        self.process = None
+        self.started_at = 0.0
+        self.backoff = 1.0
+        self.restart_at = 0.0
+
+    def start(self):
+        self.process = subprocess.Popen([sys.executable, APP], env=self.env, pass_fds=self.pass_fds)
+        self.started_at = time.monotonic()
+        print(f"[SERVE] Started {self.name} (pid {self.process.pid}).")
+
+    def check(self):
+        """Restarts the child if it has exited, backing off if it keeps crashing."""
+        now = time.monotonic()
+        if self.process is not None:
+            code = self.process.poll()
+            if code is None:
+                return
+            # A child that ran for a while gets a fresh backoff
+            self.backoff = 1.0 if now - self.started_at > 60 else min(MAX_BACKOFF, self.backoff * 2)
+            self.restart_at = now + self.backoff
+            self.process = None
+            print(f"[SERVE] {self.name} exited with code {code}; restarting in {self.backoff:.0f}s.")
+        if now >= self.restart_at:
+            self.start()
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+
+def main():
+    port = int(os.environ.get("CARE_PORT", "5000"))
+    workers = int(os.environ.get("CARE_WORKERS", os.cpu_count() or 1))
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(("0.0.0.0", port))
+    listener.listen(1024)
+    listener.set_inheritable(True)
+
+    base_env = {**os.environ, "PYTHONUNBUFFERED": "1"}
+    children = [Child("engine", {**base_env, "CARE_ROLE": "engine"})]
+    children += [
+        Child(f"api-{i}", {**base_env, "CARE_ROLE": "api", "CARE_LISTEN_FD": str(listener.fileno())},
+              pass_fds=(listener.fileno(),))
+        for i in range(workers)
+    ]
+
+    stopping = []
+    def stop(signum, frame):
+        stopping.append(signum)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f"[SERVE] Listening on port {port} with {workers} API worker(s) and one engine.")
+    # The engine first, so the shared state file exists before the workers open it
+    children[0].start()
+    time.sleep(0.5)
+    while not stopping:
+        for child in children:
+            child.check()
+        time.sleep(0.5)
+
+    print("[SERVE] Shutting down.")
+    for child in children:
+        child.stop()
+    deadline = time.monotonic() + 10
+    for child in children:
+        if child.process is not None:
+            try:
+                child.process.wait(timeout=max(0.1, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                child.process.kill()
+    listener.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+class SharedState:
+    """
+    State shared between the gateway's processes when it runs split
+    (CARE_ROLE=api workers plus one CARE_ROLE=engine), in one SQLite WAL file:
+
+    - a message bus: publish(topic, data) appends a row; every process tails
+      the table and hands new rows to the handlers registered for the topic
+      (API workers -> engine commands, engine -> dashboard events);
+    - views: put(key, etag, value) / get(key) for read models the engine
+      publishes (latest vitals, triage queue). get() only goes back to disk
+      when another process has committed something (PRAGMA data_version);
+    - records: set_record(key, value, ttl) / get_record(key) for short-lived
+      JSON values any process can write, such as federated query results
+      that a later request may read through another worker;
+    - attempts: allow_attempt(...) / refund_attempt(...) keep sliding-window
+      counters (login throttles) across all workers, so the limits are not
+      per process.
+
+    Bus rows and attempts older than `retention` seconds, and expired
+    records, are pruned by the engine.
+    """
+
+    def __init__(self, path, poll_interval=0.1, retention=300.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS bus (seq INTEGER PRIMARY KEY AUTOINCREMENT, topic TEXT NOT NULL, data TEXT NOT NULL, at REAL NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS views (key TEXT PRIMARY KEY, etag TEXT, value BLOB NOT NULL, updated_at REAL NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS records (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS attempts (scope TEXT NOT NULL, key TEXT NOT NULL, at REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS attempts_by_key ON attempts (scope, key, at)")
+        self._handlers = {}  # topic -> [handler(data)]
+        self._views = {}     # key -> (etag, value), valid while data_version is unchanged
+        self._data_version = None  # our own commits do not change it; put() updates the cache itself
+        self._tail_thread = None
+
+    # --- bus -------------------------------------------------------------------
+    def publish(self, topic, data):
+        with self._lock:
+            self._conn.execute("INSERT INTO bus (topic, data, at) VALUES (?, ?, ?)", (topic, json.dumps(data), time.time()))
+
+    def subscribe(self, topic, handler):
+        self._handlers.setdefault(topic, []).append(handler)
+
+    def start(self, prune=False):
+        """Tails the bus from its current end in a background thread (idempotent)."""
+        if self._tail_thread is None:
+            with self._lock:
+                last_seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM bus").fetchone()[0]
+            self._tail_thread = threading.Thread(target=self._tail, args=(last_seq, prune), daemon=True, name="shared-state")
+            self._tail_thread.start()
+        return self._tail_thread
+
+    def _tail(self, last_seq, prune):
+        last_prune = time.monotonic()
+        while True:
+            rows = []
+            try:
+                with self._lock:
+                    rows = self._conn.execute(
+                        "SELECT seq, topic, data FROM bus WHERE seq > ? ORDER BY seq LIMIT 1000", (last_seq,)
+                    ).fetchall()
+                for seq, topic, data in rows:
+                    last_seq = seq
+                    for handler in self._handlers.get(topic, ()):
+                        try:
+                            handler(json.loads(data))
+                        except Exception as e:
+                            print(f"[SHARED STATE ERROR] {topic} handler failed: {e}")
+                if prune and time.monotonic() - last_prune > 60:
+                    now = time.time()
+                    with self._lock:
+                        self._conn.execute("DELETE FROM bus WHERE at < ?", (now - self.retention,))
+                        self._conn.execute("DELETE FROM records WHERE expires_at < ?", (now,))
+                        self._conn.execute("DELETE FROM attempts WHERE at < ?", (now - self.retention,))
+                    last_prune = time.monotonic()
+            except sqlite3.Error as e:
+                print(f"[SHARED STATE ERROR] {e}")
+            if len(rows) < 1000:
+                time.sleep(self.poll_interval)
+
+    # --- views -----------------------------------------------------------------
+    def put(self, key, etag, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO views (key, etag, value, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET etag = excluded.etag, value = excluded.value, updated_at = excluded.updated_at",
+                (key, etag, value, time.time())
+            )
+            self._views[key] = (etag, value)
+
+    def get(self, key):
+        """(etag, value) of a view, or (None, None) if it was never published."""
+        with self._lock:
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._data_version:
+                self._views.clear()
+                self._data_version = version
+            cached = self._views.get(key)
+            if cached is None:
+                row = self._conn.execute("SELECT etag, value FROM views WHERE key = ?", (key,)).fetchone()
+                cached = self._views[key] = (row[0], row[1]) if row else (None, None)
+            return cached
+
+    # --- records ---------------------------------------------------------------
+    def set_record(self, key, value, ttl):
+        """Stores a JSON-serializable value under `key` for `ttl` seconds."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO records (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+                (key, json.dumps(value), time.time() + ttl)
+            )
+
+    def get_record(self, key):
+        """The value stored under `key`, or None if there is none or it has expired."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM records WHERE key = ? AND expires_at >= ?", (key, time.time())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # --- attempts --------------------------------------------------------------
+    def allow_attempt(self, scope, keys, max_attempts, window):
+        """
+        Records one attempt for every key in `scope` and returns False if any
+        of them already had `max_attempts` in the last `window` seconds
+        (over-limit attempts are not recorded), as one transaction.
+        """
+        now = time.time()
+        cutoff = now - window
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                allowed = True
+                for key in keys:
+                    self._conn.execute("DELETE FROM attempts WHERE scope = ? AND key = ? AND at < ?", (scope, key, cutoff))
+                    count = self._conn.execute("SELECT COUNT(*) FROM attempts WHERE scope = ? AND key = ?", (scope, key)).fetchone()[0]
+                    if count >= max_attempts:
+                        allowed = False
+                    else:
+                        self._conn.execute("INSERT INTO attempts (scope, key, at) VALUES (?, ?, ?)", (scope, key, now))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return allowed
+
+    def refund_attempt(self, scope, keys):
+        """Takes back the newest recorded attempt of every key in `scope` (e.g. after a successful login)."""
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM attempts WHERE rowid IN "
+                "(SELECT rowid FROM attempts WHERE scope = ? AND key = ? ORDER BY at DESC LIMIT 1)",
+                [(scope, key) for key in keys]
+            )
@@ -0,0 +1,41 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer_pool import AnalyzerPool  # noqa: E402
+
+
+def crash(patients):
+    os._exit(1)
+
+
+def first_patient(patients):
+    return {"patient_id": patients[0]["id"]}
+
+
+def make_pool():
+    module = os.path.splitext(os.path.basename(__file__))[0]
+    return AnalyzerPool(analyzers={"crash": f"{module}:crash", "ok": f"{module}:first_patient"},
+                        max_workers=2, timeout=10.0)
+
+
+def test_pool_recovers_after_a_worker_dies():
+    pool = make_pool()
+    try:
+        [(job_id, result, error)] = pool.run_many([("g1", "crash", [{"id": "p1"}])])
+        assert (job_id, result) == ("g1", None)
+        assert error == "analyzer worker died"
+
+        assert pool.run_many([("g2", "ok", [{"id": "p2"}])]) == [("g2", {"patient_id": "p2"}, None)]
+    finally:
+        pool.shutdown()
+
+
+def test_unsupported_group_type():
+    pool = make_pool()
+    try:
+        [(_, result, error)] = pool.run_many([("g1", "unknown", [])])
+        assert result is None and "no analyzer" in error
+    finally:
+        pool.shutdown()
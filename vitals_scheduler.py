@@ -0,0 +1,120 @@
+import random
+import threading
+
+from acuity import IndexedHeap
+
+
+class CadenceScheduler:
+    """
+    Next-due deadline per simulated patient, kept in an IndexedHeap, so
+    each wake-up only touches the patients that are due. The sampling
+    interval depends on the patient's acuity band (RED sampled most often),
+    with +/- `jitter` (fraction of the interval) so patients admitted
+    together do not stay in lock step.
+
+    Deadlines are fixed-rate: the next one is the previous deadline plus
+    the interval, not "now" plus the interval, so slow batches do not make
+    the cadence drift. A deadline that has already passed by then is counted
+    as missed and rescheduled from now (no catch-up bursts).
+    """
+
+    def __init__(self, intervals, default_band, jitter=0.1, admit_spread=1.0, seed=None):
+        self.intervals = dict(intervals)  # band -> seconds
+        self.default_band = default_band
+        self.jitter = jitter
+        self.admit_spread = admit_spread  # seconds over which new admissions' first samples are spread
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._heap = IndexedHeap()  # patient_id -> deadline (monotonic seconds)
+        self._restored = set()  # restored at startup and not yet scheduled
+        self._stats = {"sampled": 0, "missed_deadlines": 0, "max_lateness_s": 0.0, "last_lateness_s": 0.0}
+
+    def interval(self, band):
+        base = self.intervals.get(band, self.intervals[self.default_band])
+        return base * (1.0 + self._rng.uniform(-self.jitter, self.jitter))
+
+    def restore(self, patient_ids):
+        """
+        Marks patients restored at startup (not newly admitted): sync() spreads
+        their first samples over one interval instead of sampling them all at once.
+        """
+        with self._lock:
+            self._restored.update(patient_id for patient_id in patient_ids if patient_id not in self._heap)
+
+    def sync(self, patient_ids, now):
+        """
+        Adds new patients and drops missing ones. A newly admitted patient is
+        due within `admit_spread` seconds, so a bulk admission does not all
+        come due in the same wake-up; patients marked by restore() are
+        spread over one whole interval.
+        """
+        with self._lock:
+            current = set(patient_ids)
+            for patient_id in [p for p in self._heap.keys() if p not in current]:
+                self._heap.remove(patient_id)
+            for patient_id in patient_ids:
+                if patient_id in self._heap:
+                    continue
+                if patient_id in self._restored:
+                    self._restored.discard(patient_id)
+                    spread = self.interval(self.default_band)
+                else:
+                    spread = self.admit_spread
+                self._heap.set(patient_id, now + self._rng.uniform(0, spread))
+
+    def remove(self, patient_id):
+        with self._lock:
+            self._heap.remove(patient_id)
+
+    def next_deadline(self):
+        """The earliest deadline, or None when nobody is scheduled."""
+        with self._lock:
+            top = self._heap.top(1)
+            return top[0][1] if top else None
+
+    def due(self, now, until=None, limit=None):
+        """
+        [(patient_id, deadline)] for every deadline up to `until` (default
+        now; a small slack batches nearly-due patients into one wake-up),
+        earliest first and at most `limit`. They stay in the heap until
+        reschedule() moves them on.
+        """
+        until = now if until is None else until
+        with self._lock:
+            due = self._heap.top(limit or len(self._heap), upto=until)
+            if due:
+                lateness = max(0.0, now - due[0][1])
+                self._stats["last_lateness_s"] = lateness
+                self._stats["max_lateness_s"] = max(self._stats["max_lateness_s"], lateness)
+            return due
+
+    def reschedule(self, sampled, now):
+        """Moves sampled [(patient_id, deadline, band)] to their next deadline; returns the number missed."""
+        missed = 0
+        with self._lock:
+            for patient_id, deadline, band in sampled:
+                if patient_id not in self._heap:
+                    continue  # deactivated meanwhile
+                # The band is the one after this sample, so an escalation shortens the very next interval
+                interval = self.interval(band)
+                next_deadline = deadline + interval
+                if next_deadline <= now:
+                    missed += 1
+                    next_deadline = now + interval
+                self._heap.set(patient_id, next_deadline)
+            self._stats["sampled"] += len(sampled)
+            self._stats["missed_deadlines"] += missed
+        return missed
+
+    def expedite(self, patient_id, now):
+        """Samples a patient at the next wake-up (e.g. after a state change)."""
+        with self._lock:
+            if patient_id in self._heap:
+                self._heap.set(patient_id, now)
+
+    def __len__(self):
+        return len(self._heap)
+
+    def stats(self):
+        with self._lock:
+            return {"patients": len(self._heap), "intervals": self.intervals, "jitter": self.jitter, **self._stats}
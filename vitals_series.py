@@ -0,0 +1,189 @@
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+
+class VitalsSeries:
+    """
+    Bounded per-patient vitals history for trend charts. Each patient has a
+    ring buffer of up to `capacity` samples: a float64 timestamp column plus
+    one float32 column per vital (NaN where a vital was not measured). The
+    buffer grows by `chunk` samples as the stay gets longer and wraps once it
+    holds `capacity`, so memory per patient is bounded however long the stay
+    and short stays stay small.
+
+    With `spill_dir`, the buffers are memory-mapped files (<id>.t, <id>.v)
+    instead of heap arrays: the OS pages them out under memory pressure,
+    they survive restarts, and other processes can query them read-only
+    (readonly=True, as the API workers do in split mode).
+    """
+
+    def __init__(self, keys, capacity=4320, chunk=256, spill_dir=None, readonly=False):
+        self.keys = list(keys)
+        self.capacity = capacity
+        self.chunk = chunk
+        self.spill_dir = spill_dir
+        self.readonly = readonly
+        self._lock = threading.Lock()
+        self._buffers = {}  # patient_id -> [times, values, next write position (== len when full or growing)]
+        if spill_dir and not readonly:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    # --- storage ---------------------------------------------------------------
+    def _paths(self, patient_id):
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", patient_id)
+        return os.path.join(self.spill_dir, f"{name}.t"), os.path.join(self.spill_dir, f"{name}.v")
+
+    def _open(self, patient_id, create):
+        """(times, values, next position) for a patient's files, or None if they do not exist."""
+        times_path, values_path = self._paths(patient_id)
+        exists = os.path.exists(times_path) and os.path.exists(values_path)
+        if not exists and not create:
+            return None
+        if not exists:
+            return self._map(times_path, values_path, 0, min(self.chunk, self.capacity))
+        # The files grow with the buffer; the values file is extended first, so it is never the shorter one
+        size = min(os.path.getsize(times_path) // 8, os.path.getsize(values_path) // (4 * len(self.keys)))
+        mode = "r" if self.readonly else "r+"
+        times = np.memmap(times_path, dtype=np.float64, mode=mode, shape=(size,))
+        values = np.memmap(values_path, dtype=np.float32, mode=mode, shape=(size, len(self.keys)))
+        # The newest sample tells where the ring continues
+        position = 0 if np.isnan(times).all() else int(np.nanargmax(times)) + 1
+        return [times, values, position]
+
+    def _map(self, times_path, values_path, old_size, size):
+        """Extends a patient's files from old_size to size samples (new rows NaN) and maps them."""
+        for path, row_bytes in ((values_path, 4 * len(self.keys)), (times_path, 8)):
+            with open(path, "ab") as f:
+                f.truncate(size * row_bytes)
+        times = np.memmap(times_path, dtype=np.float64, mode="r+", shape=(size,))
+        values = np.memmap(values_path, dtype=np.float32, mode="r+", shape=(size, len(self.keys)))
+        values[old_size:] = np.nan
+        times[old_size:] = np.nan
+        return [times, values, old_size]
+
+    def _buffer(self, patient_id):
+        buffer = self._buffers.get(patient_id)
+        if buffer is None:
+            if self.spill_dir:
+                buffer = self._open(patient_id, create=True)
+            else:
+                size = min(self.chunk, self.capacity)
+                buffer = [np.full(size, np.nan), np.full((size, len(self.keys)), np.nan, dtype=np.float32), 0]
+            self._buffers[patient_id] = buffer
+        return buffer
+
+    def _grow(self, patient_id, buffer):
+        """Adds up to `chunk` rows to a full buffer that is still below capacity."""
+        times, values, position = buffer
+        size = min(len(times) + self.chunk, self.capacity)
+        if self.spill_dir:
+            times.flush()
+            values.flush()
+            return self._map(*self._paths(patient_id), len(times), size)
+        grown_times = np.full(size, np.nan)
+        grown_values = np.full((size, len(self.keys)), np.nan, dtype=np.float32)
+        grown_times[:len(times)] = times
+        grown_values[:len(values)] = values
+        return [grown_times, grown_values, position]
+
+    # --- writers ---------------------------------------------------------------
+    def append(self, patient_id, timestamp, vitals):
+        """Records one {key: value} panel (missing keys stay NaN) at `timestamp` (epoch seconds)."""
+        row = np.array([vitals.get(key, np.nan) for key in self.keys], dtype=np.float32)
+        with self._lock:
+            buffer = self._buffer(patient_id)
+            if buffer[2] >= len(buffer[0]):
+                if len(buffer[0]) < self.capacity:
+                    buffer = self._buffers[patient_id] = self._grow(patient_id, buffer)
+                else:
+                    buffer[2] = 0  # full: wrap around, overwriting the oldest sample
+            times, values, position = buffer
+            # Values first, then the timestamp that makes the row visible to readers
+            values[position] = row
+            times[position] = timestamp
+            buffer[2] = position + 1
+
+    def remove_patient(self, patient_id):
+        """Drops a patient's history (and spill files), e.g. on deactivation."""
+        with self._lock:
+            self._buffers.pop(patient_id, None)
+            if self.spill_dir and not self.readonly:
+                for path in self._paths(patient_id):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+
+    def __len__(self):
+        return len(self._buffers)
+
+    # --- readers ---------------------------------------------------------------
+    def query(self, patient_id, window, resolution, now=None):
+        """
+        min/max/mean of each vital per `resolution`-second bucket over the
+        last `window` seconds, as columns ready for a chart:
+        {"t": [bucket start...], "series": {key: {"min": [], "max": [], "mean": []}}}.
+        Buckets without samples are left out. Returns None for unknown patients.
+        """
+        now = time.time() if now is None else now
+        start = now - window
+        with self._lock:
+            buffer = self._buffers.get(patient_id)
+            if buffer is None and self.readonly and self.spill_dir:
+                buffer = self._open(patient_id, create=False)
+            if buffer is None:
+                return None
+            times, values, _ = buffer
+            selected = np.nonzero(times >= start)[0]  # NaN (never written) compares False
+            sample_times = np.array(times[selected])
+            samples = np.array(values[selected])
+
+        order = np.argsort(sample_times, kind="stable")
+        sample_times, samples = sample_times[order], samples[order]
+        result = {"t": [], "series": {key: {"min": [], "max": [], "mean": []} for key in self.keys}}
+        if not len(sample_times):
+            return result
+
+        # Buckets are aligned to multiples of the resolution, so a chart's buckets do not
+        # shift between polls. Samples are sorted, so each bucket is one contiguous slice.
+        bucket = (sample_times // resolution).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        present = ~np.isnan(samples)
+        counts = np.add.reduceat(present, starts, axis=0)
+        sums = np.add.reduceat(np.where(present, samples, 0.0), starts, axis=0, dtype=np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / counts
+        minimums = np.fmin.reduceat(samples, starts, axis=0)
+        maximums = np.fmax.reduceat(samples, starts, axis=0)
+
+        result["t"] = (bucket[starts] * resolution).round(3).tolist()
+        for j, key in enumerate(self.keys):
+            series = result["series"][key]
+            series["min"] = _column(minimums[:, j], 2)
+            series["max"] = _column(maximums[:, j], 2)
+            series["mean"] = _column(means[:, j], 2)
+        return result
+
+
+def _column(array, digits):
+    """JSON-ready list with None for buckets where the vital was not measured."""
+    return [None if value != value else value for value in np.round(array.astype(np.float64), digits).tolist()]
+
+
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_duration(text, default):
+    """Seconds from "90", "90s", "15m", "12h" or "1d"; `default` when text is empty."""
+    if not text:
+        return default
+    text = text.strip().lower()
+    unit = DURATION_UNITS.get(text[-1])
+    seconds = float(text[:-1]) * unit if unit else float(text)
+    if not 0 < seconds < float("inf"):
+        raise ValueError(f"duration must be a positive number of seconds: {text!r}")
+    return seconds
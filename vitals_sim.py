@@ -0,0 +1,121 @@
+import numpy as np
+
+# Vitals reported as whole numbers; everything else is rounded to one decimal
+INTEGER_VITALS = ("gcs", "respiratory_rate")
+
+
+class VitalsSimulator:
+    """
+    Batched vitals generator. Keeps every simulated patient as a row and
+    draws a whole tick (patients x parameters) with one RNG call, using
+    per-state mean/std matrices precomputed from SIMULATION_PARAMS.
+    State transitions are a vectorized Markov step over all rows.
+
+    Seed it (CARE_SIM_SEED) to make load-generation runs reproducible.
+    """
+
+    def __init__(self, params, codes, seed=None, transitions=None):
+        self.keys = list(codes)
+        self.states = list(params)
+        self._state_index = {state: i for i, state in enumerate(self.states)}
+
+        # mean/std[state, key]: same (min+max)/2 and (max-min)/4 as the original per-value draw
+        bounds = np.array([[params[state][key] for key in self.keys] for state in self.states], dtype=np.float64)
+        self.mean = bounds.mean(axis=2)
+        self.std = (bounds[:, :, 1] - bounds[:, :, 0]) / 4
+        self.integer_columns = np.array([key in INTEGER_VITALS for key in self.keys])
+
+        # transitions[from, to] = per-tick probability; identity (no spontaneous changes) by default
+        self.transitions = np.zeros((len(self.states), len(self.states)))
+        for (from_state, to_state), probability in (transitions or {}).items():
+            if from_state != to_state:
+                self.transitions[self._state_index[from_state], self._state_index[to_state]] = probability
+        np.fill_diagonal(self.transitions, 1.0 - self.transitions.sum(axis=1))
+        self._cumulative = np.cumsum(self.transitions, axis=1)
+
+        self.rng = np.random.default_rng(seed)
+        self.patient_ids = []
+        self._rows = {}
+        self.state = np.zeros(0, dtype=np.int8)
+
+    # --- patient rows ----------------------------------------------------------
+    def __len__(self):
+        return len(self.patient_ids)
+
+    def __contains__(self, patient_id):
+        return patient_id in self._rows
+
+    def add(self, patient_id, state="stable"):
+        if patient_id in self._rows:
+            return
+        self._rows[patient_id] = len(self.patient_ids)
+        self.patient_ids.append(patient_id)
+        self.state = np.append(self.state, np.int8(self._state_index[state]))
+
+    def remove(self, patient_id):
+        """Swap-remove: the last row takes the removed patient's place."""
+        row = self._rows.pop(patient_id, None)
+        if row is None:
+            return
+        last = len(self.patient_ids) - 1
+        if row != last:
+            moved = self.patient_ids[last]
+            self.patient_ids[row] = moved
+            self.state[row] = self.state[last]
+            self._rows[moved] = row
+        self.patient_ids.pop()
+        self.state = self.state[:last]
+
+    def sync(self, active):
+        """Mirrors a {patient_id: {"state": ...}} mapping: adds new rows, drops missing ones."""
+        for patient_id in [p for p in self.patient_ids if p not in active]:
+            self.remove(patient_id)
+        new_ids = [p for p in active if p not in self._rows]
+        if not new_ids:
+            return
+        # One concatenate for the whole batch instead of an append per patient
+        new_states = np.array([self._state_index[active[p].get("state", "stable")] for p in new_ids], dtype=np.int8)
+        for patient_id in new_ids:
+            self._rows[patient_id] = len(self.patient_ids)
+            self.patient_ids.append(patient_id)
+        self.state = np.concatenate([self.state, new_states])
+
+    def row(self, patient_id):
+        return self._rows[patient_id]
+
+    def get_state(self, patient_id):
+        return self.states[self.state[self._rows[patient_id]]]
+
+    def set_state(self, patient_id, state):
+        self.state[self._rows[patient_id]] = self._state_index[state]
+
+    # --- ticks -----------------------------------------------------------------
+    def step_states(self, rows=None):
+        """Applies one Markov transition to every patient (or the given rows); returns the ids whose state changed."""
+        rows = np.arange(len(self.state)) if rows is None else np.asarray(rows, dtype=np.intp)
+        if not len(rows):
+            return []
+        state = self.state[rows]
+        u = self.rng.random(len(rows))
+        new_state = (u[:, None] >= self._cumulative[state]).sum(axis=1)
+        new_state = np.minimum(new_state, len(self.states) - 1).astype(np.int8)
+        changed = rows[new_state != state]
+        self.state[rows] = new_state
+        return [self.patient_ids[i] for i in changed]
+
+    def draw(self, rows=None):
+        """One (n x parameters) array of vitals for all patients (or the given row indices)."""
+        state = self.state if rows is None else self.state[rows]
+        values = self.rng.standard_normal((len(state), len(self.keys))) * self.std[state] + self.mean[state]
+        # int() in the original truncates toward zero; floats keep one decimal
+        return np.where(self.integer_columns, np.trunc(values), np.round(values, 1))
+
+    def panels(self, rows=None):
+        """Yields (patient_id, {key: value}) with plain Python numbers, ready for FHIR serialization."""
+        values = self.draw(rows)
+        ids = self.patient_ids if rows is None else [self.patient_ids[i] for i in rows]
+        integer_columns = np.nonzero(self.integer_columns)[0].tolist()
+        for patient_id, row in zip(ids, values.tolist()):
+            for j in integer_columns:
+                row[j] = int(row[j])
+            yield patient_id, dict(zip(self.keys, row))
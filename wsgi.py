@@ -0,0 +1,22 @@
+"""
+WSGI entry point for running the API tier under an external server, e.g.
+
+    CARE_ROLE=engine python app.py &
+    gunicorn -w 4 --threads 16 wsgi:application
+
+Each worker process imports this module itself (do not use --preload, or
+the background threads would only exist in the master). Without CARE_ROLE
+the workers run as stateless API processes ("api") and need one separate
+engine process sharing CARE_STATE_DB, CARE_GROUPS_DB and CARE_OUTBOX_DB.
+"""
+import os
+
+os.environ.setdefault("CARE_ROLE", "api")
+
+import app as gateway  # noqa: E402
+
+if gateway.CARE_ROLE == "engine":
+    raise RuntimeError("wsgi.py serves the API; run the engine with CARE_ROLE=engine python app.py")
+gateway.start_background_services()
+
+application = gateway.app